@@ -0,0 +1,574 @@
+#!/usr/bin/env python3
+"""
+株主優待処理のマイクロベンチマーク
+
+ネットワークに接続せず、ローカルのデータで処理時間を計測します。
+
+使用例:
+python benchmark_yuutai.py classify                    # タイトル判定（旧実装との比較）
+python benchmark_yuutai.py classify --cache-dir ./cache # キャッシュ済み一覧のタイトルも使用
+python benchmark_yuutai.py batch --days 750             # 一括判定（約3年分の一覧を想定）
+python benchmark_yuutai.py memory --days 245            # 開示情報の保持メモリ（1年分の一覧を想定）
+python benchmark_yuutai.py decode --cache-dir ./cache   # キャッシュ済み一覧のデコード時間・メモリ
+python benchmark_yuutai.py e2e --start 2025-05-19 --end 2025-05-23  # リプレイサーバーに対する日付範囲処理
+python benchmark_yuutai.py upload --workers 8             # PDFの並列アップロード（ストリーミング送信と旧実装のメモリ比較）
+"""
+
+import os
+import re
+import gc
+import sys
+import time
+import random
+import tempfile
+import tracemalloc
+import sqlite3
+import zlib
+import json
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from typing import Callable, Dict, List
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.classifier import YuutaiTitleMatcher
+from yuutai.decoding import DECODER, decode_items, project_item
+from yuutai.listing_cache import ListingCache
+from yuutai.replay_server import SERVICES
+from notion_uploader import NOTION_VERSION
+
+TITLE_CORPUS_PATH = os.path.join(os.path.dirname(__file__), 'benchmark_data', 'tdnet_titles.txt')
+
+
+def load_titles(cache_dir: str = None) -> List[str]:
+    """サンプルのタイトルと、指定があればキャッシュ済み一覧の全タイトルを読み込む"""
+    with open(TITLE_CORPUS_PATH, encoding='utf-8') as f:
+        titles = [line.rstrip('\n') for line in f if line.strip() and not line.startswith('#')]
+
+    db_path = os.path.join(cache_dir, 'yanoshin_listings.sqlite3') if cache_dir else None
+    if db_path and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        for (payload,) in conn.execute("SELECT payload FROM listing_pages"):
+            for item in json.loads(zlib.decompress(payload).decode('utf-8')):
+                title = item.get('Tdnet', {}).get('title')
+                if title:
+                    titles.append(title)
+        conn.close()
+
+    return titles
+
+
+# 旧実装（YuutaiAPIClient._is_yuutai_related / _categorize_yuutai_disclosure）
+REFERENCE_KEYWORDS = [
+    "株主優待", "優待制度", "優待内容", "株主優待制度",
+    "優待", "株主特典", "株主様ご優待", "株主優待券",
+    "株主優待品", "優待商品", "株主様特典"
+]
+
+
+def reference_is_yuutai_related(title: str) -> bool:
+    if not title:
+        return False
+
+    for keyword in REFERENCE_KEYWORDS:
+        if keyword in title:
+            return True
+
+    yuutai_patterns = [
+        r'株主.*優待',
+        r'優待.*制度',
+        r'株主.*特典',
+        r'優待.*内容',
+        r'優待.*導入',
+        r'優待.*変更',
+        r'優待.*廃止',
+        r'優待.*新設'
+    ]
+
+    for pattern in yuutai_patterns:
+        if re.search(pattern, title):
+            return True
+
+    return False
+
+
+def reference_categorize(title: str) -> str:
+    if not title:
+        return 'その他'
+
+    if any(word in title for word in ['新設', '導入', '開始']):
+        return '優待新設'
+    elif any(word in title for word in ['変更', '修正', '見直し']):
+        return '優待変更'
+    elif any(word in title for word in ['廃止', '終了', '中止']):
+        return '優待廃止'
+    elif any(word in title for word in ['内容', '詳細']):
+        return '優待内容'
+    elif any(word in title for word in ['基準日', '権利']):
+        return '権利基準日'
+    else:
+        return '優待制度'
+
+
+def reference_classify(title: str):
+    """旧実装の処理順（関連判定後、関連ありの場合のみカテゴリ判定）"""
+    if reference_is_yuutai_related(title):
+        return True, reference_categorize(title)
+    return False, None
+
+
+def time_per_title(func: Callable, titles: List[str], repeat: int) -> float:
+    """1タイトルあたりの処理時間（マイクロ秒、repeat回の最小値）"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for title in titles:
+            func(title)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(titles) * 1e6
+
+
+def run_classify(args) -> bool:
+    titles = load_titles(args.cache_dir)
+    matcher = YuutaiTitleMatcher()
+
+    def matcher_classify(title):
+        related, category = matcher.match(title)
+        return related, category if related else None
+
+    # 判定結果の一致確認（カテゴリは関連なしのタイトルでも比較）
+    mismatches = [title for title in titles
+                  if matcher.match(title) != (reference_is_yuutai_related(title), reference_categorize(title))]
+    related_count = sum(1 for title in titles if reference_is_yuutai_related(title))
+
+    print(f"Titles: {len(titles)} ({related_count} yuutai-related)")
+    unrelated = [title for title in titles if not reference_is_yuutai_related(title)]
+    for label, subset in (('all titles', titles), ('unrelated titles only', unrelated)):
+        if not subset:
+            continue
+        reference_us = time_per_title(reference_classify, subset, args.repeat)
+        matcher_us = time_per_title(matcher_classify, subset, args.repeat)
+        print(f"[{label}]")
+        print(f"  Reference (keywords + 8 regex + category loops): {reference_us:.2f} us/title")
+        print(f"  Compiled regex matcher:                          {matcher_us:.2f} us/title")
+        print(f"  Speedup: {reference_us / matcher_us:.2f}x")
+    print(f"Identical results: {'yes' if not mismatches else 'NO'} ({len(mismatches)} mismatches)")
+    for title in mismatches[:10]:
+        print(f"  mismatch: {title}")
+    return not mismatches
+
+
+def build_archive(days: int, items_per_day: int) -> List[str]:
+    """サンプルタイトルから日次一覧のアーカイブ相当のタイトル列を作成（一部は期数を付けた固有のタイトル）"""
+    corpus = load_titles()
+    titles = []
+    for day in range(days):
+        for index in range(items_per_day):
+            title = corpus[(day * items_per_day + index) % len(corpus)]
+            if index % 2:
+                # 決算期・回次などでタイトルが少しずつ異なる実データを模擬
+                title = f"第{day + 1}期 {title}"
+            titles.append(title)
+    return titles
+
+
+def run_batch(args) -> bool:
+    titles = load_titles(args.cache_dir) if args.cache_dir else build_archive(args.days, args.items_per_day)
+    matcher = YuutaiTitleMatcher()
+
+    started = time.perf_counter()
+    expected = [reference_classify(title) for title in titles]
+    reference_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    related, codes = matcher.classify_batch(titles)
+    batch_seconds = time.perf_counter() - started
+
+    results = [(bool(flag), matcher.category_names[code] if flag else None) for flag, code in zip(related, codes)]
+    identical = results == expected
+
+    print(f"Titles: {len(titles)} ({len(set(titles))} unique, {sum(related)} yuutai-related)")
+    print(f"Reference per-item loop:        {reference_seconds:.2f}s")
+    print(f"classify_batch:                 {batch_seconds:.2f}s ({reference_seconds / batch_seconds:.1f}x)")
+    if args.processes > 1:
+        started = time.perf_counter()
+        parallel = matcher.classify_batch(titles, processes=args.processes)
+        parallel_seconds = time.perf_counter() - started
+        identical = identical and parallel == (related, codes)
+        print(f"classify_batch ({args.processes} processes):   {parallel_seconds:.2f}s "
+              f"({reference_seconds / parallel_seconds:.1f}x)")
+    print(f"Result arrays: {related.itemsize * len(related) + codes.itemsize * len(codes)} bytes")
+    print(f"Identical results: {'yes' if identical else 'NO'}")
+    return identical
+
+
+def build_listing_payloads(days: int, items_per_day: int, related_rate: float) -> Dict[str, bytes]:
+    """営業日ごとの一覧（YANOSHIN レスポンスの items 相当）をJSONで作成"""
+    corpus = load_titles()
+    related_titles = [title for title in corpus if reference_is_yuutai_related(title)]
+    other_titles = [title for title in corpus if not reference_is_yuutai_related(title)]
+    markets = ['東', '東名', '東札', '東福', '名']
+    rng = random.Random(20250523)
+
+    payloads = {}
+    day = date(2024, 4, 1)
+    while len(payloads) < days:
+        if day.weekday() < 5:
+            day_str = day.strftime('%Y-%m-%d')
+            items = []
+            for index in range(items_per_day):
+                company = rng.randrange(1300, 9999)
+                titles = related_titles if rng.random() < related_rate else other_titles
+                items.append({'Tdnet': {
+                    'id': f"{day.strftime('%y%m%d')}{index:05d}",
+                    'pubdate': f"{day_str} {15 - index % 7:02d}:{index % 60:02d}:00",
+                    'company_code': f"{company}0",
+                    'company_name': f"サンプル{company}株式会社",
+                    'title': rng.choice(titles),
+                    'document_url': f"https://www.release.tdnet.info/inbs/140120{day.strftime('%Y%m%d')}5{index:05d}.pdf",
+                    'markets_string': rng.choice(markets),
+                    'url_xbrl': None if index % 3 else f"https://www.release.tdnet.info/inbs/081220{index:05d}.zip",
+                }})
+            payloads[day_str] = json.dumps(items, ensure_ascii=False).encode('utf-8')
+        day += timedelta(days=1)
+    return payloads
+
+
+def legacy_filter_items(matcher: YuutaiTitleMatcher, items: List[Dict], date: str) -> List[Dict]:
+    """旧実装（開示ごとの辞書に raw_data として Tdnet データを保持）"""
+    titles = [item['Tdnet'].get('title', '') if 'Tdnet' in item else None for item in items]
+    related_flags, category_codes = matcher.classify_batch(titles)
+    disclosures = []
+    for item, title, related, category_code in zip(items, titles, related_flags, category_codes):
+        if not related:
+            continue
+        tdnet_data = item['Tdnet']
+        company_code = tdnet_data.get('company_code', '')
+        if company_code and len(company_code) == 5 and company_code.endswith('0'):
+            company_code = company_code[:-1]
+        disclosures.append({
+            'id': tdnet_data.get('id'),
+            'title': title,
+            'company_code': company_code,
+            'company_name': tdnet_data.get('company_name'),
+            'disclosure_date': date,
+            'disclosure_time': tdnet_data.get('pubdate', ''),
+            'document_type': 'TDNET',
+            'pdf_url': tdnet_data.get('document_url', ''),
+            'category': matcher.category_names[category_code],
+            'markets_string': tdnet_data.get('markets_string', ''),
+            'url_xbrl': tdnet_data.get('url_xbrl', ''),
+            'raw_data': tdnet_data
+        })
+    return disclosures
+
+
+def retained_memory(build: Callable, payloads: Dict[str, bytes]):
+    """日ごとに一覧を展開して開示情報を作成し、一覧を破棄した後に保持されているメモリ量を計測"""
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    disclosures = []
+    for day, payload in payloads.items():
+        items = json.loads(payload)
+        disclosures.extend(build(items, day))
+        del items
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return disclosures, retained, peak, elapsed
+
+
+def run_memory(args) -> bool:
+    payloads = build_listing_payloads(args.days, args.items_per_day, args.related_rate)
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_benchmark_')
+    client = YuutaiAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+    for day, payload in payloads.items():
+        client.listing_cache.put(day, json.loads(payload))
+
+    legacy, legacy_bytes, legacy_peak, legacy_seconds = retained_memory(
+        lambda items, day: legacy_filter_items(client.title_matcher, items, day), payloads)
+    del legacy[100:]
+    records, record_bytes, record_peak, record_seconds = retained_memory(client._filter_yuutai_items, payloads)
+
+    # 辞書形式のアクセスと raw_data の遅延読み込みが旧実装と同じ値を返すか
+    identical = all(record.to_dict() == disclosure for record, disclosure in zip(records, legacy))
+
+    count = len(records)
+    print(f"Listings: {len(payloads)} days x {args.items_per_day} items ({count} yuutai-related disclosures)")
+    print(f"Per-item dicts with raw_data: {legacy_bytes / 1024 / 1024:.1f} MB retained "
+          f"({legacy_bytes / count:.0f} B/disclosure, peak {legacy_peak / 1024 / 1024:.1f} MB, {legacy_seconds:.2f}s)")
+    print(f"Disclosure records:           {record_bytes / 1024 / 1024:.1f} MB retained "
+          f"({record_bytes / count:.0f} B/disclosure, peak {record_peak / 1024 / 1024:.1f} MB, {record_seconds:.2f}s)")
+    print(f"Reduction: {legacy_bytes / record_bytes:.1f}x")
+    print(f"Identical dict view: {'yes' if identical else 'NO'}")
+    return identical
+
+
+def load_cached_pages(cache_dir: str = None, days: int = 20, items_per_day: int = 1000) -> List[bytes]:
+    """キャッシュ済み一覧のページ（zlib圧縮JSON）を読み込む（キャッシュがなければ模擬一覧から作成）"""
+    db_path = os.path.join(cache_dir, 'yanoshin_listings.sqlite3') if cache_dir else None
+    if db_path and os.path.exists(db_path):
+        conn = sqlite3.connect(db_path)
+        pages = [payload for (payload,) in conn.execute("SELECT payload FROM listing_pages ORDER BY day, page")]
+        conn.close()
+        if pages:
+            return pages
+    return [ListingCache._encode(json.loads(payload))
+            for payload in build_listing_payloads(days, items_per_day, 0.02).values()]
+
+
+def measure_decode(decode: Callable, pages: List[bytes], repeat: int):
+    """ページ全体のデコード時間（repeat回の最小値）と、1ページあたりのメモリ（ピーク・保持）"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for page in pages:
+            decode(zlib.decompress(page))
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    raw = zlib.decompress(pages[0])
+    gc.collect()
+    tracemalloc.start()
+    items = decode(raw)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, retained, peak, items
+
+
+def run_decode(args) -> bool:
+    pages = load_cached_pages(args.cache_dir, args.days)
+    item_count = sum(len(json.loads(zlib.decompress(page))) for page in pages)
+
+    decoders = [('json.loads (full items)', lambda raw: json.loads(raw.decode('utf-8')))]
+    try:
+        import orjson
+        decoders.append(('orjson.loads (full items)', orjson.loads))
+    except ImportError:
+        pass
+    decoders.append((f'decode_items ({DECODER})', decode_items))
+
+    print(f"Cached pages: {len(pages)} ({item_count} items)")
+    results = []
+    for label, decode in decoders:
+        seconds, retained, peak, items = measure_decode(decode, pages, args.repeat)
+        results.append(items)
+        print(f"{label:<44} {seconds / item_count * 1e6:.2f} us/item, "
+              f"{retained / len(items):.0f} B/item retained, peak {peak / 1024:.0f} KB/page")
+
+    # 使用する項目の値が完全なデコード結果と一致するか
+    baseline, decoded = results[0], results[-1]
+    identical = len(baseline) == len(decoded) and all(
+        project_item(decoded_item) == project_item(item) for item, decoded_item in zip(baseline, decoded))
+    print(f"Identical used fields: {'yes' if identical else 'NO'}")
+    return identical
+
+
+def start_replay_server(args):
+    """リプレイサーバーを別プロセスで起動（計測するプロセスのメモリ・CPUに含めない）"""
+    command = [sys.executable, os.path.join(os.path.dirname(__file__), 'src', 'yuutai', 'replay_server.py'),
+               '--pdf-dir', args.pdf_dir, '--titles', TITLE_CORPUS_PATH,
+               '--filler-per-day', str(args.filler_per_day), '--retry-after', str(args.retry_after)]
+    if args.listing_cache:
+        command += ['--listing-cache', args.listing_cache]
+    for service in SERVICES:
+        command += [f'--{service}-latency', str(getattr(args, f'{service}_latency')),
+                    f'--{service}-throttle', str(getattr(args, f'{service}_throttle'))]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+    return process, json.loads(process.stdout.readline())
+
+
+def run_e2e(args) -> bool:
+    process, server = start_replay_server(args)
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_benchmark_')
+    try:
+        # 処理設定は .env より優先して環境変数で指定（load_dotenv は既存の値を上書きしない）
+        os.environ.update({
+            'NOTION_API_KEY': 'secret_replay', 'YUUTAI_NOTION_PAGE_ID': 'replay-page',
+            'TDNET_API_BASE_URL': server['listing_url'], 'NOTION_API_BASE_URL': server['notion_url'],
+            'YUUTAI_DOWNLOAD_DIR': os.path.join(temp_dir, 'downloads'),
+            'YUUTAI_CACHE_DIR': os.path.join(temp_dir, 'cache'),
+            'API_REQUEST_INTERVAL': str(args.request_interval), 'PDF_DOWNLOAD_INTERVAL': str(args.download_interval),
+            'YUUTAI_DAY_INTERVAL': str(args.day_interval),
+            'NOTION_UPLOAD_WORKERS': str(args.notion_workers), 'NOTION_REQUEST_RATE': str(args.notion_rate),
+            'NOTION_ATTACH_ON_CREATE': 'false' if args.attach_after_create else 'true',
+        })
+        from yuutai.daily_processor import YuutaiDailyProcessor
+
+        gc.collect()
+        tracemalloc.start()
+        started = time.perf_counter()
+        processor = YuutaiDailyProcessor()
+        results = processor.process_date_range(args.start, args.end)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        stats = processor.transport.get(f"{server['notion_url']}/_replay/stats").json()
+        summary = processor.get_processing_summary(results)
+        processor.transport.close()
+    finally:
+        process.stdin.close()
+        process.wait()
+
+    print(f"Replay: {args.start} .. {args.end} ({len(server['days'])} listing days available)")
+    print(f"Wall time: {elapsed:.2f}s, peak traced memory {peak / 1024 / 1024:.1f} MB")
+    print(f"Disclosures: {summary['total_disclosures']} total, {summary['successful_uploads']} uploaded, "
+          f"{summary['failed_uploads']} failed")
+    for endpoint, count in sorted(stats['requests'].items()):
+        throttled = stats['throttled'].get(endpoint, 0)
+        print(f"  {endpoint:<30} {count:>5} requests" + (f" ({throttled} throttled)" if throttled else ''))
+    print(f"  {'total':<30} {sum(stats['requests'].values()):>5} requests")
+    print(f"Notion: {stats['notion']['pages']} pages, {stats['notion']['file_uploads']} file uploads "
+          f"({stats['notion']['uploaded_bytes'] / 1024 / 1024:.1f} MB)")
+    print(f"Notion requests: {summary['notion_requests']} sent, {summary['notion_retries']} retries, "
+          f"{summary['notion_throttled']} throttled")
+    print(f"PDF attached on page creation: {summary['pdf_attached_on_create']} "
+          f"(saved {summary['pdf_attached_on_create']} pages.update), {summary['pdf_attach_fallbacks']} fallbacks")
+    for host, entry in sorted(summary['http_connections'].items()):
+        print(f"  HTTP {host}: {entry['requests']} requests over {entry['connections']} connections")
+    return summary['failed_dates'] == 0 and summary['failed_uploads'] == 0
+
+
+def send_buffered(uploader, file_upload_id: str, file_path: str, filename: str, mime_type: str) -> bool:
+    """旧実装の送信（requests の files= で multipart の本文全体をメモリ上に組み立てる）"""
+    url = f"{uploader.base_url}/v1/file_uploads/{file_upload_id}/send"
+    headers = {"Authorization": f"Bearer {uploader.api_key}", "Notion-Version": NOTION_VERSION}
+    with open(file_path, "rb") as f:
+        files = {"file": (filename, f, mime_type), "part_number": (None, "1")}
+        response = uploader._rest_request('POST', url, headers=headers, files=files)
+    return response.ok
+
+
+def prepare_upload_files(pdf_dir: str, size_mb: float, temp_dir: str) -> List[str]:
+    """アップロードするPDF（size_mb の指定時は末尾を埋めてその大きさにしたコピー）"""
+    paths = sorted(os.path.join(pdf_dir, name) for name in os.listdir(pdf_dir) if name.endswith('.pdf'))
+    if not size_mb:
+        return paths
+    padded = []
+    for path in paths:
+        target = os.path.join(temp_dir, os.path.basename(path))
+        with open(path, 'rb') as src, open(target, 'wb') as dst:
+            dst.write(src.read())
+            dst.truncate(max(dst.tell(), int(size_mb * 1024 * 1024)))
+        padded.append(target)
+    return padded
+
+
+def measure_uploads(uploader, paths: List[str], workers: int, buffered: bool):
+    def upload(path: str) -> bool:
+        filename = os.path.basename(path)
+        if not buffered:
+            return uploader._upload_file(path, filename, 'application/pdf') is not None
+        file_upload_id = uploader._create_file_upload(filename, 'application/pdf')
+        return bool(file_upload_id) and send_buffered(uploader, file_upload_id, path, filename, 'application/pdf')
+
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(upload, paths))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, sum(results)
+
+
+def run_upload(args) -> bool:
+    from http_transport import HTTPTransport
+    from notion_uploader import NotionUploader
+
+    process, server = start_replay_server(args)
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_benchmark_')
+    try:
+        paths = prepare_upload_files(args.pdf_dir, args.size_mb, temp_dir)
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        largest = max(os.path.getsize(path) for path in paths)
+        print(f"PDFs: {len(paths)} files ({total_bytes / 1024 / 1024:.1f} MB, largest {largest / 1024 / 1024:.1f} MB), "
+              f"{args.workers} concurrent uploads")
+
+        success = True
+        for label, buffered in (('requests files= (in-memory body)', True), ('MultipartFileBody (streamed)', False)):
+            transport = HTTPTransport(pool_maxsize=args.workers)
+            uploader = NotionUploader('secret_replay', 'replay-page', transport, server['notion_url'])
+            elapsed, peak, uploaded = measure_uploads(uploader, paths, args.workers, buffered)
+            transport.close()
+            success = success and uploaded == len(paths)
+            print(f"{label:<34} {elapsed:.2f}s, {uploaded}/{len(paths)} uploaded, "
+                  f"peak traced memory {peak / 1024 / 1024:.1f} MB")
+    finally:
+        process.stdin.close()
+        process.wait()
+    return success
+
+
+def main():
+    parser = argparse.ArgumentParser(description='株主優待処理のマイクロベンチマーク')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    classify = subparsers.add_parser('classify', help='タイトル判定（旧実装との比較）')
+    classify.add_argument('--cache-dir', help='キャッシュ済み一覧のタイトルも使用する場合のキャッシュディレクトリ')
+    classify.add_argument('--repeat', type=int, default=20, help='計測回数（最小値を採用）')
+    classify.set_defaults(func=run_classify)
+
+    batch = subparsers.add_parser('batch', help='一括判定（アーカイブ全体の再判定）')
+    batch.add_argument('--cache-dir', help='キャッシュ済み一覧の全タイトルを使用する場合のキャッシュディレクトリ')
+    batch.add_argument('--days', type=int, default=750, help='模擬アーカイブの日数')
+    batch.add_argument('--items-per-day', type=int, default=1000, help='模擬アーカイブの1日あたりの件数')
+    batch.add_argument('--processes', type=int, default=1, help='プロセスプールのプロセス数')
+    batch.set_defaults(func=run_batch)
+
+    memory = subparsers.add_parser('memory', help='開示情報の保持メモリ（旧形式の辞書との比較）')
+    memory.add_argument('--days', type=int, default=245, help='模擬一覧の営業日数')
+    memory.add_argument('--items-per-day', type=int, default=1000, help='1日あたりの件数')
+    memory.add_argument('--related-rate', type=float, default=0.02, help='株主優待関連タイトルの割合')
+    memory.set_defaults(func=run_memory)
+
+    decode = subparsers.add_parser('decode', help='キャッシュ済み一覧のデコード（時間・メモリ）')
+    decode.add_argument('--cache-dir', help='キャッシュ済み一覧を使用する場合のキャッシュディレクトリ（なければ模擬一覧）')
+    decode.add_argument('--days', type=int, default=20, help='模擬一覧の営業日数')
+    decode.add_argument('--repeat', type=int, default=5, help='計測回数（最小値を採用）')
+    decode.set_defaults(func=run_decode)
+
+    e2e = subparsers.add_parser('e2e', help='リプレイサーバーに対する日付範囲処理（時間・リクエスト数・メモリ）')
+    e2e.add_argument('--start', default='2025-05-19', help='開始日（YYYY-MM-DD）')
+    e2e.add_argument('--end', default='2025-05-23', help='終了日（YYYY-MM-DD）')
+    e2e.add_argument('--pdf-dir', default=os.path.join(os.path.dirname(__file__), 'downloads', 'yuutai'),
+                     help='リプレイするPDF（{銘柄コード}_{YYYYMMDD}_{開示ID}.pdf）')
+    e2e.add_argument('--listing-cache', help='記録済みの一覧キャッシュディレクトリ（指定時はPDFから一覧を作成しない）')
+    e2e.add_argument('--filler-per-day', type=int, default=1000, help='営業日ごとの株主優待以外の開示件数')
+    for service, latency in (('yanoshin', 0.2), ('tdnet', 0.1), ('notion', 0.3)):
+        e2e.add_argument(f'--{service}-latency', type=float, default=latency, help=f'{service} の応答遅延（秒）')
+        e2e.add_argument(f'--{service}-throttle', type=float, default=0.0, help=f'{service} で 429 を返す割合')
+    e2e.add_argument('--retry-after', type=float, default=1.0, help='429 の Retry-After（秒）')
+    e2e.add_argument('--request-interval', type=float, default=1.0, help='API_REQUEST_INTERVAL')
+    e2e.add_argument('--download-interval', type=float, default=0.25, help='PDF_DOWNLOAD_INTERVAL')
+    e2e.add_argument('--day-interval', type=float, default=0.0, help='YUUTAI_DAY_INTERVAL')
+    e2e.add_argument('--notion-workers', type=int, default=4, help='NOTION_UPLOAD_WORKERS')
+    e2e.add_argument('--notion-rate', type=float, default=3.0, help='NOTION_REQUEST_RATE')
+    e2e.add_argument('--attach-after-create', action='store_true',
+                     help='NOTION_ATTACH_ON_CREATE=false（ページ作成後に pages.update でPDFを添付する従来の手順）')
+    e2e.set_defaults(func=run_e2e)
+
+    upload = subparsers.add_parser('upload', help='PDFの並列アップロード（ストリーミング送信と旧実装のメモリ比較）')
+    upload.add_argument('--pdf-dir', default=os.path.join(os.path.dirname(__file__), 'downloads', 'yuutai'),
+                        help='アップロードするPDF')
+    upload.add_argument('--workers', type=int, default=8, help='同時にアップロードする数')
+    upload.add_argument('--size-mb', type=float, default=0.0, help='各PDFの末尾を埋めてこの大きさにする（MB）')
+    upload.set_defaults(func=run_upload, listing_cache=None, filler_per_day=0, retry_after=1.0,
+                        **{f'{service}_{name}': 0.0 for service in SERVICES for name in ('latency', 'throttle')})
+
+    args = parser.parse_args()
+    success = args.func(args)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
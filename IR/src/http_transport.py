@@ -0,0 +1,274 @@
+import os
+import uuid
+import logging
+import threading
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# 既定のタイムアウト（秒）と、ホストごとに保持する接続数
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 60.0
+DEFAULT_POOL_MAXSIZE = 10
+
+
+class HTTPTransport:
+    """YANOSHIN・TDnet・Notion への接続を共有するHTTPトランスポート
+
+    requests はホストごとに接続プール付きの Session を1つ作成して keep-alive で使い回し、
+    gzip 圧縮の応答を受け付ける。timeout を指定しないリクエストには接続・読み取りの既定値を使う。
+    notion-client 用には同じ設定の httpx.Client を作成する。
+    ホストごとのリクエスト数と新規接続数（TCP+TLS ハンドシェイク数）を connection_stats で参照できる。
+    """
+
+    def __init__(self, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT, read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 pool_maxsize: int = DEFAULT_POOL_MAXSIZE):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_maxsize = max(1, pool_maxsize)
+
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, requests.Session] = {}
+        # httpx（notion-client）経由のホスト別統計
+        self._httpx_stats: Dict[str, Dict[str, int]] = {}
+        self._httpx_clients = []
+
+    @property
+    def timeout(self):
+        """requests 用の (接続, 読み取り) タイムアウト"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def session_for(self, url: str) -> requests.Session:
+        """URLのホスト用の Session（初回に接続プールを作成）"""
+        host = urlsplit(url).netloc
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['Accept-Encoding'] = 'gzip, deflate'
+                self._sessions[host] = session
+        return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('timeout', self.timeout)
+        return self.session_for(url).request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def head(self, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, **kwargs)
+
+    def httpx_client(self, wrap_transport: Optional[Callable] = None):
+        """
+        notion-client 用の httpx.Client（同じタイムアウト・接続数、接続統計を記録）
+
+        Args:
+            wrap_transport: 接続プール付きの httpx.HTTPTransport を受け取り、それを包むトランスポートを返す関数
+                            （再試行などを各リクエストに挟む場合に指定）
+        """
+        import httpx
+
+        limits = httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize)
+        if wrap_transport is None:
+            client = httpx.Client(limits=limits, event_hooks={'request': [self._trace_httpx_request]})
+        else:
+            client = httpx.Client(transport=wrap_transport(httpx.HTTPTransport(limits=limits)),
+                                  event_hooks={'request': [self._trace_httpx_request]})
+        self.tune_httpx_client(client)
+        with self._lock:
+            self._httpx_clients.append(client)
+        return client
+
+    def tune_httpx_client(self, client):
+        """httpx.Client のタイムアウトと gzip を設定（notion-client はクライアント設定時に上書きするため再適用する）"""
+        import httpx
+
+        client.timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        client.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def _trace_httpx_request(self, request):
+        host = request.url.netloc.decode('ascii')
+        with self._lock:
+            stats = self._httpx_stats.setdefault(host, {'requests': 0, 'connections': 0})
+            stats['requests'] += 1
+
+        def trace(event_name: str, info: Dict):
+            if event_name == 'connection.connect_tcp.complete':
+                with self._lock:
+                    stats['connections'] += 1
+
+        request.extensions['trace'] = trace
+
+    def connection_stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        ホストごとの接続再利用統計
+
+        Returns:
+            {ホスト: {'requests': リクエスト数, 'connections': 新規接続数, 'reused': 既存接続で送信した数}}
+        """
+        stats: Dict[str, Dict[str, int]] = {}
+
+        def add(host: str, request_count: int, connection_count: int):
+            entry = stats.setdefault(host, {'requests': 0, 'connections': 0, 'reused': 0})
+            entry['requests'] += request_count
+            entry['connections'] += connection_count
+            entry['reused'] = max(0, entry['requests'] - entry['connections'])
+
+        with self._lock:
+            sessions = list(self._sessions.items())
+            httpx_stats = {host: dict(entry) for host, entry in self._httpx_stats.items()}
+
+        for host, session in sessions:
+            for adapter in set(session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in list(pools.keys()):
+                    pool = pools.get(key)
+                    if pool is not None:
+                        add(host, pool.num_requests, pool.num_connections)
+        for host, entry in httpx_stats.items():
+            add(host, entry['requests'], entry['connections'])
+        return stats
+
+    def log_stats(self):
+        """ホストごとの接続再利用統計をログに出力"""
+        for host, entry in sorted(self.connection_stats().items()):
+            logger.info(f"HTTP {host}: {entry['requests']} requests over {entry['connections']} connections "
+                        f"({entry['reused']} reused)")
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            clients = list(self._httpx_clients)
+            self._sessions.clear()
+            self._httpx_clients.clear()
+        for session in sessions:
+            session.close()
+        for client in clients:
+            client.close()
+
+
+class MultipartFileBody:
+    """ファイル（またはその一部）をディスクから読み出しながら返す multipart/form-data の本文
+
+    requests の data に渡すと __len__ から Content-Length を設定し、read で少しずつ送信するため、
+    ファイルの大きさや同時に送信する数によらず、保持するのは送信中のチャンクだけになる。
+    seek(0) で先頭に戻して再送できる。
+
+    Args:
+        fields: ファイルより前に置くテキストのフィールド（名前 → 値）
+        name: ファイルのフィールド名
+        filename: ファイル名
+        content_type: ファイルの MIME タイプ
+        file_path: 送信するファイル
+        offset: 送信する範囲の先頭（バイト）
+        length: 送信する長さ（省略時はファイルの末尾まで）
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, fields: Dict[str, str], name: str, filename: str, content_type: str, file_path: str,
+                 offset: int = 0, length: Optional[int] = None):
+        self.fields = dict(fields)
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+
+        head = [f'--{self.boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'
+                for key, value in self.fields.items()]
+        quoted = filename.replace('\\', '\\\\').replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+        head.append(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{quoted}"\r\n'
+                    f'Content-Type: {content_type}\r\n\r\n')
+        self._head = ''.join(head).encode('utf-8')
+        self._tail = f'\r\n--{self.boundary}--\r\n'.encode('ascii')
+
+        self._file_path = file_path
+        self._offset = offset
+        self._length = os.path.getsize(file_path) - offset if length is None else length
+        self._size = len(self._head) + self._length + len(self._tail)
+        self._position = 0
+        self._file = None
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(self.chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def __enter__(self) -> 'MultipartFileBody':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, position: int, whence: int = os.SEEK_SET) -> int:
+        base = {os.SEEK_SET: 0, os.SEEK_CUR: self._position, os.SEEK_END: self._size}[whence]
+        self._position = min(max(0, base + position), self._size)
+        self.close()
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self._size - self._position
+        chunks = []
+        while size > 0 and self._position < self._size:
+            chunk = self._read_segment(size)
+            chunks.append(chunk)
+            size -= len(chunk)
+            self._position += len(chunk)
+        return b''.join(chunks)
+
+    def _read_segment(self, size: int) -> bytes:
+        """現在位置から、先頭部分・ファイル・末尾部分のいずれか1つの範囲内で最大 size バイトを返す"""
+        file_start = len(self._head)
+        file_end = file_start + self._length
+        if self._position < file_start:
+            return self._head[self._position:self._position + size]
+        if self._position >= file_end:
+            start = self._position - file_end
+            return self._tail[start:start + size]
+
+        if self._file is None:
+            self._file = open(self._file_path, 'rb')
+            self._file.seek(self._offset + self._position - file_start)
+        data = self._file.read(min(size, file_end - self._position))
+        if not data:
+            raise IOError(f"File is shorter than expected: {self._file_path}")
+        if self._position + len(data) >= file_end:
+            self.close()
+        return data
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+_default_transport: Optional[HTTPTransport] = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> HTTPTransport:
+    """トランスポートを指定しないクライアントが共有する既定のトランスポート"""
+    global _default_transport
+    with _default_lock:
+        if _default_transport is None:
+            _default_transport = HTTPTransport()
+        return _default_transport
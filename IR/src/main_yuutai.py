@@ -17,6 +17,7 @@ python src/main_yuutai.py                    # 当日処理
 python src/main_yuutai.py --date 2025-01-01  # 指定日処理
 python src/main_yuutai.py --company 7201     # 企業別処理
 python src/main_yuutai.py --report           # レポート生成
+python src/main_yuutai.py --poll             # 新着ポーリング
 """
 
 import os
@@ -90,12 +91,15 @@ class YuutaiMainProcessor:
         finally:
             logger.info("=== Yuutai Daily Process Completed ===")
     
-    def run_range_process(self, start_date: str, end_date: str = None) -> List[Dict]:
-        """範囲処理を実行"""
+    def run_range_process(self, start_date: str, end_date: str = None, workers: int = 1) -> List[Dict]:
+        """範囲処理を実行（workers が2以上の場合は並列バックフィル）"""
         logger.info(f"=== Starting Yuutai Range Process: {start_date} to {end_date or start_date} ===")
         
         try:
-            results = self.processor.process_date_range(start_date, end_date)
+            if workers > 1:
+                results = self.processor.backfill_date_range(start_date, end_date, workers)
+            else:
+                results = self.processor.process_date_range(start_date, end_date)
             summary = self.processor.get_processing_summary(results)
             
             logger.info("Range process completed")
@@ -170,6 +174,22 @@ class YuutaiMainProcessor:
         finally:
             logger.info("=== Yuutai Report Generation Completed ===")
     
+    def run_dedupe_downloads(self) -> Dict:
+        """既存のダウンロードファイルをPDFストアに取り込み重複を排除し、参照されなくなった本体を削除"""
+        logger.info("=== Starting PDF Store Import ===")
+        
+        try:
+            pdf_store = self.processor.api_client.pdf_store
+            stats = pdf_store.import_directory()
+            stats.update(self.processor.collect_pdf_garbage())
+            return stats
+            
+        except Exception as e:
+            logger.error(f"PDF store import exception: {str(e)}")
+            return {'error': str(e)}
+        finally:
+            logger.info("=== PDF Store Import Completed ===")
+    
     def run_scheduled_process(self, schedule_time: str = "09:00"):
         """スケジュール実行"""
         logger.info(f"Setting up scheduled execution at {schedule_time}")
@@ -189,6 +209,35 @@ class YuutaiMainProcessor:
         except KeyboardInterrupt:
             logger.info("Yuutai scheduler stopped by user")
     
+    def run_polling_process(self, interval: float = None, max_cycles: int = None):
+        """新着一覧を interval 秒ごとにポーリングし、新しい株主優待開示をすぐに処理"""
+        interval = interval or self.processor.poll_interval
+        logger.info(f"Yuutai polling started (every {interval:.0f}s). Press Ctrl+C to stop.")
+        
+        cycles = 0
+        try:
+            while max_cycles is None or cycles < max_cycles:
+                started = time.time()
+                result = self.processor.poll_once()
+                cycles += 1
+                
+                if result['success']:
+                    stats = result['stats']
+                    if result['new_disclosures']:
+                        logger.info(f"Poll: {result['new_disclosures']} new yuutai disclosures, "
+                                    f"{stats.get('success', 0)} uploaded, {stats.get('failed', 0)} failed, "
+                                    f"{result.get('retrying', 0)} queued for retry "
+                                    f"(watermark {result['watermark']})")
+                    else:
+                        logger.debug(f"Poll: no new yuutai disclosures (watermark {result['watermark']})")
+                else:
+                    logger.warning(f"Poll failed: {result.get('error')}")
+                
+                if max_cycles is None or cycles < max_cycles:
+                    time.sleep(max(0.0, interval - (time.time() - started)))
+        except KeyboardInterrupt:
+            logger.info("Yuutai polling stopped by user")
+    
     def _log_process_summary(self, result: Dict):
         """処理結果のサマリーをログ出力"""
         if 'stats' in result:
@@ -210,6 +259,11 @@ class YuutaiMainProcessor:
         logger.info(f"  Total disclosures: {summary.get('total_disclosures', 0)}")
         logger.info(f"  Successful uploads: {summary.get('successful_uploads', 0)}")
         logger.info(f"  Failed uploads: {summary.get('failed_uploads', 0)}")
+        logger.info(f"  Missing PDFs skipped (cached): {summary.get('missing_file_skips', 0)}")
+        logger.info(f"  Missing PDFs newly recorded: {summary.get('missing_file_marked', 0)}")
+        for host, connection_stats in sorted(summary.get('http_connections', {}).items()):
+            logger.info(f"  HTTP {host}: {connection_stats['requests']} requests over "
+                        f"{connection_stats['connections']} connections ({connection_stats['reused']} reused)")
         
         if summary.get('errors'):
             logger.warning("Errors encountered:")
@@ -240,10 +294,13 @@ def main():
   %(prog)s                                    # 当日の株主優待開示を処理
   %(prog)s --date 2025-01-01                  # 指定日の開示を処理
   %(prog)s --start-date 2025-01-01 --end-date 2025-01-03  # 期間指定処理
+  %(prog)s --start-date 2025-01-01 --end-date 2025-06-30 --workers 4  # 並列バックフィル
   %(prog)s --company 7201                     # 企業別処理
   %(prog)s --keywords 株主優待 新設            # キーワード検索
   %(prog)s --report                          # 日次レポート生成
   %(prog)s --schedule --time 09:00           # スケジュール実行
+  %(prog)s --poll --interval 120              # 新着ポーリング（公開から数分でNotionへ）
+  %(prog)s --dedupe-downloads                 # 既存PDFの重複排除（ハードリンク化）
         """
     )
     
@@ -251,16 +308,20 @@ def main():
     parser.add_argument('--date', help='処理対象日 (YYYY-MM-DD)')
     parser.add_argument('--start-date', help='範囲処理開始日 (YYYY-MM-DD)')
     parser.add_argument('--end-date', help='範囲処理終了日 (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, default=1, help='範囲処理の並列取得ワーカー数 (2以上でバックフィルモード)')
     
     # 特別処理
     parser.add_argument('--company', help='企業コード指定処理')
     parser.add_argument('--days-back', type=int, default=30, help='企業処理の遡及日数 (デフォルト: 30)')
     parser.add_argument('--keywords', nargs='+', help='キーワード検索')
     parser.add_argument('--report', action='store_true', help='日次レポート生成')
+    parser.add_argument('--dedupe-downloads', action='store_true', help='既存のダウンロードPDFをストアに取り込み重複排除')
     
     # スケジュール実行
     parser.add_argument('--schedule', action='store_true', help='スケジュール実行モード')
     parser.add_argument('--time', default='09:00', help='スケジュール実行時刻 (HH:MM)')
+    parser.add_argument('--poll', action='store_true', help='新着ポーリングモード（前回以降の新着のみ処理）')
+    parser.add_argument('--interval', type=float, help='ポーリング間隔（秒、デフォルト: YUUTAI_POLL_INTERVAL または 120）')
     
     # その他オプション
     parser.add_argument('--test', action='store_true', help='テストモード（前日データで実行）')
@@ -292,6 +353,15 @@ def main():
             logger.info("=== SCHEDULE MODE ===")
             main_processor.run_scheduled_process(args.time)
             
+        elif args.poll:
+            logger.info("=== POLL MODE ===")
+            main_processor.run_polling_process(args.interval)
+            
+        elif args.dedupe_downloads:
+            logger.info("=== DEDUPE DOWNLOADS MODE ===")
+            stats = main_processor.run_dedupe_downloads()
+            logger.info(f"PDF store import result: {stats}")
+            
         elif args.report:
             logger.info("=== REPORT MODE ===")
             report = main_processor.generate_report(args.date)
@@ -306,7 +376,7 @@ def main():
             
         elif args.start_date:
             logger.info("=== RANGE MODE ===")
-            results = main_processor.run_range_process(args.start_date, args.end_date)
+            results = main_processor.run_range_process(args.start_date, args.end_date, args.workers)
             
         elif args.date:
             logger.info("=== DATE MODE ===")
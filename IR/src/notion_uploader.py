@@ -1,22 +1,88 @@
 import os
+import time
+import random
 import logging
 import re
-import requests
 import mimetypes
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import fields
 from notion_client import Client
+from notion_client.client import ClientOptions
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
+from http_transport import HTTPTransport, MultipartFileBody, get_default_transport
+
 logger = logging.getLogger(__name__)
 
+# Notion API の接続先と、リクエストに指定するAPIバージョン（notion-client のバージョンによらず固定）
+NOTION_API_BASE_URL = "https://api.notion.com"
+NOTION_VERSION = "2022-06-28"
+
+# 1回の送信で扱えるファイルサイズの上限（超える場合は multi_part）と、multi_part のパートサイズ（5〜20MB）
+MULTI_PART_THRESHOLD = 20 * 1024 * 1024
+MULTI_PART_SIZE = 10 * 1024 * 1024
+
 
 class NotionUploader:
-    def __init__(self, api_key: str, page_id: str):
-        self.client = Client(auth=api_key)
+    def __init__(self, api_key: str, page_id: str, transport: HTTPTransport = None,
+                 base_url: str = NOTION_API_BASE_URL, request_layer=None):
+        # ファイルアップロードのREST呼び出しと notion-client で接続プールを共有
+        self.transport = transport or get_default_transport()
+        self.base_url = base_url.rstrip('/')
+        # notion-client・ファイルアップロードの全リクエストを通すリクエストレイヤー
+        # （execute と wrap_httpx_transport を持つ。レート制限・再試行を共有する）
+        self.request_layer = request_layer
+        options = {}
+        if request_layer is not None:
+            httpx_client = self.transport.httpx_client(request_layer.wrap_httpx_transport)
+            # notion-client 3.x の組み込みの再試行はリクエストレイヤーと重複するため無効にする
+            if 'retry' in {option.name for option in fields(ClientOptions)}:
+                options['retry'] = False
+        else:
+            httpx_client = self.transport.httpx_client()
+        self.client = Client(auth=api_key, client=httpx_client, base_url=self.base_url,
+                             notion_version=NOTION_VERSION, **options)
+        # notion-client がクライアント設定時にタイムアウト・ヘッダーを上書きするため再適用
+        self.transport.tune_httpx_client(self.client.client)
         self.api_key = api_key  # APIキーを保存
         self.page_id = page_id
         self.databases = {}  # データタイプ別のデータベースIDを管理
+        self._child_databases: Optional[Dict[str, str]] = None  # ページ配下の子データベース（名前 → ID）
+        
+        # multi_part_threshold バイトを超えるファイルは part_size バイトのパートに分けて
+        # part_workers 本で並列に送信し、失敗したパートは part_retries 回まで送り直す
+        self.multi_part_threshold = MULTI_PART_THRESHOLD
+        self.part_size = MULTI_PART_SIZE
+        self.part_workers = 3
+        self.part_retries = 3
+        self.part_retry_backoff = 1.0
         
+    def query_database(self, database_id: str, **body) -> Dict[str, Any]:
+        """データベースをクエリ（notion-client 3.x には databases.query がないため直接リクエスト）"""
+        return self.client.request(path=f"databases/{database_id}/query", method="POST", body=body)
+    
+    def create_database(self, **body) -> Dict[str, Any]:
+        """データベースを作成（notion-client 3.x の databases.create は properties を送らないため直接リクエスト）"""
+        return self.client.request(path="databases", method="POST", body=body)
+    
+    def _rest_request(self, method: str, url: str, **kwargs):
+        """notion-client を通さない Notion API リクエスト（ファイルアップロード用、リクエストレイヤーを共有）"""
+        if self.request_layer is None:
+            return self.transport.request(method, url, **kwargs)
+        
+        def send():
+            # 再送時は本文・添付ファイルを先頭から読み直す
+            if hasattr(kwargs.get('data'), 'seek'):
+                kwargs['data'].seek(0)
+            for value in (kwargs.get('files') or {}).values():
+                if isinstance(value, tuple) and hasattr(value[1], 'seek'):
+                    value[1].seek(0)
+            return self.transport.request(method, url, **kwargs)
+        
+        return self.request_layer.execute(method, url, send, (requests.ConnectionError, requests.Timeout))
+    
     def _get_or_create_database(self, data_type: str) -> Optional[str]:
         """データタイプに応じたデータベースを取得または作成"""
         if data_type in self.databases:
@@ -52,7 +118,7 @@ class NotionUploader:
                 "日付": {"date": {}}
             }
             
-            response = self.client.databases.create(
+            response = self.create_database(
                 parent={"page_id": self.page_id},
                 title=[{"type": "text", "text": {"content": database_name}}],
                 properties=properties
@@ -60,6 +126,7 @@ class NotionUploader:
             
             db_id = response["id"]
             self.databases[data_type] = db_id
+            self._register_child_database(database_name, db_id)
             logger.info(f"Created new database for {data_type}: {db_id}")
             return db_id
             
@@ -68,27 +135,50 @@ class NotionUploader:
             return None
     
     def _find_existing_database(self, database_name: str) -> Optional[str]:
-        """ページ配下の既存データベースを検索"""
-        try:
-            # ページの子ブロックを取得
-            blocks = self.client.blocks.children.list(block_id=self.page_id)
+        """ページ配下の既存データベースを検索（子データベースの一覧は初回だけ取得して共有）"""
+        child_databases = self._get_child_databases()
+        return child_databases.get(database_name) if child_databases is not None else None
+    
+    def _get_child_databases(self) -> Optional[Dict[str, str]]:
+        """ページ配下の子データベース（データベース名 → ID）。取得に失敗した場合はNone"""
+        if self._child_databases is None:
+            try:
+                self._child_databases = self._list_child_databases()
+                logger.info(f"Found {len(self._child_databases)} child databases under page {self.page_id}")
+            except Exception as e:
+                logger.error(f"Failed to find existing database: {str(e)}")
+                return None
+        return self._child_databases
+    
+    def _list_child_databases(self) -> Dict[str, str]:
+        """ページの子ブロックを全ページ取得し、child_database ブロックのタイトルから名前 → IDを作成"""
+        child_databases: Dict[str, str] = {}
+        start_cursor = None
+        while True:
+            params = {'block_id': self.page_id, 'page_size': 100}
+            if start_cursor:
+                params['start_cursor'] = start_cursor
+            blocks = self.client.blocks.children.list(**params)
             
             for block in blocks['results']:
-                if block['type'] == 'child_database':
-                    # データベースのタイトルを確認
-                    db_id = block['id']
-                    db_info = self.client.databases.retrieve(database_id=db_id)
-                    
-                    if db_info.get('title'):
-                        title = ''.join([t['plain_text'] for t in db_info['title'] if 'plain_text' in t])
-                        if title == database_name:
-                            return db_id
-            
-            return None
+                if block.get('type') != 'child_database' or block.get('in_trash') or block.get('archived'):
+                    continue
+                # 同名のデータベースが複数ある場合はページ上で先にあるものを使う
+                title = block.get('child_database', {}).get('title', '')
+                child_databases.setdefault(title, block['id'])
             
-        except Exception as e:
-            logger.error(f"Failed to find existing database: {str(e)}")
-            return None
+            if not blocks.get('has_more') or not blocks.get('next_cursor'):
+                return child_databases
+            start_cursor = blocks['next_cursor']
+    
+    def _register_child_database(self, database_name: str, database_id: str):
+        """作成したデータベースを子データベースの一覧に追加"""
+        if self._child_databases is not None:
+            self._child_databases[database_name] = database_id
+    
+    def invalidate_child_databases(self):
+        """子データベースの一覧を破棄（次回の検索で取得し直す）"""
+        self._child_databases = None
     
     def _get_database_properties(self, database_id: str) -> Optional[Dict[str, Any]]:
         """データベースのプロパティ情報を取得"""
@@ -124,17 +214,12 @@ class NotionUploader:
     def _upload_and_attach_physical_file(self, page_id: str, file_path: str, filename: str, mime_type: str) -> bool:
         """物理ファイルをデータベースの物理ファイル列に直接アップロード"""
         try:
-            # Step 1: ファイルアップロードを初期化
-            file_upload_id = self._create_file_upload(filename, mime_type)
+            # Step 1: ファイルをアップロード（大きいファイルは multi_part）
+            file_upload_id = self._upload_file(file_path, filename, mime_type)
             if not file_upload_id:
                 return False
             
-            # Step 2: ファイルを送信
-            upload_success = self._send_file_upload(file_upload_id, file_path, filename, mime_type)
-            if not upload_success:
-                return False
-            
-            # Step 3: データベースページのプロパティを直接更新
+            # Step 2: データベースページのプロパティを直接更新
             logger.info(f"Uploading file to database property: {filename}")
             success = self._update_database_file_property(page_id, file_upload_id, filename)
             
@@ -399,8 +484,8 @@ class NotionUploader:
                     return False  # データベースが存在しない場合は重複なし
             
             # データベースをクエリして元のファイル名を検索
-            response = self.client.databases.query(
-                database_id=database_id,
+            response = self.query_database(
+                database_id,
                 filter={
                     "property": "名前",
                     "title": {
@@ -501,19 +586,13 @@ class NotionUploader:
     def _upload_file_via_notion_api(self, file_path: str, filename: str, mime_type: str) -> Optional[Dict]:
         """ファイルをNotion API経由でアップロード"""
         try:
-            # Step 1: ファイルアップロードを初期化
-            file_upload_id = self._create_file_upload(filename, mime_type)
+            # Step 1: ファイルをアップロード（大きいファイルは multi_part）
+            file_upload_id = self._upload_file(file_path, filename, mime_type)
             if not file_upload_id:
-                logger.error("Failed to create file upload")
-                return None
-            
-            # Step 2: ファイルを送信
-            upload_success = self._send_file_upload(file_upload_id, file_path, filename, mime_type)
-            if not upload_success:
-                logger.error("Failed to send file upload")
+                logger.error("Failed to upload file")
                 return None
             
-            # Step 3: 正しい形式でファイル参照を返す
+            # Step 2: 正しい形式でファイル参照を返す
             file_reference = {
                 "name": filename,
                 "type": "file_upload",
@@ -529,16 +608,96 @@ class NotionUploader:
             logger.error(f"Failed to upload file via Notion API: {str(e)}")
             return None
     
+    def _upload_file(self, file_path: str, filename: str, mime_type: str) -> Optional[str]:
+        """
+        ファイルをアップロードしてファイルアップロードIDを返す（失敗時はNone）
+        
+        multi_part_threshold を超えるファイルは part_size ごとに分割し、multi_part モードで送信する。
+        """
+        file_size = os.path.getsize(file_path)
+        if file_size > self.multi_part_threshold:
+            return self._upload_multi_part(file_path, filename, mime_type, file_size)
+        
+        file_upload_id = self._create_file_upload(filename, mime_type)
+        if not file_upload_id:
+            return None
+        if not self._send_file_upload(file_upload_id, file_path, filename, mime_type):
+            return None
+        return file_upload_id
+    
+    def _upload_multi_part(self, file_path: str, filename: str, mime_type: str, file_size: int) -> Optional[str]:
+        """ファイルを固定サイズのパートに分けて並列に送信し、アップロードを完了する"""
+        number_of_parts = -(-file_size // self.part_size)
+        file_upload_id = self._create_file_upload(filename, mime_type, number_of_parts)
+        if not file_upload_id:
+            return None
+        
+        logger.info(f"Sending {filename} in {number_of_parts} parts ({file_size} bytes)")
+        parts = [(part_number, (part_number - 1) * self.part_size,
+                  min(self.part_size, file_size - (part_number - 1) * self.part_size))
+                 for part_number in range(1, number_of_parts + 1)]
+        with ThreadPoolExecutor(max_workers=min(self.part_workers, number_of_parts),
+                                thread_name_prefix='notion-part') as executor:
+            sent = list(executor.map(
+                lambda part: self._send_file_part(file_upload_id, file_path, filename, mime_type, *part), parts))
+        if not all(sent):
+            logger.error(f"Failed to send all parts of {filename}")
+            return None
+        
+        completed = self._complete_file_upload(file_upload_id)
+        if not completed or completed.get('status') != 'uploaded':
+            logger.error(f"Failed to complete multi-part upload: {filename}")
+            return None
+        return file_upload_id
+    
+    def _send_file_part(self, file_upload_id: str, file_path: str, filename: str, mime_type: str,
+                        part_number: int, offset: int, length: int) -> bool:
+        """
+        パートをファイルから読み出して送信（5xx・接続エラーはパート単位で再試行）
+        
+        429 はリクエストレイヤーが Retry-After に従って再送するため、ここでは再試行しない
+        （リクエストレイヤーなしの場合のみパート単位で再試行する）。
+        """
+        url = f"{self.base_url}/v1/file_uploads/{file_upload_id}/send"
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Notion-Version": NOTION_VERSION
+        }
+        
+        for attempt in range(self.part_retries + 1):
+            try:
+                # パートの範囲をファイルから読み出しながら送信する
+                with MultipartFileBody({"part_number": str(part_number)}, "file", filename, mime_type,
+                                       file_path, offset, length) as body:
+                    response = self._rest_request('POST', url, headers=dict(headers, **{
+                        "Content-Type": body.content_type}), data=body)
+                    response.raise_for_status()
+                return True
+                
+            except Exception as e:
+                status = getattr(getattr(e, 'response', None), 'status_code', None)
+                if status is None:
+                    retryable = isinstance(e, (requests.ConnectionError, requests.Timeout))
+                else:
+                    retryable = status >= 500 or (status == 429 and self.request_layer is None)
+                if not retryable or attempt >= self.part_retries:
+                    logger.error(f"Failed to send part {part_number} of {filename}: {str(e)}")
+                    return False
+                wait = self.part_retry_backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+                logger.warning(f"Retrying part {part_number} of {filename} in {wait:.1f}s: {str(e)}")
+                time.sleep(wait)
+        return False
+    
     def _get_file_upload_info(self, file_upload_id: str) -> Optional[Dict]:
         """ファイルアップロード情報を取得"""
         try:
-            url = f"https://api.notion.com/v1/file_uploads/{file_upload_id}"
+            url = f"{self.base_url}/v1/file_uploads/{file_upload_id}"
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
-                "Notion-Version": "2022-06-28"
+                "Notion-Version": NOTION_VERSION
             }
             
-            response = requests.get(url, headers=headers)
+            response = self._rest_request('GET', url, headers=headers)
             response.raise_for_status()
             
             return response.json()
@@ -550,13 +709,13 @@ class NotionUploader:
                 logger.error(f"Response text: {e.response.text}")
             return None
     
-    def _create_file_upload(self, filename: str, mime_type: str) -> Optional[str]:
-        """ファイルアップロードを初期化"""
+    def _create_file_upload(self, filename: str, mime_type: str, number_of_parts: int = None) -> Optional[str]:
+        """ファイルアップロードを初期化（number_of_parts を指定した場合は multi_part モード）"""
         try:
-            url = "https://api.notion.com/v1/file_uploads"
+            url = f"{self.base_url}/v1/file_uploads"
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
-                "Notion-Version": "2022-06-28",
+                "Notion-Version": NOTION_VERSION,
                 "Content-Type": "application/json"
             }
             
@@ -564,8 +723,10 @@ class NotionUploader:
                 "name": filename,
                 "content_type": mime_type
             }
+            if number_of_parts:
+                payload.update({"mode": "multi_part", "number_of_parts": number_of_parts, "filename": filename})
             
-            response = requests.post(url, headers=headers, json=payload)
+            response = self._rest_request('POST', url, headers=headers, json=payload)
             response.raise_for_status()
             
             data = response.json()
@@ -584,19 +745,16 @@ class NotionUploader:
     def _send_file_upload(self, file_upload_id: str, file_path: str, filename: str, mime_type: str) -> bool:
         """ファイルを送信"""
         try:
-            url = f"https://api.notion.com/v1/file_uploads/{file_upload_id}/send"
+            url = f"{self.base_url}/v1/file_uploads/{file_upload_id}/send"
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
-                "Notion-Version": "2022-06-28"
+                "Notion-Version": NOTION_VERSION
             }
             
-            with open(file_path, "rb") as f:
-                files = {
-                    "file": (filename, f, mime_type),
-                    "part_number": (None, "1")
-                }
-                
-                response = requests.post(url, headers=headers, files=files)
+            # 本文をメモリ上に組み立てず、ファイルを読み出しながら送信する
+            with MultipartFileBody({"part_number": "1"}, "file", filename, mime_type, file_path) as body:
+                headers["Content-Type"] = body.content_type
+                response = self._rest_request('POST', url, headers=headers, data=body)
                 response.raise_for_status()
             
             logger.info(f"Successfully sent file: {filename}")
@@ -609,24 +767,23 @@ class NotionUploader:
                 logger.error(f"Response text: {e.response.text}")
             return False
     
-    def _complete_file_upload(self, file_upload_id: str) -> Optional[str]:
-        """ファイルアップロードを完了"""
+    def _complete_file_upload(self, file_upload_id: str) -> Optional[Dict]:
+        """ファイルアップロード（multi_part）を完了し、完了後のファイルアップロード情報を返す"""
         try:
-            url = f"https://api.notion.com/v1/file_uploads/{file_upload_id}/complete"
+            url = f"{self.base_url}/v1/file_uploads/{file_upload_id}/complete"
             headers = {
                 "Authorization": f"Bearer {self.api_key}",
-                "Notion-Version": "2022-06-28",
+                "Notion-Version": NOTION_VERSION,
                 "Content-Type": "application/json"
             }
             
-            response = requests.post(url, headers=headers, json={})
+            response = self._rest_request('POST', url, headers=headers, json={})
             response.raise_for_status()
             
             data = response.json()
-            file_url = data.get("url")
             
-            logger.info(f"Completed file upload with URL: {file_url}")
-            return file_url
+            logger.info(f"Completed file upload: {file_upload_id} ({data.get('status')})")
+            return data
             
         except Exception as e:
             logger.error(f"Failed to complete file upload: {str(e)}")
@@ -806,7 +963,7 @@ class NotionUploader:
                 filename = metadata.get('original_filename', os.path.basename(file_source))
                 try:
                     # URLからファイルサイズを取得（HEAD リクエスト）
-                    response = requests.head(file_source)
+                    response = self.transport.head(file_source)
                     file_size = int(response.headers.get('content-length', 0))
                 except:
                     file_size = 0  # サイズ取得に失敗した場合
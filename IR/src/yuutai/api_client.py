@@ -1,63 +1,151 @@
 import os
+import sys
+import hashlib
+import tempfile
 import requests
-import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple, Any
 import json
-import re
+
+from yuutai.decoding import decode_listing_response
+from yuutai.listing_cache import ListingCache
+from yuutai.models import Disclosure
+from yuutai.pdf_store import PDFStore
+from yuutai.classifier import YUUTAI_KEYWORDS, YuutaiTitleMatcher
+from yuutai.rate_limiter import TokenBucketRateLimiter, parse_retry_after
+
+# 親ディレクトリを追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from http_transport import HTTPTransport, get_default_transport
 
 logger = logging.getLogger(__name__)
 
+YANOSHIN_API_BASE_URL = "https://webapi.yanoshin.jp/webapi/tdnet/list"
+
 class YuutaiAPIClient:
     """株主優待開示情報API クライアント (YANOSHIN TDNET API使用)"""
     
-    def __init__(self, download_dir: str = "./downloads/yuutai"):
+    def __init__(self, download_dir: str = "./downloads/yuutai", cache_dir: Optional[str] = None,
+                 cache_today_ttl: float = 300, request_interval: float = 1.0, max_file_size_mb: float = 50,
+                 max_download_workers: int = 4, download_interval: float = 0.25,
+                 missing_recheck_days: float = 7, transport: HTTPTransport = None,
+                 base_url: str = YANOSHIN_API_BASE_URL, use_pdf_store: bool = False):
         # YANOSHIN TDNET APIの設定
-        self.base_url = "https://webapi.yanoshin.jp/webapi/tdnet/list"
+        self.base_url = base_url.rstrip('/')
         self.download_dir = download_dir
-        self.session = requests.Session()
-        self.session.headers.update({
+        # ホスト別の接続プールを共有するトランスポート（requests.Session と同じ get を持つ）
+        self.session = transport or get_default_transport()
+        self.request_headers = {
             'User-Agent': 'Yuutai Disclosure Client/1.0',
             'Accept': 'application/json'
-        })
+        }
         
         # ダウンロードディレクトリを作成
         os.makedirs(download_dir, exist_ok=True)
         
-        # レート制限対応
-        self.last_request_time = 0
-        self.min_interval = 1.0  # 1秒間隔
+        # PDFダウンロード設定（ストリーミングで受信し、上限を超えた時点で中断）
+        self.max_file_size = int(max_file_size_mb * 1024 * 1024)
+        self.download_chunk_size = 64 * 1024
+        # PDFはTDnet（release.tdnet.info）から取得するため、一覧APIとは別の同時接続数・レートで制御
+        # 同時接続数はクライアント全体で共有するワーカープールで制限（バックフィルの各ワーカーからも共有）
+        self.max_download_workers = max(1, max_download_workers)
+        self._download_executor = None
+        self._download_executor_lock = threading.Lock()
+        # 開示ID・SHA-256で重複排除するPDFストア（ファイル名は本体へのハードリンク、use_pdf_store=Trueで有効）
+        self.pdf_store = PDFStore(download_dir) if use_pdf_store else None
+        
+        # 日次一覧のローカルキャッシュとレート制限の状態ファイル（cache_dir=Noneで無効）
+        self.listing_cache = ListingCache(cache_dir, cache_today_ttl) if cache_dir else None
+        # 404/410 が返ったPDFはこの間隔が過ぎるまで再取得しない（PDFストアのマニフェストに記録）
+        self.missing_recheck_interval = missing_recheck_days * 24 * 60 * 60
+        
+        # 一覧取得の設定（1リクエストの件数上限と、範囲条件1つあたりの最大日数）
+        self.page_size = 1000
+        self.max_range_days = 31
+        # 企業別履歴の未取得日がこの日数以下なら範囲条件で補完、超える場合は企業コード条件で取得
+        self.company_topup_max_days = 7
+        
+        # 新着ポーリングの設定（1リクエストの件数と、ウォーターマークまでさかのぼる最大ページ数）
+        self.poll_page_size = 100
+        self.max_poll_pages = 10
+        self._poll_watermark = None
+        # アップロードに失敗した新着はウォーターマークを止めずに、この回数まで次回以降のポーリングで再試行
+        self.max_poll_retries = 5
+        self._poll_retries = {}
+        
+        # 実行統計
+        self.stats = {
+            'listing_requests': 0,
+            'poll_items': 0,
+            'listing_cache_hits': 0,
+            'throttled': 0,
+            'missing_file_skips': 0,
+            'missing_file_marked': 0,
+            'pdf_store_hits': 0
+        }
+        self._stats_lock = threading.Lock()
+        
+        # レート制限対応（スレッド間・プロセス間で共有するトークンバケット、429/503で自動減速）
+        self.rate_limiter = TokenBucketRateLimiter(
+            rate=1.0 / request_interval,
+            name='yanoshin',
+            state_path=os.path.join(cache_dir, 'rate_limits.sqlite3') if cache_dir else None
+        )
+        self.download_rate_limiter = TokenBucketRateLimiter(
+            rate=1.0 / download_interval,
+            name='tdnet',
+            state_path=os.path.join(cache_dir, 'rate_limits.sqlite3') if cache_dir else None
+        )
+        self.max_retries = 3
         
-        # 株主優待関連キーワード
-        self.yuutai_keywords = [
-            "株主優待", "優待制度", "優待内容", "株主優待制度", 
-            "優待", "株主特典", "株主様ご優待", "株主優待券",
-            "株主優待品", "優待商品", "株主様特典"
-        ]
+        # 株主優待関連キーワードと、事前コンパイルした正規表現で関連判定・カテゴリ分類を行うマッチャー
+        self.yuutai_keywords = list(YUUTAI_KEYWORDS)
+        self.title_matcher = YuutaiTitleMatcher(self.yuutai_keywords)
     
     def _wait_for_rate_limit(self):
         """レート制限に対応した待機"""
-        elapsed = time.time() - self.last_request_time
-        if elapsed < self.min_interval:
-            time.sleep(self.min_interval - elapsed)
-        self.last_request_time = time.time()
+        self.rate_limiter.acquire()
+    
+    def _get_with_backoff(self, url: str, rate_limiter: TokenBucketRateLimiter = None, **kwargs) -> requests.Response:
+        """レート制限付きGET（429/503 は Retry-After に従って待機し再試行）"""
+        rate_limiter = rate_limiter or self.rate_limiter
+        for attempt in range(self.max_retries + 1):
+            rate_limiter.acquire()
+            response = self.session.get(url, headers=self.request_headers, **kwargs)
+            
+            if response.status_code in (429, 503) and attempt < self.max_retries:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                with self._stats_lock:
+                    self.stats['throttled'] += 1
+                rate_limiter.penalize(retry_after)
+                response.close()
+                continue
+            
+            if response.ok:
+                rate_limiter.reward()
+            return response
     
     def _make_request(self, condition: str, format: str = 'json', params: Dict = None) -> Optional[Dict]:
         """YANOSHIN TDNET API リクエスト実行"""
-        self._wait_for_rate_limit()
-        
         try:
             url = f"{self.base_url}/{condition}.{format}"
-            response = self.session.get(url, params=params)
+            response = self._get_with_backoff(url, params=params)
             response.raise_for_status()
             
             logger.info(f"API request successful: {condition}.{format}")
-            return response.json()
+            # 使用する項目だけを型付きでデコード（msgspec → orjson → json）
+            return decode_listing_response(response.content)
             
         except requests.exceptions.RequestException as e:
             logger.error(f"API request failed: {condition}.{format} - {str(e)}")
             return None
+        except ValueError as e:
+            logger.error(f"Invalid API response: {condition}.{format} - {str(e)}")
+            return None
     
     def get_daily_disclosures(self, date: str = None) -> Optional[List[Dict]]:
         """
@@ -72,99 +160,218 @@ class YuutaiAPIClient:
         
         logger.info(f"Fetching disclosures for date: {date}")
         
+        yuutai_disclosures = list(self.iter_daily_disclosures(date))
+        
+        logger.info(f"Found {len(yuutai_disclosures)} yuutai-related disclosures for {date}")
+        return yuutai_disclosures
+    
+    def iter_daily_disclosures(self, date: str = None) -> Iterator[Dict]:
+        """
+        指定日の株主優待関連開示を1ページずつ取得しながら順に返すジェネレータ
+        
+        1日の件数が page_size を超えても全ページを遅延取得し、各ページの処理後に
+        そのページのアイテムを破棄するため、メモリ使用量は1ページ分で一定。
+        Args:
+            date: YYYY-MM-DD形式の日付（省略時は当日）
+        """
+        if date is None:
+            date = datetime.now().strftime('%Y-%m-%d')
+        
+        if self.listing_cache and self.listing_cache.is_cached(date):
+            with self._stats_lock:
+                self.stats['listing_cache_hits'] += 1
+            logger.info(f"Listing cache hit: {date}")
+            for page_items in self.listing_cache.iter_pages(date):
+                yield from self._filter_yuutai_items(page_items, date)
+            return
+        
         # YANOSHIN API用の日付フォーマット (YYYYMMDD)
         date_condition = date.replace('-', '')
         
-        params = {
-            'limit': 1000  # 1日分を全て取得
-        }
+        page_number = 0
+        item_count = 0
+        for page_items in self._iter_condition_pages(date_condition):
+            if page_items is None:
+                logger.warning(f"No data found for date: {date}")
+                return
+            
+            # ページ単位でキャッシュに書き込み、全ページ取得後に確定する
+            if self.listing_cache:
+                self.listing_cache.put_page(date, page_number, page_items)
+            page_number += 1
+            item_count += len(page_items)
+            
+            yield from self._filter_yuutai_items(page_items, date)
         
-        response = self._make_request(date_condition, 'json', params)
-        if not response or 'items' not in response:
-            logger.warning(f"No data found for date: {date}")
-            return []
+        if self.listing_cache:
+            self.listing_cache.commit(date, item_count)
+    
+    def get_range_disclosures(self, start_date: str, end_date: str) -> Dict[str, List[Dict]]:
+        """
+        期間内の株主優待関連開示を日付ごとに取得
+        Returns:
+            {YYYY-MM-DD: 株主優待関連開示情報のリスト}（取得できなかった日は含まれない）
+        """
+        listings = self.fetch_listing_range(start_date, end_date)
+        return {date: self._filter_yuutai_items(items, date) for date, items in sorted(listings.items())}
+    
+    def _filter_yuutai_items(self, items: List[Dict], date: str) -> List[Disclosure]:
+        """一覧アイテムから株主優待関連の開示のみを抽出して開示情報に変換"""
+        # 一覧全体のタイトルをまとめて判定（関連フラグとカテゴリコード）
+        titles = [item['Tdnet'].get('title', '') if 'Tdnet' in item else None for item in items]
+        related_flags, category_codes = self.title_matcher.classify_batch(titles)
+        category_names = self.title_matcher.category_names
         
         # 株主優待関連の開示のみフィルタリング
         yuutai_disclosures = []
         
-        for item in response['items']:
-            if 'Tdnet' in item:
-                tdnet_data = item['Tdnet']
-                title = tdnet_data.get('title', '')
-                
-                # タイトルに優待関連キーワードが含まれているかチェック
-                if self._is_yuutai_related(title):
-                    # 銘柄コードを取得し、5桁の場合は末尾の0を削除して4桁にする
-                    company_code = tdnet_data.get('company_code', '')
-                    if company_code and len(company_code) == 5 and company_code.endswith('0'):
-                        company_code = company_code[:-1]
-                        logger.debug(f"Converted stock code from {tdnet_data.get('company_code')} to {company_code}")
-                    
-                    disclosure = {
-                        'id': tdnet_data.get('id'),
-                        'title': title,
-                        'company_code': company_code,
-                        'company_name': tdnet_data.get('company_name'),
-                        'disclosure_date': date,
-                        'disclosure_time': tdnet_data.get('pubdate', ''),
-                        'document_type': 'TDNET',
-                        'pdf_url': tdnet_data.get('document_url', ''),
-                        'category': self._categorize_yuutai_disclosure(title),
-                        'markets_string': tdnet_data.get('markets_string', ''),
-                        'url_xbrl': tdnet_data.get('url_xbrl', ''),
-                        'raw_data': tdnet_data
-                    }
-                    yuutai_disclosures.append(disclosure)
+        for item, title, related, category_code in zip(items, titles, related_flags, category_codes):
+            if not related:
+                continue
+            
+            tdnet_data = item['Tdnet']
+            
+            # 銘柄コードを取得し、5桁の場合は末尾の0を削除して4桁にする
+            company_code = tdnet_data.get('company_code', '')
+            if company_code and len(company_code) == 5 and company_code.endswith('0'):
+                company_code = company_code[:-1]
+                logger.debug(f"Converted stock code from {tdnet_data.get('company_code')} to {company_code}")
+            
+            # 一覧キャッシュのインデックスに登録済みのアイテムは raw_data を保持せず、参照時に読み込む
+            indexed = self.listing_cache is not None and bool(company_code) and tdnet_data.get('id') is not None
+            disclosure = Disclosure.from_tdnet(
+                tdnet_data, date, category_names[category_code], company_code,
+                raw_source=self.listing_cache if indexed else None
+            )
+            yuutai_disclosures.append(disclosure)
         
-        logger.info(f"Found {len(yuutai_disclosures)} yuutai-related disclosures for {date}")
         return yuutai_disclosures
     
+    def reclassify_cached_listings(self, start_date: str = None, end_date: str = None) -> Dict[str, List[Dict]]:
+        """
+        キャッシュ済みの日次一覧を現在のキーワード設定で再判定（APIへの再取得なし）
+        Returns:
+            {YYYY-MM-DD: 株主優待関連開示情報のリスト}（キャッシュ済みの日のみ）
+        """
+        if not self.listing_cache:
+            return {}
+        
+        results = {}
+        for date in self.listing_cache.cached_days(start_date, end_date):
+            results[date] = []
+            for page_items in self.listing_cache.iter_pages(date):
+                results[date].extend(self._filter_yuutai_items(page_items, date))
+        
+        logger.info(f"Reclassified {len(results)} cached listing days: "
+                    f"{sum(len(disclosures) for disclosures in results.values())} yuutai-related disclosures")
+        return results
+    
+    def _iter_condition_pages(self, condition: str) -> Iterator[Optional[List[Dict]]]:
+        """
+        条件（YYYYMMDD または YYYYMMDD-YYYYMMDD）に一致する一覧を1ページずつ返すジェネレータ
+        
+        取得済み件数をオフセットとして次ページを要求し、上限件数に満たないページで終了する。
+        リクエストに失敗した場合は None を返して終了する。
+        """
+        offset = 0
+        
+        while True:
+            params = {'limit': self.page_size}
+            if offset:
+                params['offset'] = offset
+            
+            with self._stats_lock:
+                self.stats['listing_requests'] += 1
+            response = self._make_request(condition, 'json', params)
+            if not response or 'items' not in response:
+                yield None
+                return
+            
+            page_items = response['items']
+            yield page_items
+            
+            # 上限件数に満たないページが最終ページ
+            if len(page_items) < self.page_size:
+                return
+            offset += len(page_items)
+    
+    def _fetch_condition_items(self, condition: str) -> Optional[List[Dict]]:
+        """条件に一致する一覧を全ページ取得"""
+        items = []
+        for page_items in self._iter_condition_pages(condition):
+            if page_items is None:
+                return None
+            items.extend(page_items)
+        return items
+    
+    def _split_into_ranges(self, dates: List[str]) -> List[tuple]:
+        """日付リストを連続した期間（最大 max_range_days 日）にまとめる"""
+        ranges = []
+        for date in sorted(dates):
+            day = datetime.strptime(date, '%Y-%m-%d')
+            if ranges:
+                range_start, range_end = ranges[-1]
+                if (day - range_end).days == 1 and (day - range_start).days < self.max_range_days:
+                    ranges[-1] = (range_start, day)
+                    continue
+            ranges.append((day, day))
+        return ranges
+    
+    def fetch_listing_range(self, start_date: str, end_date: str) -> Dict[str, List[Dict]]:
+        """
+        期間内の一覧を範囲条件でまとめて取得し、日付ごとのアイテムに分割
+        
+        キャッシュ済みの日はリクエストせず、未取得の連続期間ごとに
+        YYYYMMDD-YYYYMMDD 条件のリクエスト（ページング付き）を送る。
+        取得できなかった日は戻り値に含まれない。
+        """
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+        
+        listings = {}
+        missing_dates = []
+        for date in dates:
+            cached = self.listing_cache.get(date) if self.listing_cache else None
+            if cached is not None:
+                with self._stats_lock:
+                    self.stats['listing_cache_hits'] += 1
+                listings[date] = cached
+            else:
+                missing_dates.append(date)
+        
+        for range_start, range_end in self._split_into_ranges(missing_dates):
+            condition = f"{range_start.strftime('%Y%m%d')}-{range_end.strftime('%Y%m%d')}"
+            items = self._fetch_condition_items(condition)
+            if items is None:
+                logger.warning(f"Failed to fetch listing range: {condition}")
+                continue
+            
+            # pubdate（YYYY-MM-DD HH:MM:SS）で日付ごとに振り分け
+            range_dates = [(range_start + timedelta(days=i)).strftime('%Y-%m-%d')
+                           for i in range((range_end - range_start).days + 1)]
+            grouped = {date: [] for date in range_dates}
+            for item in items:
+                pubdate = item.get('Tdnet', {}).get('pubdate') or ''
+                if pubdate[:10] in grouped:
+                    grouped[pubdate[:10]].append(item)
+            
+            for date, day_items in grouped.items():
+                if self.listing_cache:
+                    self.listing_cache.put(date, day_items)
+                listings[date] = day_items
+            
+            logger.info(f"Fetched listing range {condition}: {len(items)} items over {len(range_dates)} days")
+        
+        return listings
+    
     def _is_yuutai_related(self, title: str) -> bool:
         """タイトルが株主優待関連かどうかを判定"""
-        if not title:
-            return False
-        
-        # キーワードマッチング
-        for keyword in self.yuutai_keywords:
-            if keyword in title:
-                return True
-        
-        # より詳細なパターンマッチング
-        yuutai_patterns = [
-            r'株主.*優待',
-            r'優待.*制度',
-            r'株主.*特典',
-            r'優待.*内容',
-            r'優待.*導入',
-            r'優待.*変更',
-            r'優待.*廃止',
-            r'優待.*新設'
-        ]
-        
-        for pattern in yuutai_patterns:
-            if re.search(pattern, title):
-                return True
-        
-        return False
+        return self.title_matcher.is_related(title)
     
     def _categorize_yuutai_disclosure(self, title: str) -> str:
         """株主優待開示のカテゴリを判定"""
-        if not title:
-            return 'その他'
-        
-        # カテゴリ分類ルール
-        if any(word in title for word in ['新設', '導入', '開始']):
-            return '優待新設'
-        elif any(word in title for word in ['変更', '修正', '見直し']):
-            return '優待変更'
-        elif any(word in title for word in ['廃止', '終了', '中止']):
-            return '優待廃止'
-        elif any(word in title for word in ['内容', '詳細']):
-            return '優待内容'
-        elif any(word in title for word in ['基準日', '権利']):
-            return '権利基準日'
-        else:
-            return '優待制度'
+        return self.title_matcher.categorize(title)
     
     def _construct_pdf_url(self, item: Dict) -> str:
         """PDF URLを構築（YANOSHIN TDNET API用）"""
@@ -191,22 +398,52 @@ class YuutaiAPIClient:
                 logger.info(f"File already exists: {filename}")
                 return file_path
             
-            # ダウンロード実行
-            self._wait_for_rate_limit()
-            
-            response = self.session.get(pdf_url)
-            response.raise_for_status()
+            # 同じ開示IDの文書を保存済み（銘柄コード表記違い・再実行）なら取得せずにリンク
+            stored_sha256 = self.pdf_store.lookup(doc_id) if self.pdf_store else None
+            if stored_sha256 and self.pdf_store.materialize(stored_sha256, file_path, doc_id):
+                disclosure_data['sha256'] = stored_sha256
+                with self._stats_lock:
+                    self.stats['pdf_store_hits'] += 1
+                logger.info(f"Linked stored file: {filename}")
+                return file_path
             
-            # ファイルサイズチェック（50MB制限）
-            content_length = response.headers.get('content-length')
-            if content_length and int(content_length) > 50 * 1024 * 1024:
-                logger.warning(f"File too large: {filename} ({content_length} bytes)")
+            # 存在しないと記録済みのURLはリクエストしない
+            if self.pdf_store and self.pdf_store.is_known_missing(pdf_url, self.missing_recheck_interval):
+                with self._stats_lock:
+                    self.stats['missing_file_skips'] += 1
+                logger.info(f"Skipping known missing file: {pdf_url}")
                 return None
             
-            # ファイルを保存
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
+            # ダウンロード実行
+            response = self._get_with_backoff(pdf_url, self.download_rate_limiter, stream=True)
+            try:
+                if response.status_code in (404, 410):
+                    if self.pdf_store:
+                        self.pdf_store.mark_missing(pdf_url, response.status_code)
+                        with self._stats_lock:
+                            self.stats['missing_file_marked'] += 1
+                    logger.warning(f"File not found ({response.status_code}): {pdf_url}")
+                    return None
+                
+                response.raise_for_status()
+                
+                # ファイルサイズチェック（Content-Lengthが上限を超える場合は本文を受信しない）
+                content_length = response.headers.get('content-length')
+                if content_length and int(content_length) > self.max_file_size:
+                    logger.warning(f"File too large: {filename} ({content_length} bytes)")
+                    return None
+                
+                sha256 = self._stream_to_file(response, file_path, filename)
+            finally:
+                response.close()
+            
+            if not sha256:
+                return None
             
+            if self.pdf_store:
+                self.pdf_store.add(file_path, sha256, doc_id)
+                self.pdf_store.clear_missing(pdf_url)
+            disclosure_data['sha256'] = sha256
             logger.info(f"Downloaded file: {filename}")
             return file_path
             
@@ -214,6 +451,52 @@ class YuutaiAPIClient:
             logger.error(f"Failed to download file: {str(e)}")
             return None
     
+    def _stream_to_file(self, response: requests.Response, file_path: str, filename: str) -> Optional[str]:
+        """
+        レスポンス本文をチャンク単位で一時ファイルに書き込み、完了後にアトミックに配置
+        
+        受信と同時にSHA-256を計算し、先頭バイトが %PDF でない場合や
+        受信済みサイズが上限を超えた時点で中断する。
+        Returns:
+            SHA-256（16進文字列）。中断した場合はNone
+        """
+        fd, temp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix='.part', dir=self.download_dir)
+        try:
+            sha256 = hashlib.sha256()
+            size = 0
+            head = b''
+            
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.download_chunk_size):
+                    if not chunk:
+                        continue
+                    
+                    if len(head) < 4:
+                        head += chunk[:4 - len(head)]
+                        if len(head) == 4 and head != b'%PDF':
+                            logger.warning(f"Not a PDF file: {filename} (starts with {head!r})")
+                            return None
+                    
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        logger.warning(f"File too large: {filename} (exceeded {self.max_file_size} bytes while downloading)")
+                        return None
+                    
+                    sha256.update(chunk)
+                    f.write(chunk)
+            
+            if head != b'%PDF':
+                logger.warning(f"Not a PDF file: {filename} ({size} bytes)")
+                return None
+            
+            os.replace(temp_path, file_path)
+            temp_path = None
+            return sha256.hexdigest()
+            
+        finally:
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+    
     def process_daily_disclosures(self, date: str = None) -> List[Dict]:
         """
         指定日の株主優待開示を処理（取得・ダウンロード・分類）
@@ -222,28 +505,175 @@ class YuutaiAPIClient:
         if not disclosures:
             return []
         
-        processed_disclosures = []
+        processed_disclosures = self.download_disclosures(disclosures)
+        
+        logger.info(f"Processed {len(processed_disclosures)} yuutai disclosures")
+        return processed_disclosures
+    
+    def download_disclosures(self, disclosures: List[Dict]) -> List[Dict]:
+        """開示のPDFをダウンロードして local_file / file_size を設定（処理できなかった開示は除く）"""
+        if not disclosures:
+            return []
+        
+        # PDFダウンロードはTDnet用のレート制限のもとで並列実行（結果は元の順序を維持）
+        results = list(self._get_download_executor().map(self._download_for_disclosure, disclosures))
+        return [disclosure for disclosure in results if disclosure is not None]
+    
+    def _get_download_executor(self) -> ThreadPoolExecutor:
+        """TDnetへの同時接続数を max_download_workers に制限する共有ワーカープール"""
+        with self._download_executor_lock:
+            if self._download_executor is None:
+                self._download_executor = ThreadPoolExecutor(max_workers=self.max_download_workers,
+                                                             thread_name_prefix='tdnet-download')
+            return self._download_executor
+    
+    def poll_recent_disclosures(self) -> Optional[Tuple[List[Disclosure], Dict]]:
+        """
+        新着一覧（recent 条件）からウォーターマーク以降の株主優待関連開示を取得
+        
+        一覧は新しい順なので、ウォーターマークより古いアイテムに達した時点で取得を終える。
+        max_poll_pages ページで達しない場合は、ウォーターマークの日から当日までを範囲条件で取得する。
+        ウォーターマークは commit_poll_watermark で確定するまで進めない。
+        前回までにアップロードに失敗した再試行待ちの開示も先頭に含める。
+        Returns:
+            (再試行待ちと公開日時の古い順の新着の開示, 確定用のウォーターマーク)。取得に失敗した場合はNone
+        """
+        watermark = self.get_poll_watermark()
+        
+        fetched = []
+        reached = False
+        for page in range(self.max_poll_pages):
+            params = {'limit': self.poll_page_size}
+            if page:
+                params['offset'] = page * self.poll_page_size
+            with self._stats_lock:
+                self.stats['listing_requests'] += 1
+            response = self._make_request('recent', 'json', params)
+            if not response or 'items' not in response:
+                logger.warning("Failed to fetch recent listing")
+                return None
+            
+            page_items = response['items']
+            fetched.extend(page_items)
+            oldest = (page_items[-1].get('Tdnet', {}).get('pubdate') or '') if page_items else ''
+            if len(page_items) < self.poll_page_size or oldest < watermark['pubdate']:
+                reached = True
+                break
+        
+        if not reached:
+            # 新着が多くウォーターマークまで達しない場合は範囲条件で取得
+            condition = f"{watermark['pubdate'][:10].replace('-', '')}-{datetime.now().strftime('%Y%m%d')}"
+            logger.info(f"Recent listing did not reach watermark {watermark['pubdate']}, fetching {condition}")
+            fetched = self._fetch_condition_items(condition)
+            if fetched is None:
+                return None
+        with self._stats_lock:
+            self.stats['poll_items'] += len(fetched)
+        
+        seen_ids = set(watermark['ids'])
+        new_items = []
+        for item in fetched:
+            tdnet_data = item.get('Tdnet', {})
+            pubdate = tdnet_data.get('pubdate') or ''
+            if pubdate > watermark['pubdate'] or (pubdate == watermark['pubdate'] and
+                                                   str(tdnet_data.get('id')) not in seen_ids):
+                new_items.append(item)
         
+        # 次回のウォーターマーク（最新の公開日時と、その日時のアイテムID）
+        next_watermark = watermark
+        if new_items:
+            latest = max((item.get('Tdnet', {}).get('pubdate') or '') for item in new_items)
+            latest_ids = {str(item['Tdnet'].get('id')) for item in new_items if item['Tdnet'].get('pubdate') == latest}
+            if latest == watermark['pubdate']:
+                latest_ids |= seen_ids
+            next_watermark = {'pubdate': latest, 'ids': sorted(latest_ids)}
+        
+        # raw_data の遅延読み込み・企業別履歴のためインデックスに登録
+        if self.listing_cache and new_items:
+            self.listing_cache.index_items(new_items)
+        
+        new_items.sort(key=lambda item: item['Tdnet'].get('pubdate') or '')
+        new_ids = {str(item['Tdnet'].get('id')) for item in new_items}
+        disclosures = []
+        retries = [retry for retry in self._get_poll_retries() if retry['id'] not in new_ids]
+        for retry in retries:
+            disclosures.extend(self._filter_yuutai_items([{'Tdnet': retry['item']}], retry['day']))
+        for date, day_items in groupby(new_items, key=lambda item: (item['Tdnet'].get('pubdate') or '')[:10]):
+            disclosures.extend(self._filter_yuutai_items(list(day_items), date))
+        
+        logger.info(f"Polled {len(fetched)} recent items: {len(new_items)} new, "
+                    f"{len(disclosures) - len(retries)} yuutai-related since {watermark['pubdate']}, "
+                    f"{len(retries)} retries")
+        return disclosures, next_watermark
+    
+    def get_poll_watermark(self) -> Dict:
+        """ポーリングのウォーターマーク（未保存の場合は当日0時）"""
+        watermark = self.listing_cache.get_watermark('recent') if self.listing_cache else self._poll_watermark
+        return watermark or {'pubdate': datetime.now().strftime('%Y-%m-%d 00:00:00'), 'ids': []}
+    
+    def commit_poll_watermark(self, watermark: Dict, disclosures: List[Dict] = (), failed_ids=()):
+        """
+        新着の処理完了後にウォーターマークを保存（キャッシュ無効時はメモリ上のみ）
+        
+        disclosures のうち failed_ids に含まれる開示は再試行待ちとして記録し、
+        max_poll_retries 回失敗した開示は諦める。成功した再試行待ちの開示は記録から削除する。
+        """
+        failed_ids = {str(disclosure_id) for disclosure_id in failed_ids}
+        attempts = {retry['id']: retry['attempts'] for retry in self._get_poll_retries()}
         for disclosure in disclosures:
-            try:
-                # ファイルをダウンロード
-                local_file = self.download_disclosure_file(disclosure)
-                if local_file:
-                    disclosure['local_file'] = local_file
-                    disclosure['file_size'] = os.path.getsize(local_file)
-                else:
-                    disclosure['local_file'] = None
-                    disclosure['file_size'] = 0
-                
-                # 処理済みリストに追加
-                processed_disclosures.append(disclosure)
-                
-            except Exception as e:
-                logger.error(f"Error processing disclosure {disclosure.get('id')}: {str(e)}")
+            item_id = str(disclosure['id'])
+            if item_id not in failed_ids:
+                if item_id in attempts:
+                    self._clear_poll_retry(item_id)
                 continue
+            
+            count = attempts.get(item_id, 0) + 1
+            raw_data = disclosure.get('raw_data')
+            if not raw_data:
+                logger.warning(f"Cannot retry yuutai disclosure {item_id} without its listing item")
+            elif count > self.max_poll_retries:
+                logger.warning(f"Giving up on yuutai disclosure {item_id} after {self.max_poll_retries} poll retries")
+                self._clear_poll_retry(item_id)
+            else:
+                self._set_poll_retry(item_id, disclosure['disclosure_date'], raw_data, count)
         
-        logger.info(f"Processed {len(processed_disclosures)} yuutai disclosures")
-        return processed_disclosures
+        if self.listing_cache:
+            self.listing_cache.set_watermark('recent', watermark['pubdate'], watermark['ids'])
+        else:
+            self._poll_watermark = watermark
+    
+    def _get_poll_retries(self) -> List[Dict]:
+        if self.listing_cache:
+            return self.listing_cache.get_poll_retries('recent')
+        return sorted(self._poll_retries.values(), key=lambda retry: (retry['day'], retry['id']))
+    
+    def _set_poll_retry(self, item_id: str, day: str, item: Dict, attempts: int):
+        if self.listing_cache:
+            self.listing_cache.set_poll_retry('recent', item_id, day, item, attempts)
+        else:
+            self._poll_retries[item_id] = {'id': item_id, 'day': day, 'item': item, 'attempts': attempts}
+    
+    def _clear_poll_retry(self, item_id: str):
+        if self.listing_cache:
+            self.listing_cache.clear_poll_retry('recent', item_id)
+        else:
+            self._poll_retries.pop(item_id, None)
+    
+    def _download_for_disclosure(self, disclosure: Dict) -> Optional[Dict]:
+        """開示1件のファイルをダウンロードし local_file / file_size を設定（失敗時はNone）"""
+        try:
+            local_file = self.download_disclosure_file(disclosure)
+            if local_file:
+                disclosure['local_file'] = local_file
+                disclosure['file_size'] = os.path.getsize(local_file)
+            else:
+                disclosure['local_file'] = None
+                disclosure['file_size'] = 0
+            return disclosure
+            
+        except Exception as e:
+            logger.error(f"Error processing disclosure {disclosure.get('id')}: {str(e)}")
+            return None
     
     def get_disclosure_detail(self, disclosure_id: str) -> Optional[Dict]:
         """
@@ -262,28 +692,74 @@ class YuutaiAPIClient:
     def get_company_disclosures(self, company_code: str, days_back: int = 30) -> List[Dict]:
         """
         特定企業の過去の株主優待開示を取得
+        
+        キャッシュの銘柄コード別インデックスから検索し、インデックス未登録の日だけを
+        ネットワークで補完する（少数日なら範囲条件、多数日なら企業コード条件で取得）。
         """
         end_date = datetime.now()
         start_date = end_date - timedelta(days=days_back)
+        start_str = start_date.strftime('%Y-%m-%d')
+        end_str = end_date.strftime('%Y-%m-%d')
+        
+        if not self.listing_cache:
+            return self._get_company_disclosures_from_range(company_code, start_str, end_str)
+        
+        dates = [(start_date + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end_date - start_date).days + 1)]
+        missing_dates = [date for date in dates if not self.listing_cache.is_company_covered(company_code, date)]
+        
+        if missing_dates:
+            use_range = len(missing_dates) <= self.company_topup_max_days
+            if not use_range:
+                logger.info(f"Topping up company index for {company_code}: {len(missing_dates)} days via company condition")
+                if not self._fetch_company_items(company_code, min(missing_dates), end_str):
+                    # 企業コード条件で取得できなかった場合は範囲条件で補完する
+                    logger.warning(f"Company condition failed for {company_code}, falling back to range conditions")
+                    use_range = True
+            if use_range:
+                logger.info(f"Topping up company index for {company_code}: {len(missing_dates)} days via range conditions")
+                for range_start, range_end in self._split_into_ranges(missing_dates):
+                    self.fetch_listing_range(range_start.strftime('%Y-%m-%d'), range_end.strftime('%Y-%m-%d'))
+        else:
+            logger.info(f"Company history for {company_code} answered from local index")
         
         all_disclosures = []
-        current_date = start_date
+        for date, items in sorted(self.listing_cache.get_company_items(company_code, start_str, end_str).items()):
+            all_disclosures.extend(self._filter_yuutai_items(items, date))
         
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            daily_disclosures = self.get_daily_disclosures(date_str)
+        logger.info(f"Found {len(all_disclosures)} yuutai disclosures for company {company_code}")
+        return all_disclosures
+    
+    def _fetch_company_items(self, company_code: str, start_date: str, end_date: str) -> bool:
+        """企業コード条件で一覧を取得し、start_date までさかのぼってインデックスに登録"""
+        items = []
+        for page_items in self._iter_condition_pages(company_code):
+            if page_items is None:
+                logger.warning(f"Failed to fetch listing for company {company_code}")
+                return False
+            
+            items.extend(item for item in page_items
+                         if (item.get('Tdnet', {}).get('pubdate') or '')[:10] >= start_date)
             
+            # 一覧は新しい順なので、ページ末尾が期間より古ければ以降は不要
+            oldest = (page_items[-1].get('Tdnet', {}).get('pubdate') or '')[:10] if page_items else ''
+            if oldest and oldest < start_date:
+                break
+        
+        self.listing_cache.index_company_items(company_code, items, start_date, end_date)
+        return True
+    
+    def _get_company_disclosures_from_range(self, company_code: str, start_date: str, end_date: str) -> List[Dict]:
+        """期間全体の一覧を範囲条件で取得して企業の開示を抽出（キャッシュ無効時）"""
+        daily_disclosures = self.get_range_disclosures(start_date, end_date)
+        
+        all_disclosures = []
+        for date_str, disclosures in daily_disclosures.items():
             # 指定企業のもののみフィルタ
             company_disclosures = [
-                d for d in daily_disclosures 
+                d for d in disclosures 
                 if d.get('company_code') == company_code
             ]
-            
             all_disclosures.extend(company_disclosures)
-            current_date += timedelta(days=1)
-            
-            # レート制限対応
-            time.sleep(0.5)
         
         logger.info(f"Found {len(all_disclosures)} yuutai disclosures for company {company_code}")
-        return all_disclosures
\ No newline at end of file
+        return all_disclosures
@@ -0,0 +1,134 @@
+import re
+import logging
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Optional, Pattern, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 株主優待関連キーワード（タイトルに含まれていれば関連あり）
+YUUTAI_KEYWORDS = [
+    "株主優待", "優待制度", "優待内容", "株主優待制度",
+    "優待", "株主特典", "株主様ご優待", "株主優待券",
+    "株主優待品", "優待商品", "株主様特典"
+]
+
+# 詳細パターン（同じ行で前者の後に後者が現れれば関連あり。正規表現の '前者.*後者' に相当）
+YUUTAI_PATTERNS = [
+    ('株主', '優待'),
+    ('優待', '制度'),
+    ('株主', '特典'),
+    ('優待', '内容'),
+    ('優待', '導入'),
+    ('優待', '変更'),
+    ('優待', '廃止'),
+    ('優待', '新設'),
+]
+
+# カテゴリ分類ルール（上から順に、いずれかの語を含む最初のカテゴリ）
+CATEGORY_RULES = [
+    ('優待新設', ['新設', '導入', '開始']),
+    ('優待変更', ['変更', '修正', '見直し']),
+    ('優待廃止', ['廃止', '終了', '中止']),
+    ('優待内容', ['内容', '詳細']),
+    ('権利基準日', ['基準日', '権利']),
+]
+DEFAULT_CATEGORY = '優待制度'
+EMPTY_CATEGORY = 'その他'
+
+# classify_batch でプロセスプールを使う最小のタイトル数（重複除去後）
+MIN_TITLES_PER_PROCESS = 20000
+
+
+def _compile_any(alternatives: Iterable[str]) -> Optional[Pattern]:
+    """いずれかの選択肢に一致する正規表現（選択肢がなければNone）"""
+    alternatives = list(alternatives)
+    return re.compile('|'.join(alternatives)) if alternatives else None
+
+
+class YuutaiTitleMatcher:
+    """株主優待関連判定とカテゴリ分類を行うタイトルマッチャー
+
+    キーワードと '前者.*後者' のパターンを1つの正規表現の選択にまとめ、関連判定を1回の検索で行う。
+    カテゴリはルールごとに語の選択を事前にコンパイルし、上から順に検索する。
+    """
+
+    def __init__(self, keywords: Sequence[str] = None, patterns: Sequence[Tuple[str, str]] = None,
+                 category_rules: Sequence[Tuple[str, Sequence[str]]] = None):
+        self.keywords = list(YUUTAI_KEYWORDS if keywords is None else keywords)
+        self.patterns = list(YUUTAI_PATTERNS if patterns is None else patterns)
+        self.category_rules = list(CATEGORY_RULES if category_rules is None else category_rules)
+        self.categories = [category for category, _ in self.category_rules]
+        # classify_batch のカテゴリコード → カテゴリ名（0: タイトルなし, 1: 既定カテゴリ, 2以降: ルール順）
+        self.category_names = [EMPTY_CATEGORY, DEFAULT_CATEGORY] + self.categories
+
+        self._related = _compile_any(
+            [re.escape(keyword) for keyword in self.keywords]
+            + [f'{re.escape(first)}.*{re.escape(second)}' for first, second in self.patterns]
+        )
+        self._category_searches = [_compile_any(re.escape(word) for word in words)
+                                   for _, words in self.category_rules]
+
+    def match(self, title: Optional[str]) -> Tuple[bool, str]:
+        """
+        タイトルから (株主優待関連か, カテゴリ) を返す
+
+        カテゴリは関連判定とは独立に、カテゴリ分類ルールで決定する。
+        """
+        related, code = self._classify(title)
+        return bool(related), self.category_names[code]
+
+    def _classify(self, title: Optional[str]) -> Tuple[int, int]:
+        """(関連フラグ 0/1, カテゴリコード) を返す"""
+        if not title:
+            return 0, 0
+
+        related = int(bool(self._related and self._related.search(title)))
+        for index, search in enumerate(self._category_searches):
+            if search and search.search(title):
+                return related, index + 2
+        return related, 1
+
+    def classify_batch(self, titles: Iterable[Optional[str]], processes: int = None) -> Tuple[array, array]:
+        """
+        タイトルの一覧（1日分の一覧から複数年分のアーカイブまで）をまとめて判定
+
+        同じタイトルは1回だけ判定する。processes を指定すると、重複除去後のタイトル数が
+        多い場合にプロセスプールで分割して判定する。
+        Returns:
+            (関連フラグの配列, カテゴリコードの配列)。いずれも array('B') で titles と同じ順序。
+            カテゴリコードは category_names の添字。
+        """
+        titles = titles if isinstance(titles, list) else list(titles)
+        unique_titles = list(dict.fromkeys(titles))
+
+        if processes and processes > 1 and len(unique_titles) >= MIN_TITLES_PER_PROCESS:
+            chunk_size = -(-len(unique_titles) // processes)
+            chunks = [unique_titles[offset:offset + chunk_size] for offset in range(0, len(unique_titles), chunk_size)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = [result for chunk_results in executor.map(_classify_chunk, [self] * len(chunks), chunks)
+                           for result in chunk_results]
+        else:
+            results = [self._classify(title) for title in unique_titles]
+
+        by_title = dict(zip(unique_titles, results))
+        related = array('B')
+        codes = array('B')
+        for title in titles:
+            flag, code = by_title[title]
+            related.append(flag)
+            codes.append(code)
+        return related, codes
+
+    def is_related(self, title: Optional[str]) -> bool:
+        """株主優待関連かどうか"""
+        return self.match(title)[0]
+
+    def categorize(self, title: Optional[str]) -> str:
+        """カテゴリを判定"""
+        return self.match(title)[1]
+
+
+def _classify_chunk(matcher: YuutaiTitleMatcher, titles: List[Optional[str]]) -> List[Tuple[int, int]]:
+    """プロセスプール用：タイトルの一部を判定"""
+    return [matcher._classify(title) for title in titles]
@@ -1,6 +1,9 @@
 import os
 import logging
 import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
@@ -8,7 +11,9 @@ from dotenv import load_dotenv
 # 親ディレクトリを追加
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from yuutai.api_client import YuutaiAPIClient
+from http_transport import HTTPTransport
+from notion_uploader import NOTION_API_BASE_URL
+from yuutai.api_client import YANOSHIN_API_BASE_URL, YuutaiAPIClient
 from yuutai.notion_manager import YuutaiNotionManager
 
 logger = logging.getLogger(__name__)
@@ -23,13 +28,43 @@ class YuutaiDailyProcessor:
         self.notion_api_key = os.getenv('NOTION_API_KEY')
         self.notion_page_id = os.getenv('YUUTAI_NOTION_PAGE_ID') or os.getenv('NOTION_PAGE_ID')
         self.download_dir = os.getenv('YUUTAI_DOWNLOAD_DIR', './downloads/yuutai')
+        self.cache_dir = os.getenv('YUUTAI_CACHE_DIR', './cache')
+        self.cache_today_ttl = float(os.getenv('YUUTAI_CACHE_TODAY_TTL', '300'))
+        self.request_interval = float(os.getenv('API_REQUEST_INTERVAL', '1.0'))
+        self.max_file_size_mb = float(os.getenv('MAX_FILE_SIZE_MB', '50'))
+        self.max_download_workers = int(os.getenv('MAX_DOWNLOAD_WORKERS', '4'))
+        self.download_interval = float(os.getenv('PDF_DOWNLOAD_INTERVAL', '0.25'))
+        self.missing_recheck_days = float(os.getenv('YUUTAI_MISSING_RECHECK_DAYS', '7'))
+        self.pdf_retention_days = float(os.getenv('YUUTAI_PDF_RETENTION_DAYS', '30'))
+        self.http_connect_timeout = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+        self.http_read_timeout = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+        self.http_pool_maxsize = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+        self.poll_interval = float(os.getenv('YUUTAI_POLL_INTERVAL', '120'))
+        self.day_interval = float(os.getenv('YUUTAI_DAY_INTERVAL', '2'))
+        self.listing_api_url = os.getenv('TDNET_API_BASE_URL', YANOSHIN_API_BASE_URL)
+        self.notion_api_url = os.getenv('NOTION_API_BASE_URL', NOTION_API_BASE_URL)
+        self.dedupe_refresh_interval = float(os.getenv('NOTION_DEDUPE_REFRESH_INTERVAL', '600'))
+        self.notion_upload_workers = int(os.getenv('NOTION_UPLOAD_WORKERS', '4'))
+        self.notion_request_rate = float(os.getenv('NOTION_REQUEST_RATE', '3'))
+        self.notion_attach_on_create = os.getenv('NOTION_ATTACH_ON_CREATE', 'true').lower() in ('1', 'true', 'yes')
         
         if not self.notion_api_key or not self.notion_page_id:
             raise ValueError("NOTION_API_KEY and YUUTAI_NOTION_PAGE_ID must be set")
         
+        # YANOSHIN・TDnet・Notion で共有する接続プール
+        self.transport = HTTPTransport(self.http_connect_timeout, self.http_read_timeout, self.http_pool_maxsize)
+        
         # コンポーネントを初期化
-        self.api_client = YuutaiAPIClient(self.download_dir)
-        self.notion_manager = YuutaiNotionManager(self.notion_api_key, self.notion_page_id)
+        self.api_client = YuutaiAPIClient(self.download_dir, self.cache_dir, self.cache_today_ttl,
+                                          self.request_interval, self.max_file_size_mb,
+                                          self.max_download_workers, self.download_interval,
+                                          self.missing_recheck_days, self.transport, self.listing_api_url,
+                                          use_pdf_store=True)
+        self.notion_manager = YuutaiNotionManager(self.notion_api_key, self.notion_page_id, self.transport,
+                                                  self.notion_api_url, self.cache_dir,
+                                                  self.dedupe_refresh_interval, self.notion_upload_workers,
+                                                  self.notion_request_rate, self.notion_attach_on_create,
+                                                  self.api_client.pdf_store)
         
         logger.info("Yuutai Daily Processor initialized")
     
@@ -50,26 +85,7 @@ class YuutaiDailyProcessor:
             logger.info("Fetching and processing yuutai disclosures from API...")
             disclosures = self.api_client.process_daily_disclosures(date)
             
-            if not disclosures:
-                logger.info(f"No yuutai disclosures found for {date}")
-                return {
-                    'success': True,
-                    'date': date,
-                    'stats': {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
-                }
-            
-            # Notionにアップロード
-            logger.info(f"Uploading {len(disclosures)} yuutai disclosures to Notion...")
-            stats = self.notion_manager.process_daily_yuutai_disclosures(disclosures)
-            
-            logger.info(f"Yuutai processing complete for {date}: {stats}")
-            
-            return {
-                'success': True,
-                'date': date,
-                'stats': stats,
-                'disclosures_processed': len(disclosures)
-            }
+            return self._upload_date_disclosures(date, disclosures)
             
         except Exception as e:
             logger.error(f"Failed to process yuutai date {date}: {str(e)}")
@@ -79,6 +95,74 @@ class YuutaiDailyProcessor:
                 'error': str(e)
             }
     
+    def _upload_date_disclosures(self, date: str, disclosures: List[Dict]) -> Dict[str, any]:
+        """取得済みの1日分の開示をNotionにアップロードし、処理結果を返す"""
+        if not disclosures:
+            logger.info(f"No yuutai disclosures found for {date}")
+            return {
+                'success': True,
+                'date': date,
+                'stats': {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
+            }
+        
+        # Notionにアップロード
+        logger.info(f"Uploading {len(disclosures)} yuutai disclosures to Notion...")
+        stats = self.notion_manager.process_daily_yuutai_disclosures(disclosures)
+        
+        logger.info(f"Yuutai processing complete for {date}: {stats}")
+        
+        return {
+            'success': True,
+            'date': date,
+            'stats': stats,
+            'disclosures_processed': len(disclosures)
+        }
+    
+    def poll_once(self) -> Dict[str, any]:
+        """
+        新着一覧をポーリングし、前回以降の株主優待開示だけをダウンロード・アップロード
+        
+        ウォーターマークはアップロード処理の完了後に進める（取得・初期化に失敗した場合は進めない）。
+        ダウンロード・アップロードに失敗した開示があってもウォーターマークは進め、失敗した開示は
+        再試行待ちとして記録して次回以降のポーリングで再試行する（回数は api_client.max_poll_retries まで）。
+        再アップロードは重複排除インデックスでスキップされるため、再試行しても重複は作られない。
+        """
+        try:
+            polled = self.api_client.poll_recent_disclosures()
+            if polled is None:
+                return {'success': False, 'error': 'Failed to fetch recent listing'}
+            disclosures, watermark = polled
+            
+            stats = {'total': 0, 'success': 0, 'failed': 0, 'skipped': 0}
+            failed_ids = set()
+            if disclosures:
+                if not self.notion_manager.yuutai_database_id and not self.notion_manager.initialize_databases():
+                    logger.error("Failed to initialize Notion databases")
+                    return {'success': False, 'error': 'Database initialization failed'}
+                
+                logger.info(f"Uploading {len(disclosures)} new yuutai disclosures to Notion...")
+                downloaded = self.api_client.download_disclosures(disclosures)
+                stats = self.notion_manager.process_daily_yuutai_disclosures(downloaded)
+                
+                downloaded_ids = {disclosure['id'] for disclosure in downloaded}
+                failed_ids = {disclosure['id'] for disclosure in disclosures if disclosure['id'] not in downloaded_ids}
+                failed_ids.update(stats.get('failed_ids', []))
+                if failed_ids:
+                    logger.warning(f"{len(failed_ids)} yuutai disclosures failed, retrying them on later polls")
+            
+            self.api_client.commit_poll_watermark(watermark, disclosures, failed_ids)
+            return {
+                'success': True,
+                'stats': stats,
+                'new_disclosures': len(disclosures),
+                'retrying': len(failed_ids),
+                'watermark': watermark['pubdate']
+            }
+            
+        except Exception as e:
+            logger.error(f"Failed to poll recent yuutai disclosures: {str(e)}")
+            return {'success': False, 'error': str(e)}
+    
     def process_date_range(self, start_date: str, end_date: str = None) -> List[Dict]:
         """日付範囲の株主優待開示を処理"""
         if end_date is None:
@@ -87,6 +171,10 @@ class YuutaiDailyProcessor:
         start = datetime.strptime(start_date, '%Y-%m-%d')
         end = datetime.strptime(end_date, '%Y-%m-%d')
         
+        # 期間の一覧を範囲条件でまとめて取得してキャッシュ（日次処理はキャッシュから読む）
+        if self.api_client.listing_cache:
+            self.api_client.fetch_listing_range(start_date, end_date)
+        
         results = []
         current = start
         
@@ -99,12 +187,120 @@ class YuutaiDailyProcessor:
             current += timedelta(days=1)
             
             # API制限を考慮して少し待機
-            if current <= end:
-                import time
-                time.sleep(2)
+            if current <= end and self.day_interval > 0:
+                time.sleep(self.day_interval)
+        
+        self.collect_pdf_garbage()
+        return results
+    
+    def backfill_date_range(self, start_date: str, end_date: str = None, max_workers: int = 4) -> List[Dict]:
+        """
+        日付範囲の株主優待開示をバックフィル処理
+        
+        日次一覧の取得・PDFダウンロードは最大 max_workers 本のワーカーで並列実行し、
+        Notionへのアップロードは初期化済みのマネージャーを共有する単一ステージで日付順に行う。
+        戻り値は process_date_range と同じ形式（日付ごとの処理結果リスト）。
+        """
+        if end_date is None:
+            end_date = start_date
+        
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((end - start).days + 1)]
+        max_workers = max(1, max_workers)
+        
+        logger.info(f"=== Backfilling Yuutai data for {start_date} to {end_date} ({len(dates)} days, {max_workers} workers) ===")
+        
+        self.backfill_stats = {
+            'days': len(dates),
+            'workers': max_workers,
+            'fetch': {'days': 0, 'disclosures': 0, 'busy_seconds': 0.0, 'wall_seconds': 0.0},
+            'upload': {'days': 0, 'disclosures': 0, 'busy_seconds': 0.0},
+            'wall_seconds': 0.0
+        }
+        run_started = time.time()
+        
+        # Notionデータベースの初期化は範囲全体で1回のみ
+        if not self.notion_manager.initialize_databases():
+            logger.error("Failed to initialize Notion databases")
+            return [{'success': False, 'date': date, 'error': 'Database initialization failed'} for date in dates]
+        
+        # 期間の一覧を範囲条件でまとめて取得してキャッシュ（各ワーカーはキャッシュから読む）
+        if self.api_client.listing_cache:
+            self.api_client.fetch_listing_range(start_date, end_date)
         
+        def fetch(date: str):
+            fetch_started = time.time()
+            disclosures = self.api_client.process_daily_disclosures(date)
+            return disclosures, time.time() - fetch_started
+        
+        results = []
+        pending = deque()
+        date_iter = iter(dates)
+        # 取得結果を溜め込みすぎないよう、先行取得はワーカー数の2倍までに制限
+        window = max_workers * 2
+        
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='yuutai-fetch') as executor:
+            for date in date_iter:
+                pending.append((date, executor.submit(fetch, date)))
+                if len(pending) >= window:
+                    break
+            
+            while pending:
+                date, future = pending.popleft()
+                next_date = next(date_iter, None)
+                if next_date is not None:
+                    pending.append((next_date, executor.submit(fetch, next_date)))
+                
+                try:
+                    disclosures, fetch_seconds = future.result()
+                except Exception as e:
+                    logger.error(f"Failed to fetch yuutai date {date}: {str(e)}")
+                    results.append({'success': False, 'date': date, 'error': str(e)})
+                    continue
+                
+                fetch_stats = self.backfill_stats['fetch']
+                fetch_stats['days'] += 1
+                fetch_stats['disclosures'] += len(disclosures)
+                fetch_stats['busy_seconds'] += fetch_seconds
+                fetch_stats['wall_seconds'] = time.time() - run_started
+                
+                upload_started = time.time()
+                try:
+                    result = self._upload_date_disclosures(date, disclosures)
+                except Exception as e:
+                    logger.error(f"Failed to process yuutai date {date}: {str(e)}")
+                    result = {'success': False, 'date': date, 'error': str(e)}
+                results.append(result)
+                
+                upload_stats = self.backfill_stats['upload']
+                upload_stats['days'] += 1
+                upload_stats['disclosures'] += len(disclosures)
+                upload_stats['busy_seconds'] += time.time() - upload_started
+        
+        self.backfill_stats['wall_seconds'] = time.time() - run_started
+        self._log_backfill_throughput(self.backfill_stats)
+        self.collect_pdf_garbage()
         return results
     
+    def collect_pdf_garbage(self) -> Dict[str, int]:
+        """アップロード済みで保持期間（YUUTAI_PDF_RETENTION_DAYS）を過ぎたPDFをストアから削除"""
+        return self.api_client.pdf_store.collect_garbage(self.pdf_retention_days * 86400)
+    
+    def _log_backfill_throughput(self, stats: Dict):
+        """バックフィルのステージ別スループットをログ出力"""
+        fetch = stats['fetch']
+        upload = stats['upload']
+        fetch_wall = fetch['wall_seconds'] or 1e-9
+        upload_busy = upload['busy_seconds'] or 1e-9
+        
+        logger.info("Backfill throughput:")
+        logger.info(f"  Fetch stage: {fetch['days']} days, {fetch['disclosures']} disclosures in {fetch['wall_seconds']:.1f}s "
+                    f"({fetch['days'] / fetch_wall:.2f} days/s, worker busy {fetch['busy_seconds']:.1f}s)")
+        logger.info(f"  Upload stage: {upload['disclosures']} disclosures in {upload['busy_seconds']:.1f}s "
+                    f"({upload['disclosures'] / upload_busy:.2f} disclosures/s)")
+        logger.info(f"  Total wall time: {stats['wall_seconds']:.1f}s for {stats['days']} days")
+    
     def process_company_yuutai_history(self, company_code: str, days_back: int = 30) -> Dict[str, any]:
         """特定企業の株主優待開示履歴を処理"""
         logger.info(f"=== Processing Yuutai history for company {company_code} (last {days_back} days) ===")
@@ -166,9 +362,37 @@ class YuutaiDailyProcessor:
             'total_disclosures': 0,
             'successful_uploads': 0,
             'failed_uploads': 0,
+            'missing_file_skips': 0,
+            'missing_file_marked': 0,
+            'notion_requests': 0,
+            'notion_retries': 0,
+            'notion_throttled': 0,
+            'pdf_attached_on_create': 0,
+            'pdf_attach_fallbacks': 0,
             'errors': []
         }
         
+        # 存在しないPDFのネガティブキャッシュ（実行中の累計）
+        client_stats = getattr(self.api_client, 'stats', {})
+        summary['missing_file_skips'] = client_stats.get('missing_file_skips', 0)
+        summary['missing_file_marked'] = client_stats.get('missing_file_marked', 0)
+        
+        # Notion API の試行・再試行・429 の回数（実行中の累計）
+        request_layer = getattr(self.notion_manager, 'request_layer', None)
+        notion_stats = request_layer.get_stats() if request_layer else {}
+        summary['notion_requests'] = notion_stats.get('requests', 0)
+        summary['notion_retries'] = notion_stats.get('retries', 0)
+        summary['notion_throttled'] = notion_stats.get('throttled', 0)
+        
+        # ページ作成時にPDFを添付した数（pages.update を省いた数）と、作成後の添付に切り替えた数
+        upload_stats = getattr(self.notion_manager, 'upload_stats', {})
+        summary['pdf_attached_on_create'] = upload_stats.get('attached_on_create', 0)
+        summary['pdf_attach_fallbacks'] = upload_stats.get('attach_fallbacks', 0)
+        
+        # ホストごとの接続再利用統計
+        transport = getattr(self, 'transport', None)
+        summary['http_connections'] = transport.connection_stats() if transport else {}
+        
         for result in results:
             if result.get('success'):
                 summary['successful_dates'] += 1
@@ -198,6 +422,13 @@ class YuutaiDailyProcessor:
             logger.info(f"  Total disclosures: {stats.get('total', 0)}")
             logger.info(f"  Successful uploads: {stats.get('success', 0)}")
             logger.info(f"  Failed uploads: {stats.get('failed', 0)}")
+            client_stats = self.api_client.stats
+            logger.info(f"  Missing PDFs: {client_stats['missing_file_skips']} skipped (cached), "
+                        f"{client_stats['missing_file_marked']} newly recorded")
+            notion_stats = self.notion_manager.request_layer.get_stats()
+            logger.info(f"  Notion requests: {notion_stats['requests']} "
+                        f"({notion_stats['retries']} retries, {notion_stats['throttled']} throttled)")
+            self.transport.log_stats()
         else:
             logger.error(f"Yuutai daily process failed: {result.get('error')}")
         
@@ -314,6 +545,7 @@ def main():
     parser.add_argument('--date', help='Process specific date (YYYY-MM-DD)')
     parser.add_argument('--start-date', help='Start date for range processing (YYYY-MM-DD)')
     parser.add_argument('--end-date', help='End date for range processing (YYYY-MM-DD)')
+    parser.add_argument('--workers', type=int, default=1, help='Parallel fetch workers for range processing (backfill mode when > 1)')
     parser.add_argument('--company', help='Process specific company code')
     parser.add_argument('--days-back', type=int, default=30, help='Days to look back for company processing')
     parser.add_argument('--keywords', nargs='+', help='Search by keywords')
@@ -350,8 +582,11 @@ def main():
             logger.info(f"Company processing result: {result}")
             
         elif args.start_date:
-            # 範囲処理
-            results = processor.process_date_range(args.start_date, args.end_date)
+            # 範囲処理（--workers 2以上でバックフィルモード）
+            if args.workers > 1:
+                results = processor.backfill_date_range(args.start_date, args.end_date, args.workers)
+            else:
+                results = processor.process_date_range(args.start_date, args.end_date)
             summary = processor.get_processing_summary(results)
             logger.info(f"Range processing summary: {summary}")
             
@@ -0,0 +1,73 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseCache:
+    """親ページ・データベース名ごとに解決した Notion のデータベースIDとプロパティ定義のキャッシュ（SQLite）
+
+    重複判定インデックスと同じ notion_index.sqlite3 に保存する。
+    キャッシュしたIDは利用側がプロセス内の初回使用時に検証し、失敗した場合は invalidate で削除する。
+    cache_dir=None の場合は保存せず、プロセス内だけで使用する。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db_path = os.path.join(cache_dir, 'notion_index.sqlite3')
+        else:
+            self.db_path = ':memory:'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        if cache_dir:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS notion_databases (
+                    parent_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    database_id TEXT NOT NULL,
+                    properties TEXT NOT NULL,
+                    resolved_at REAL NOT NULL,
+                    PRIMARY KEY (parent_id, name)
+                )"""
+            )
+
+    @staticmethod
+    def _normalize_id(notion_id: str) -> str:
+        return (notion_id or '').replace('-', '')
+
+    def get(self, parent_id: str, name: str) -> Optional[Dict]:
+        """キャッシュ済みの {'database_id': ID, 'properties': プロパティ定義}（なければNone）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT database_id, properties FROM notion_databases WHERE parent_id = ? AND name = ?",
+                (self._normalize_id(parent_id), name)
+            ).fetchone()
+        return {'database_id': row[0], 'properties': json.loads(row[1])} if row else None
+
+    def put(self, parent_id: str, name: str, database_id: str, properties: Dict):
+        """解決したデータベースIDとプロパティ定義を保存"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO notion_databases (parent_id, name, database_id, properties, resolved_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self._normalize_id(parent_id), name, database_id, json.dumps(properties, ensure_ascii=False),
+                 time.time())
+            )
+
+    def invalidate(self, parent_id: str, name: str):
+        """キャッシュを削除（次回はデータベースを検索し直す）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM notion_databases WHERE parent_id = ? AND name = ?",
+                               (self._normalize_id(parent_id), name))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,124 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional, TypedDict, Union
+
+logger = logging.getLogger(__name__)
+
+# 一覧アイテム（item['Tdnet']）のうち使用する項目
+TDNET_FIELDS = (
+    'id', 'title', 'company_code', 'company_name', 'pubdate', 'document_url', 'markets_string', 'url_xbrl'
+)
+_FIELD_SET = frozenset(TDNET_FIELDS)
+
+# 利用可能なデコーダ（msgspec → orjson → json の順、orjson は requirements.txt で導入）
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+DECODER = 'msgspec' if msgspec else 'orjson' if orjson else 'json'
+
+
+class TdnetFields(TypedDict, total=False):
+    id: Union[str, int, None]
+    title: Optional[str]
+    company_code: Optional[str]
+    company_name: Optional[str]
+    pubdate: Optional[str]
+    document_url: Optional[str]
+    markets_string: Optional[str]
+    url_xbrl: Optional[str]
+
+
+class ListingItem(TypedDict, total=False):
+    Tdnet: TdnetFields
+
+
+class ListingResponse(TypedDict, total=False):
+    items: List[ListingItem]
+
+
+if msgspec:
+    # 型を指定したデコーダは未使用の項目を読み飛ばし、使用する項目だけの辞書を作る
+    _response_decoder = msgspec.json.Decoder(ListingResponse)
+    _items_decoder = msgspec.json.Decoder(List[ListingItem])
+    _item_decoder = msgspec.json.Decoder(ListingItem)
+
+
+def _loads(payload: Union[bytes, str]) -> Any:
+    if orjson:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+def _project_items(items: List[Any]) -> List[Any]:
+    """orjson でデコードしたアイテムを使用する項目だけに絞り込む
+
+    標準の json では絞り込みのコストが json.loads 単体より大きく、保持メモリも減らないため、
+    アイテムをそのまま返す（使用しない項目は参照されないだけ）。
+    """
+    if orjson:
+        return [project_item(item) for item in items]
+    return items
+
+
+def project_item(item: Any) -> Any:
+    """一覧アイテムを使用する項目だけに絞り込む（絞り込み済み・Tdnet データを持たないアイテムはそのまま）"""
+    if isinstance(item, dict):
+        tdnet_data = item.get('Tdnet')
+        if isinstance(tdnet_data, dict) and (len(item) > 1 or not tdnet_data.keys() <= _FIELD_SET):
+            return {'Tdnet': {field: tdnet_data[field] for field in TDNET_FIELDS if field in tdnet_data}}
+    return item
+
+
+def _decode_typed(decoder, payload: Union[bytes, str]) -> Any:
+    """msgspec で型付きデコード（型が合わない場合は None を返し、汎用のデコードに切り替える）"""
+    try:
+        return decoder.decode(payload)
+    except msgspec.ValidationError as e:
+        logger.debug(f"Typed decoding failed, falling back to generic JSON: {str(e)}")
+        return None
+    except msgspec.DecodeError as e:
+        raise ValueError(str(e)) from e
+
+
+def decode_listing_response(payload: Union[bytes, str]) -> Any:
+    """
+    YANOSHIN 一覧APIのレスポンス（{"items": [{"Tdnet": {...}}, ...]}）をデコード
+
+    items の各アイテムは使用する項目だけに絞り込む（標準の json の場合はそのまま）。
+    Raises:
+        ValueError: JSONとして不正な場合
+    """
+    if msgspec:
+        response = _decode_typed(_response_decoder, payload)
+        if response is not None:
+            return response
+
+    response = _loads(payload)
+    if isinstance(response, dict) and isinstance(response.get('items'), list):
+        response['items'] = _project_items(response['items'])
+    return response
+
+
+def decode_items(payload: Union[bytes, str]) -> List[Dict]:
+    """一覧アイテムのJSON配列（一覧キャッシュのページ）をデコード（アイテムは使用する項目だけに絞り込む）"""
+    if msgspec:
+        items = _decode_typed(_items_decoder, payload)
+        if items is not None:
+            return items
+    return _project_items(_loads(payload))
+
+
+def decode_item(payload: Union[bytes, str]) -> Dict:
+    """一覧アイテム1件のJSONをデコード"""
+    if msgspec:
+        item = _decode_typed(_item_decoder, payload)
+        if item is not None:
+            return item
+    return _project_items([_loads(payload)])[0]
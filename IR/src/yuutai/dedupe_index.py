@@ -0,0 +1,145 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 重複判定のキー（タイトル先頭100文字, 銘柄コード, 開示時刻）
+DedupeKey = Tuple[str, str, str]
+
+
+def make_dedupe_key(title: Optional[str], stock_code: Optional[str], disclosure_time: Optional[str]) -> DedupeKey:
+    """開示情報の重複判定キー（Notion の タイトル・銘柄コード・開示時刻 の完全一致に相当）"""
+    return ((title or '')[:100], stock_code or '', disclosure_time or '')
+
+
+class DedupeIndex:
+    """Notion の株主優待データベースに登録済みの開示キーのローカルインデックス（SQLite + メモリ上の辞書）
+
+    データベースIDごとに ページID → 重複判定キー と、Notion の last_edited_time を保存する。
+    load で指定したデータベースのキーをメモリに読み込み、重複判定はメモリ上の辞書だけで行う。
+    同期状態として、取得済みの最新の last_edited_time（差分取得の起点）と全件取得した時刻を保持する。
+    cache_dir=None の場合は保存せず、プロセス内だけで使用する。
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None):
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db_path = os.path.join(cache_dir, 'notion_index.sqlite3')
+        else:
+            self.db_path = ':memory:'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        if cache_dir:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+        self.database_id: Optional[str] = None
+        # 読み込んだデータベースの同期状態 {'edited_cursor': 最新の last_edited_time, 'synced_at': 全件取得時刻}
+        self.sync_state: Optional[Dict] = None
+        self._keys: Dict[DedupeKey, str] = {}
+        self._page_keys: Dict[str, DedupeKey] = {}
+
+    def _create_tables(self):
+        """インデックステーブルを作成"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS dedupe_pages (
+                    database_id TEXT NOT NULL,
+                    page_id TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    stock_code TEXT NOT NULL,
+                    disclosure_time TEXT NOT NULL,
+                    last_edited_time TEXT,
+                    PRIMARY KEY (database_id, page_id)
+                )"""
+            )
+            # データベースごとの同期状態（差分取得の起点と、最後に全件取得した時刻）
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS dedupe_sync (
+                    database_id TEXT PRIMARY KEY,
+                    edited_cursor TEXT,
+                    synced_at REAL NOT NULL
+                )"""
+            )
+
+    def load(self, database_id: str) -> Optional[Dict]:
+        """
+        データベースの保存済みキーをメモリに読み込む
+
+        Returns:
+            同期状態 {'edited_cursor': 最新の last_edited_time, 'synced_at': 全件取得時刻}（未同期の場合はNone）
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT page_id, title, stock_code, disclosure_time FROM dedupe_pages WHERE database_id = ?",
+                (database_id,)
+            ).fetchall()
+            state = self._conn.execute(
+                "SELECT edited_cursor, synced_at FROM dedupe_sync WHERE database_id = ?", (database_id,)
+            ).fetchone()
+            self.database_id = database_id
+            self._page_keys = {page_id: (title, stock_code, disclosure_time)
+                               for page_id, title, stock_code, disclosure_time in rows}
+            self._keys = {key: page_id for page_id, key in self._page_keys.items()}
+            self.sync_state = {'edited_cursor': state[0], 'synced_at': state[1]} if state else None
+        return self.sync_state
+
+    def get(self, key: DedupeKey) -> Optional[str]:
+        """キーに一致する登録済みページのID"""
+        return self._keys.get(key)
+
+    def __contains__(self, key: DedupeKey) -> bool:
+        return key in self._keys
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _put_locked(self, page_id: str, key: DedupeKey, last_edited_time: Optional[str]):
+        # 編集でキーが変わったページは古いキーを削除
+        old_key = self._page_keys.get(page_id)
+        if old_key is not None and old_key != key and self._keys.get(old_key) == page_id:
+            del self._keys[old_key]
+        self._page_keys[page_id] = key
+        self._keys[key] = page_id
+        self._conn.execute(
+            "INSERT OR REPLACE INTO dedupe_pages "
+            "(database_id, page_id, title, stock_code, disclosure_time, last_edited_time) VALUES (?, ?, ?, ?, ?, ?)",
+            (self.database_id, page_id, *key, last_edited_time)
+        )
+
+    def add(self, page_id: str, key: DedupeKey, last_edited_time: Optional[str] = None):
+        """作成したページのキーを登録"""
+        with self._lock, self._conn:
+            self._put_locked(page_id, key, last_edited_time)
+
+    def update(self, entries: Iterable[Tuple[str, DedupeKey, Optional[str]]], edited_cursor: Optional[str]):
+        """差分取得したページ（ページID, キー, last_edited_time）を反映し、差分取得の起点を進める（replace 後に使用）"""
+        with self._lock, self._conn:
+            for page_id, key, last_edited_time in entries:
+                self._put_locked(page_id, key, last_edited_time)
+            if edited_cursor and edited_cursor > (self.sync_state['edited_cursor'] or ''):
+                self.sync_state['edited_cursor'] = edited_cursor
+                self._conn.execute(
+                    "UPDATE dedupe_sync SET edited_cursor = ? WHERE database_id = ?", (edited_cursor, self.database_id)
+                )
+
+    def replace(self, entries: Iterable[Tuple[str, DedupeKey, Optional[str]]], edited_cursor: Optional[str]):
+        """全件取得したページでデータベースのキーを置き換える（Notion で削除されたページも反映）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM dedupe_pages WHERE database_id = ?", (self.database_id,))
+            self._keys, self._page_keys = {}, {}
+            for page_id, key, last_edited_time in entries:
+                self._put_locked(page_id, key, last_edited_time)
+            self.sync_state = {'edited_cursor': edited_cursor, 'synced_at': time.time()}
+            self._conn.execute(
+                "INSERT OR REPLACE INTO dedupe_sync (database_id, edited_cursor, synced_at) VALUES (?, ?, ?)",
+                (self.database_id, edited_cursor, self.sync_state['synced_at'])
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
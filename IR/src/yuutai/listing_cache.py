@@ -0,0 +1,394 @@
+import os
+import json
+import zlib
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from yuutai.decoding import decode_item, decode_items
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_company_code(company_code: Optional[str]) -> str:
+    """銘柄コードを4桁に正規化（5桁で末尾が0の場合は末尾を削除）"""
+    if company_code and len(company_code) == 5 and company_code.endswith('0'):
+        return company_code[:-1]
+    return company_code or ''
+
+
+def _next_day(day: str) -> str:
+    """YYYY-MM-DD の翌日"""
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+def _previous_day(day: str) -> str:
+    """YYYY-MM-DD の前日"""
+    return (datetime.strptime(day, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+
+
+class ListingCache:
+    """YANOSHIN TDNET API 日次一覧レスポンスのローカルキャッシュ（SQLite + zlib圧縮JSON）
+
+    日付（YYYY-MM-DD）をキーに一覧の生アイテム（item['Tdnet']を含む辞書のリスト）を保存する。
+    取得日より前の日付の一覧は確定済みとして無期限に有効、当日（以降）の一覧は today_ttl 秒だけ有効。
+    アイテムは page_size 件ごとのページ単位で保存し、読み出しもページ単位で行える。
+    取得中のページは一時領域に保存し、全ページの取得後に commit で既存の一覧と入れ替える。
+    読み出し時は使用する項目（decoding.TDNET_FIELDS）だけをデコードする。
+    保存時に銘柄コード別のインデックスも更新し、企業別の履歴をローカルで検索できる。
+    ポーリングモードの処理済み位置（ウォーターマーク）と、再試行待ちのアイテムもここに保存する。
+    """
+
+    def __init__(self, cache_dir: str = "./cache", today_ttl: float = 300, page_size: int = 1000):
+        self.cache_dir = cache_dir
+        self.today_ttl = today_ttl
+        self.page_size = page_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.db_path = os.path.join(cache_dir, 'yanoshin_listings.sqlite3')
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        """キャッシュテーブルを作成"""
+        with self._lock, self._conn:
+            index_exists = self._conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'company_index'"
+            ).fetchone()
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS listings (
+                    day TEXT PRIMARY KEY,
+                    fetched_at REAL NOT NULL,
+                    item_count INTEGER NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS listing_pages (
+                    day TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    PRIMARY KEY (day, page)
+                )"""
+            )
+            # 取得中の一覧のページ（commit で listing_pages に入れ替える）
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS staged_pages (
+                    day TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    PRIMARY KEY (day, page)
+                )"""
+            )
+            # 銘柄コード別インデックス（一覧キャッシュ・企業条件での取得結果から構築）
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS company_index (
+                    company_code TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    item TEXT NOT NULL,
+                    PRIMARY KEY (company_code, day, item_id)
+                )"""
+            )
+            # 企業条件で取得済みの期間（企業ごとに複数の期間を持つ）
+            coverage_sql = self._conn.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'company_coverage'"
+            ).fetchone()
+            if coverage_sql and 'company_code TEXT PRIMARY KEY' in coverage_sql[0]:
+                # 企業ごとに1期間だけを持つ旧形式から移行
+                self._conn.execute("ALTER TABLE company_coverage RENAME TO company_coverage_old")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS company_coverage (
+                    company_code TEXT NOT NULL,
+                    start_day TEXT NOT NULL,
+                    end_day TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    PRIMARY KEY (company_code, start_day, end_day)
+                )"""
+            )
+            if coverage_sql and 'company_code TEXT PRIMARY KEY' in coverage_sql[0]:
+                self._conn.execute("INSERT INTO company_coverage SELECT company_code, start_day, end_day, fetched_at "
+                                   "FROM company_coverage_old")
+                self._conn.execute("DROP TABLE company_coverage_old")
+            # ポーリングで処理済みの最新の公開日時と、その日時のアイテムID
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS poll_watermarks (
+                    name TEXT PRIMARY KEY,
+                    pubdate TEXT NOT NULL,
+                    item_ids TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            # ポーリングでアップロードに失敗し、次回以降に再試行するアイテム
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS poll_retries (
+                    name TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    item TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    PRIMARY KEY (name, item_id)
+                )"""
+            )
+
+        if not index_exists:
+            self.rebuild_company_index()
+
+    @staticmethod
+    def _encode(items: List[Dict]) -> bytes:
+        return zlib.compress(json.dumps(items, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    @staticmethod
+    def _decode(payload: bytes) -> List[Dict]:
+        return decode_items(zlib.decompress(payload))
+
+    def _is_fresh(self, day: str, fetched_at: float) -> bool:
+        """キャッシュエントリが有効かどうかを判定"""
+        fetched_day = datetime.fromtimestamp(fetched_at).strftime('%Y-%m-%d')
+        if day < fetched_day:
+            # 対象日の翌日以降に取得した一覧は確定済み
+            return True
+        return time.time() - fetched_at < self.today_ttl
+
+    def is_cached(self, day: str) -> bool:
+        """指定日の一覧が有効なキャッシュとして存在するか"""
+        with self._lock:
+            row = self._conn.execute("SELECT fetched_at FROM listings WHERE day = ?", (day,)).fetchone()
+        return bool(row) and self._is_fresh(day, row[0])
+
+    def get(self, day: str) -> Optional[List[Dict]]:
+        """指定日の一覧アイテムを取得（キャッシュなし・期限切れの場合はNone）"""
+        if not self.is_cached(day):
+            return None
+
+        items = []
+        for page in self.iter_pages(day):
+            items.extend(page)
+        return items
+
+    def cached_days(self, start_day: str = None, end_day: str = None) -> List[str]:
+        """キャッシュ済み（確定済み）の日付一覧"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day FROM listings WHERE day BETWEEN ? AND ? ORDER BY day",
+                (start_day or '0000-00-00', end_day or '9999-99-99')
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def iter_pages(self, day: str) -> Iterator[List[Dict]]:
+        """指定日の一覧をページ単位で読み出す（1ページずつ展開するためメモリ使用量は一定）"""
+        with self._lock:
+            page_numbers = [row[0] for row in self._conn.execute(
+                "SELECT page FROM listing_pages WHERE day = ? ORDER BY page", (day,)
+            )]
+
+        for page in page_numbers:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT payload FROM listing_pages WHERE day = ? AND page = ?", (day, page)
+                ).fetchone()
+            if row:
+                yield self._decode(row[0])
+
+    def put(self, day: str, items: List[Dict], fetched_at: float = None):
+        """指定日の一覧アイテムを保存（既存のエントリは置き換え）"""
+        if not items:
+            self.put_page(day, 0, [])
+        for page, offset in enumerate(range(0, len(items), self.page_size)):
+            self.put_page(day, page, items[offset:offset + self.page_size])
+        self.commit(day, len(items), fetched_at)
+
+    def put_page(self, day: str, page: int, items: List[Dict]):
+        """
+        一覧の1ページを一時領域に保存
+
+        commit するまで既存のキャッシュ（期限切れを含む）は置き換えないため、
+        途中のページの取得に失敗しても以前の一覧とインデックスは残る。
+        ページのアイテムは raw_data の遅延読み込みのため、この時点でインデックスに追加する。
+        """
+        payload = self._encode(items)
+        with self._lock, self._conn:
+            if page == 0:
+                self._conn.execute("DELETE FROM staged_pages WHERE day = ?", (day,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO staged_pages (day, page, payload) VALUES (?, ?, ?)", (day, page, payload)
+            )
+            self._index_items(items, day)
+
+    def commit(self, day: str, item_count: int, fetched_at: float = None):
+        """一時領域のページを指定日の完全な一覧として既存のキャッシュと入れ替え、インデックスを更新"""
+        if fetched_at is None:
+            fetched_at = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM listing_pages WHERE day = ?", (day,))
+            self._conn.execute("DELETE FROM company_index WHERE day = ?", (day,))
+            self._conn.execute(
+                "INSERT INTO listing_pages (day, page, payload) SELECT day, page, payload FROM staged_pages WHERE day = ?",
+                (day,)
+            )
+            for (payload,) in self._conn.execute(
+                    "SELECT payload FROM staged_pages WHERE day = ? ORDER BY page", (day,)).fetchall():
+                self._index_items(json.loads(zlib.decompress(payload)), day)
+            self._conn.execute("DELETE FROM staged_pages WHERE day = ?", (day,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO listings (day, fetched_at, item_count) VALUES (?, ?, ?)",
+                (day, fetched_at, item_count)
+            )
+        logger.debug(f"Cached {item_count} listing items for {day}")
+
+    def _index_items(self, items: List[Dict], day: str = None):
+        """一覧アイテムを銘柄コード別インデックスに登録（ロック取得済みで呼び出す）"""
+        rows = []
+        for item in items:
+            tdnet_data = item.get('Tdnet', {})
+            company_code = normalize_company_code(tdnet_data.get('company_code'))
+            item_day = day or (tdnet_data.get('pubdate') or '')[:10]
+            if company_code and item_day and tdnet_data.get('id') is not None:
+                rows.append((company_code, item_day, str(tdnet_data['id']),
+                             json.dumps(item, ensure_ascii=False, separators=(',', ':'))))
+        if rows:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO company_index (company_code, day, item_id, item) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def rebuild_company_index(self):
+        """キャッシュ済みの一覧から銘柄コード別インデックスを再構築"""
+        with self._lock:
+            days = [row[0] for row in self._conn.execute("SELECT day FROM listings")]
+
+        for day in days:
+            for page_items in self.iter_pages(day):
+                with self._lock, self._conn:
+                    self._index_items(page_items, day)
+        if days:
+            logger.info(f"Rebuilt company index from {len(days)} cached listing days")
+
+    def index_items(self, items: List[Dict]):
+        """一覧の一部（ポーリングで取得した新着など）を銘柄コード別インデックスに登録"""
+        with self._lock, self._conn:
+            self._index_items(items)
+
+    def index_company_items(self, company_code: str, items: List[Dict], start_day: str, end_day: str,
+                            fetched_at: float = None):
+        """
+        企業条件で取得したアイテムをインデックスに登録し、取得済み期間を記録
+
+        記録済みの期間と重なる・隣接する場合は1つの期間にまとめる。ただし取得時点で確定していなかった日を
+        含む期間は、新しい期間に含まれる場合だけまとめ、それ以外は取得時刻ごとの鮮度を保つため別の期間として残す。
+        離れた期間はそれぞれ残す。
+        """
+        if fetched_at is None:
+            fetched_at = time.time()
+        company_code = normalize_company_code(company_code)
+
+        with self._lock, self._conn:
+            self._index_items(items)
+            rows = self._conn.execute(
+                "SELECT start_day, end_day, fetched_at FROM company_coverage "
+                "WHERE company_code = ? AND start_day <= ? AND ? <= end_day",
+                (company_code, _next_day(end_day), _previous_day(start_day))
+            ).fetchall()
+            merged_start, merged_end = start_day, end_day
+            for row_start, row_end, row_fetched_at in rows:
+                contained = start_day <= row_start and row_end <= end_day
+                settled = row_end < datetime.fromtimestamp(row_fetched_at).strftime('%Y-%m-%d')
+                if not (contained or settled):
+                    continue
+                merged_start, merged_end = min(merged_start, row_start), max(merged_end, row_end)
+                self._conn.execute(
+                    "DELETE FROM company_coverage WHERE company_code = ? AND start_day = ? AND end_day = ?",
+                    (company_code, row_start, row_end)
+                )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO company_coverage (company_code, start_day, end_day, fetched_at) VALUES (?, ?, ?, ?)",
+                (company_code, merged_start, merged_end, fetched_at)
+            )
+
+    def is_company_covered(self, company_code: str, day: str) -> bool:
+        """指定企業の指定日が（一覧キャッシュまたは企業条件での取得により）インデックス済みか"""
+        if self.is_cached(day):
+            return True
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT fetched_at FROM company_coverage WHERE company_code = ? AND start_day <= ? AND ? <= end_day",
+                (normalize_company_code(company_code), day, day)
+            ).fetchall()
+        return any(self._is_fresh(day, fetched_at) for fetched_at, in rows)
+
+    def get_company_items(self, company_code: str, start_day: str, end_day: str) -> Dict[str, List[Dict]]:
+        """指定企業の期間内の一覧アイテムを日付ごとに取得"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, item FROM company_index WHERE company_code = ? AND day BETWEEN ? AND ? ORDER BY day, item_id",
+                (normalize_company_code(company_code), start_day, end_day)
+            ).fetchall()
+
+        items_by_day = {}
+        for day, item in rows:
+            items_by_day.setdefault(day, []).append(decode_item(item))
+        return items_by_day
+
+    def get_item(self, company_code: str, day: str, item_id) -> Optional[Dict]:
+        """インデックス済みの一覧アイテム1件の Tdnet データを取得（Disclosure.raw_data の遅延読み込み用）"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT item FROM company_index WHERE company_code = ? AND day = ? AND item_id = ?",
+                (normalize_company_code(company_code), day, str(item_id))
+            ).fetchone()
+        return decode_item(row[0]).get('Tdnet') if row else None
+
+    def get_watermark(self, name: str) -> Optional[Dict]:
+        """ポーリングのウォーターマーク {'pubdate': 公開日時, 'ids': その日時の処理済みID} を取得"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pubdate, item_ids FROM poll_watermarks WHERE name = ?", (name,)
+            ).fetchone()
+        return {'pubdate': row[0], 'ids': json.loads(row[1])} if row else None
+
+    def set_watermark(self, name: str, pubdate: str, ids: List[str]):
+        """ポーリングのウォーターマークを保存"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO poll_watermarks (name, pubdate, item_ids, updated_at) VALUES (?, ?, ?, ?)",
+                (name, pubdate, json.dumps(sorted(ids)), time.time())
+            )
+
+    def get_poll_retries(self, name: str) -> List[Dict]:
+        """再試行待ちのアイテム [{'id', 'day', 'item'（Tdnet データ）, 'attempts'}]（日付順）"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_id, day, item, attempts FROM poll_retries WHERE name = ? ORDER BY day, item_id", (name,)
+            ).fetchall()
+        return [{'id': item_id, 'day': day, 'item': json.loads(item), 'attempts': attempts}
+                for item_id, day, item, attempts in rows]
+
+    def set_poll_retry(self, name: str, item_id: str, day: str, item: Dict, attempts: int):
+        """アップロードに失敗したアイテムを再試行待ちとして保存"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO poll_retries (name, item_id, day, item, attempts) VALUES (?, ?, ?, ?, ?)",
+                (name, str(item_id), day, json.dumps(item, ensure_ascii=False, separators=(',', ':')), attempts)
+            )
+
+    def clear_poll_retry(self, name: str, item_id: str):
+        """再試行待ちのアイテムを削除"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM poll_retries WHERE name = ? AND item_id = ?", (name, str(item_id)))
+
+    def invalidate(self, day: str):
+        """指定日のキャッシュを削除"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM listing_pages WHERE day = ?", (day,))
+            self._conn.execute("DELETE FROM staged_pages WHERE day = ?", (day,))
+            self._conn.execute("DELETE FROM listings WHERE day = ?", (day,))
+            self._conn.execute("DELETE FROM company_index WHERE day = ?", (day,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
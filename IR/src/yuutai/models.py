@@ -0,0 +1,150 @@
+import sys
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 未設定の任意項目（辞書にキーがない状態に相当）
+_UNSET = object()
+
+
+def intern_text(value: Optional[str]) -> Optional[str]:
+    """繰り返し現れる文字列（市場名・会社名など）を共有"""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Disclosure:
+    """株主優待開示1件の軽量レコード
+
+    __slots__ で属性を固定し、カテゴリ・市場・会社名・日付の文字列は共有（intern）する。
+    元の一覧アイテム（raw_data）は保持せず、参照されたときに一覧キャッシュから読み込む
+    （キャッシュがない場合のみ保持）。
+    YuutaiNotionManager などの既存コードのため、従来の辞書と同じキーで
+    get / [] / in / keys / items によるアクセスと代入に対応する。
+    """
+
+    # 従来の辞書で常に存在したキー
+    FIELDS = (
+        'id', 'title', 'company_code', 'company_name', 'disclosure_date', 'disclosure_time',
+        'document_type', 'pdf_url', 'category', 'markets_string', 'url_xbrl', 'raw_data'
+    )
+    # ダウンロード後に設定されるキー（設定されるまでは辞書にキーがない状態と同じ）
+    OPTIONAL_FIELDS = ('local_file', 'file_size', 'sha256')
+
+    __slots__ = (
+        'id', 'title', 'company_code', 'company_name', 'disclosure_date', 'disclosure_time',
+        'document_type', 'pdf_url', 'category', 'markets_string', 'url_xbrl',
+        'local_file', 'file_size', 'sha256', '_raw_data', '_raw_source', '_extra'
+    )
+
+    def __init__(self, id: Optional[str] = None, title: str = '', company_code: str = '', company_name: str = None,
+                 disclosure_date: str = '', disclosure_time: str = '', document_type: str = 'TDNET',
+                 pdf_url: str = '', category: str = None, markets_string: str = '', url_xbrl: str = '',
+                 raw_data: Optional[Dict] = None, raw_source=None):
+        self.id = id
+        self.title = title
+        self.company_code = intern_text(company_code)
+        self.company_name = intern_text(company_name)
+        self.disclosure_date = intern_text(disclosure_date)
+        self.disclosure_time = disclosure_time
+        self.document_type = intern_text(document_type)
+        self.pdf_url = pdf_url
+        self.category = intern_text(category)
+        self.markets_string = intern_text(markets_string)
+        self.url_xbrl = url_xbrl
+        self.local_file = _UNSET
+        self.file_size = _UNSET
+        self.sha256 = _UNSET
+        self._raw_data = raw_data
+        # raw_data を読み込む一覧キャッシュ（ListingCache.get_item を持つオブジェクト）
+        self._raw_source = raw_source
+        self._extra = None
+
+    @classmethod
+    def from_tdnet(cls, tdnet_data: Dict, date: str, category: str, company_code: str,
+                   raw_source=None) -> 'Disclosure':
+        """YANOSHIN 一覧の Tdnet データから作成（raw_source があれば raw_data は保持しない）"""
+        return cls(
+            id=tdnet_data.get('id'),
+            title=tdnet_data.get('title', ''),
+            company_code=company_code,
+            company_name=tdnet_data.get('company_name'),
+            disclosure_date=date,
+            disclosure_time=tdnet_data.get('pubdate', ''),
+            document_type='TDNET',
+            pdf_url=tdnet_data.get('document_url', ''),
+            category=category,
+            markets_string=tdnet_data.get('markets_string', ''),
+            url_xbrl=tdnet_data.get('url_xbrl', ''),
+            raw_data=None if raw_source is not None else tdnet_data,
+            raw_source=raw_source
+        )
+
+    @property
+    def raw_data(self) -> Optional[Dict]:
+        """元の Tdnet データ（保持していない場合は一覧キャッシュから読み込む）"""
+        if self._raw_data is None and self._raw_source is not None:
+            return self._raw_source.get_item(self.company_code, self.disclosure_date, self.id)
+        return self._raw_data
+
+    @raw_data.setter
+    def raw_data(self, value: Optional[Dict]):
+        self._raw_data = value
+
+    # 辞書形式のアクセス
+    def _has(self, key: str) -> bool:
+        if key in self.FIELDS:
+            return True
+        if key in self.OPTIONAL_FIELDS:
+            return getattr(self, key) is not _UNSET
+        return self._extra is not None and key in self._extra
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self.FIELDS or (key in self.OPTIONAL_FIELDS and getattr(self, key) is not _UNSET):
+            return getattr(self, key)
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        if key in self.FIELDS or key in self.OPTIONAL_FIELDS:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __contains__(self, key: str) -> bool:
+        return self._has(key)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self) -> Iterator[str]:
+        yield from self.FIELDS
+        for key in self.OPTIONAL_FIELDS:
+            if getattr(self, key) is not _UNSET:
+                yield key
+        if self._extra:
+            yield from self._extra
+
+    def __iter__(self) -> Iterator[str]:
+        return self.keys()
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for key in self.keys():
+            yield key, self[key]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """従来の辞書形式に変換"""
+        return dict(self.items())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (Disclosure, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Disclosure(id={self.id!r}, company_code={self.company_code!r}, title={self.title!r})"
@@ -4,23 +4,69 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime
 import sys
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # 親ディレクトリを追加
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from notion_uploader import NotionUploader
+from notion_uploader import NOTION_API_BASE_URL, NotionUploader
+from http_transport import HTTPTransport
+from yuutai.database_cache import DatabaseCache
+from yuutai.dedupe_index import DedupeIndex, make_dedupe_key
+from yuutai.notion_request_layer import NotionRequestLayer
+from yuutai.pdf_store import PDFStore
+from yuutai.rate_limiter import TokenBucketRateLimiter
 
 logger = logging.getLogger(__name__)
 
+YUUTAI_DATABASE_NAME = "株主優待開示情報"
+
 class YuutaiNotionManager:
     """株主優待開示情報用の統一データベース管理（1つのテーブルで管理）"""
     
-    def __init__(self, api_key: str, page_id: str):
-        self.uploader = NotionUploader(api_key, page_id)
+    def __init__(self, api_key: str, page_id: str, transport: HTTPTransport = None,
+                 base_url: str = NOTION_API_BASE_URL, cache_dir: Optional[str] = None,
+                 dedupe_refresh_interval: float = 600, upload_workers: int = 4, request_rate: float = 3.0,
+                 attach_on_create: bool = True, pdf_store: PDFStore = None):
+        # Notion API 全体のリクエストレート（平均 request_rate 件/秒、スレッド間・プロセス間で共有）
+        self.rate_limiter = None
+        if request_rate > 0:
+            self.rate_limiter = TokenBucketRateLimiter(
+                rate=request_rate,
+                capacity=request_rate,
+                name='notion',
+                state_path=os.path.join(cache_dir, 'rate_limits.sqlite3') if cache_dir else None
+            )
+        # 開示を並列にアップロードするワーカー数（1の場合は逐次処理）
+        self.upload_workers = max(1, upload_workers)
+        # 全リクエストのレート制限・429/5xx の再試行・同時実行数の調整（AIMD）
+        self.request_layer = NotionRequestLayer(self.rate_limiter, self.upload_workers)
+        self.uploader = NotionUploader(api_key, page_id, transport, base_url, self.request_layer)
         self.api_key = api_key
         self.page_id = page_id
         
-        # 統一データベース
+        # 統一データベース（IDとプロパティ定義はキャッシュし、プロセス内の初回使用時に検証する）
         self.yuutai_database_id = None
+        self.yuutai_database_properties: Dict[str, Any] = {}
+        self.database_cache = DatabaseCache(cache_dir)
+        self._database_lock = threading.Lock()
+        
+        # PDFを先にアップロードし、ページ作成時に添付する（開示ごとの pages.update を省く）
+        # 添付できなかった場合はページ作成後に添付する従来の手順に切り替える
+        self.attach_on_create = attach_on_create
+        self.upload_stats = {'attached_on_create': 0, 'attach_fallbacks': 0}
+        self._upload_stats_lock = threading.Lock()
+        # アップロード済みPDFの削除時に、最後の参照となったストア上の本体も削除する
+        self.pdf_store = pdf_store
+        
+        # 登録済み開示キーのローカルインデックス（重複判定にAPIを使わない）
+        # refresh_interval 秒ごとに Notion 上の編集を差分取得し、full_refresh_interval 秒ごとに全件取得し直す
+        self.dedupe_index = DedupeIndex(cache_dir)
+        self.dedupe_refresh_interval = dedupe_refresh_interval
+        self.dedupe_full_refresh_interval = 24 * 60 * 60
+        self._dedupe_ready = False
+        self._dedupe_refreshed_at = 0.0
+        self._dedupe_lock = threading.Lock()
         
         # 株主優待関連カテゴリの定義
         self.yuutai_categories = [
@@ -30,50 +76,145 @@ class YuutaiNotionManager:
         ]
     
     def initialize_databases(self) -> bool:
-        """データベース構造を初期化"""
+        """データベース構造を初期化（解決済みのデータベースがあればAPIを呼ばない）"""
         try:
-            # 統一株主優待データベースを作成
-            self.yuutai_database_id = self._create_yuutai_database()
-            if not self.yuutai_database_id:
-                return False
-            
-            logger.info("Yuutai unified database structure initialized")
+            # 並列アップロード中に無効になった場合も1つのスレッドだけが解決し直す
+            with self._database_lock:
+                if not self.yuutai_database_id:
+                    # 統一株主優待データベースをキャッシュから取得、なければ検索・作成
+                    self.yuutai_database_id = self._resolve_yuutai_database()
+                    if not self.yuutai_database_id:
+                        return False
+                    logger.info("Yuutai unified database structure initialized")
+            
+            self._ensure_dedupe_index()
             return True
             
         except Exception as e:
             logger.error(f"Failed to initialize Yuutai databases: {str(e)}")
             return False
     
+    def _resolve_yuutai_database(self) -> Optional[str]:
+        """
+        統一株主優待データベースのIDを解決
+        
+        キャッシュ済みのIDは databases.retrieve で存在・名前を確認してから使い、
+        確認できない場合はキャッシュを削除して検索・作成し直す。
+        キャッシュ済みのプロパティ定義と取得した定義が異なる場合（Notion 上での列の削除・型変更）は警告して更新する。
+        """
+        cached = self.database_cache.get(self.page_id, YUUTAI_DATABASE_NAME)
+        if cached:
+            database = self._retrieve_database(cached['database_id'])
+            if database is not None:
+                self.yuutai_database_properties = database.get('properties', {})
+                drifted = self._schema_drift(cached['properties'], self.yuutai_database_properties)
+                if drifted:
+                    logger.warning(f"Yuutai database schema changed since cached: {', '.join(drifted)}")
+                    self._warn_missing_properties()
+                    self.database_cache.put(self.page_id, YUUTAI_DATABASE_NAME, cached['database_id'],
+                                            self.yuutai_database_properties)
+                logger.info(f"Using cached yuutai database: {cached['database_id']}")
+                return cached['database_id']
+            logger.info(f"Cached yuutai database is no longer valid: {cached['database_id']}")
+            self.database_cache.invalidate(self.page_id, YUUTAI_DATABASE_NAME)
+        
+        db_id = self._create_yuutai_database()
+        if not db_id:
+            return None
+        
+        if not self.yuutai_database_properties:
+            database = self._retrieve_database(db_id)
+            if database is None:
+                return None
+            self.yuutai_database_properties = database.get('properties', {})
+        
+        self._warn_missing_properties()
+        self.database_cache.put(self.page_id, YUUTAI_DATABASE_NAME, db_id, self.yuutai_database_properties)
+        return db_id
+    
+    def _warn_missing_properties(self):
+        """統一データベースに必要なプロパティが欠けている場合に警告"""
+        missing = [name for name in self._yuutai_properties() if name not in self.yuutai_database_properties]
+        if missing:
+            logger.warning(f"Yuutai database is missing properties: {', '.join(missing)}")
+    
+    @staticmethod
+    def _schema_drift(cached: Dict[str, Dict], current: Dict[str, Dict]) -> List[str]:
+        """キャッシュ済みと現在のプロパティ定義で、追加・削除・型変更されたプロパティ名"""
+        names = sorted(set(cached) | set(current))
+        return [name for name in names
+                if (cached.get(name) or {}).get('type') != (current.get(name) or {}).get('type')]
+    
+    def _retrieve_database(self, database_id: str) -> Optional[Dict]:
+        """データベースを取得し、ゴミ箱に入っていない統一データベースであることを確認"""
+        try:
+            database = self.uploader.client.databases.retrieve(database_id=database_id)
+        except Exception as e:
+            logger.warning(f"Failed to retrieve yuutai database {database_id}: {str(e)}")
+            return None
+        
+        title = ''.join(t.get('plain_text', '') for t in database.get('title', []))
+        if database.get('archived') or database.get('in_trash') or title != YUUTAI_DATABASE_NAME:
+            return None
+        return database
+    
+    def invalidate_database(self, database_id: Optional[str] = None):
+        """
+        解決済みのデータベースIDを破棄（データベースが見つからないエラーの後、次回の初期化で解決し直す）
+        
+        database_id を指定した場合は、並列処理中に別のスレッドが解決し直した後であれば何もしない。
+        """
+        with self._database_lock:
+            if database_id and database_id != self.yuutai_database_id:
+                return
+            logger.warning(f"Invalidating yuutai database: {self.yuutai_database_id}")
+            self.database_cache.invalidate(self.page_id, YUUTAI_DATABASE_NAME)
+            self.uploader.invalidate_child_databases()
+            self.yuutai_database_id = None
+            self.yuutai_database_properties = {}
+            self._dedupe_ready = False
+    
+    def _handle_database_error(self, error: Exception, database_id: Optional[str] = None):
+        """データベースが見つからない（削除・権限変更）エラーの場合にキャッシュを破棄"""
+        if getattr(error, 'code', None) == 'object_not_found' or getattr(error, 'status', None) == 404:
+            self.invalidate_database(database_id)
+    
+    def _yuutai_properties(self) -> Dict[str, Dict]:
+        """統一データベースのプロパティ定義（指定されたカラムのみ）"""
+        return {
+            "タイトル": {"title": {}},
+            "PDFファイル": {"files": {}},
+            "カテゴリ": {"select": {"options": [
+                {"name": cat, "color": "default"} for cat in self.yuutai_categories
+            ]}},
+            "優待価値": {"number": {}},
+            "優待内容": {"rich_text": {}},
+            "必要株式数": {"number": {}},
+            "権利確定日": {"date": {}},
+            "銘柄コード": {"rich_text": {}},
+            "銘柄名": {"rich_text": {}},
+            "開示時刻": {"rich_text": {}}
+        }
+    
     def _create_yuutai_database(self) -> Optional[str]:
         """統一株主優待データベースを作成"""
         try:
             # 既存のデータベースを検索
-            existing_db = self.uploader._find_existing_database("株主優待開示情報")
+            existing_db = self.uploader._find_existing_database(YUUTAI_DATABASE_NAME)
             if existing_db:
                 logger.info(f"Found existing yuutai database: {existing_db}")
                 return existing_db
             
             # 新規作成（指定されたカラムのみ）
-            response = self.uploader.client.databases.create(
+            response = self.uploader.create_database(
                 parent={"page_id": self.page_id},
-                title=[{"type": "text", "text": {"content": "株主優待開示情報"}}],
-                properties={
-                    "タイトル": {"title": {}},
-                    "PDFファイル": {"files": {}},
-                    "カテゴリ": {"select": {"options": [
-                        {"name": cat, "color": "default"} for cat in self.yuutai_categories
-                    ]}},
-                    "優待価値": {"number": {}},
-                    "優待内容": {"rich_text": {}},
-                    "必要株式数": {"number": {}},
-                    "権利確定日": {"date": {}},
-                    "銘柄コード": {"rich_text": {}},
-                    "銘柄名": {"rich_text": {}},
-                    "開示時刻": {"rich_text": {}}
-                }
+                title=[{"type": "text", "text": {"content": YUUTAI_DATABASE_NAME}}],
+                properties=self._yuutai_properties()
             )
             
             db_id = response["id"]
+            self.yuutai_database_properties = response.get('properties', {})
+            self.uploader._register_child_database(YUUTAI_DATABASE_NAME, db_id)
             logger.info(f"Created yuutai unified database: {db_id}")
             return db_id
             
@@ -93,6 +234,10 @@ class YuutaiNotionManager:
                 logger.error("Stock code and disclosure ID are required")
                 return False
             
+            # データベースが無効になった後は解決し直す
+            if not self.yuutai_database_id and not self.initialize_databases():
+                return False
+            
             # 🔍 重複チェック
             if self._check_duplicate_disclosure(disclosure_data):
                 logger.info(f"Skipping duplicate yuutai disclosure: {disclosure_id} ({stock_code})")
@@ -111,33 +256,9 @@ class YuutaiNotionManager:
             return False
     
     def _create_yuutai_disclosure_page(self, disclosure_data: Dict) -> Optional[str]:
-        """株主優待開示詳細ページを作成"""
+        """株主優待開示詳細ページを作成（重複チェックは呼び出し側の upload_yuutai_disclosure で実施済み）"""
+        database_id = self.yuutai_database_id
         try:
-            # 重複チェック（銘柄コード、開示時刻、タイトルで）
-            response = self.uploader.client.databases.query(
-                database_id=self.yuutai_database_id,
-                filter={
-                    "and": [
-                        {
-                            "property": "タイトル",
-                            "title": {"equals": disclosure_data.get('title', '')[:100]}
-                        },
-                        {
-                            "property": "銘柄コード",
-                            "rich_text": {"equals": disclosure_data.get('company_code', '')}
-                        },
-                        {
-                            "property": "開示時刻",
-                            "rich_text": {"equals": disclosure_data.get('disclosure_time', '')}
-                        }
-                    ]
-                }
-            )
-            
-            if response['results']:
-                logger.info(f"Yuutai disclosure already exists: {disclosure_data.get('id')}")
-                return response['results'][0]['id']
-            
             # プロパティを準備（指定されたカラムのみ）
             properties = {
                 "タイトル": {"title": [{"text": {"content": disclosure_data.get('title', '')[:100]}}]},
@@ -159,22 +280,51 @@ class YuutaiNotionManager:
                 if yuutai_info.get('rights_date'):
                     properties["権利確定日"] = {"date": {"start": yuutai_info['rights_date']}}
             
+            # PDFファイルがある場合は先にアップロードしてページ作成時に添付
+            local_file = disclosure_data.get('local_file')
+            has_file = bool(local_file and os.path.exists(local_file))
+            pdf_property = None
+            if has_file and self.attach_on_create:
+                pdf_property = self._prepare_pdf_property(local_file, os.path.basename(local_file))
+            
             # ページを作成
-            response = self.uploader.client.pages.create(
-                parent={"database_id": self.yuutai_database_id},
-                properties=properties
-            )
+            response = None
+            if pdf_property:
+                try:
+                    response = self.uploader.client.pages.create(
+                        parent={"database_id": database_id},
+                        properties={**properties, "PDFファイル": pdf_property}
+                    )
+                except Exception as e:
+                    # 添付が拒否された（アップロードの期限切れ等）場合は添付せずに作成し直す
+                    if getattr(e, 'status', None) != 400:
+                        raise
+                    logger.warning(f"Failed to attach PDF on page creation, retrying without it: {str(e)}")
+                    pdf_property = None
+            if response is None:
+                response = self.uploader.client.pages.create(
+                    parent={"database_id": database_id},
+                    properties=properties
+                )
             
             page_id = response["id"]
+            self.dedupe_index.add(page_id, self._dedupe_key(disclosure_data), response.get('last_edited_time'))
             
-            # PDFファイルがある場合はアップロード
-            local_file = disclosure_data.get('local_file')
-            if local_file and os.path.exists(local_file):
-                success = self._upload_yuutai_disclosure_file(page_id, local_file, disclosure_data)
+            if has_file:
+                if pdf_property:
+                    self._count_upload('attached_on_create')
+                    success = True
+                else:
+                    if self.attach_on_create:
+                        self._count_upload('attach_fallbacks')
+                    success = self._upload_yuutai_disclosure_file(page_id, local_file, disclosure_data)
                 if success:
                     # アップロード成功後にローカルファイルを削除
                     try:
-                        os.remove(local_file)
+                        if self.pdf_store:
+                            self.pdf_store.release(local_file)
+                        else:
+                            os.remove(local_file)
                         logger.info(f"Deleted local file: {local_file}")
                     except Exception as e:
                         logger.warning(f"Failed to delete local file {local_file}: {str(e)}")
@@ -189,6 +339,7 @@ class YuutaiNotionManager:
             
         except Exception as e:
             logger.error(f"Failed to create yuutai disclosure page: {str(e)}")
+            self._handle_database_error(e, database_id)
             return None
     
     def _upload_yuutai_disclosure_file(self, page_id: str, file_path: str, disclosure_data: Dict) -> bool:
@@ -222,35 +373,41 @@ class YuutaiNotionManager:
             logger.error(f"Failed to upload yuutai disclosure file: {str(e)}")
             return False
     
-    def _upload_file_to_pdf_property(self, page_id: str, file_path: str, filename: str) -> bool:
-        """PDFファイルプロパティに直接ファイルをアップロード"""
+    def _prepare_pdf_property(self, file_path: str, filename: str) -> Optional[Dict]:
+        """PDFをアップロードし、PDFファイルプロパティの値（file_upload 参照）を返す（失敗時はNone）"""
         try:
-            # ファイルアップロードを初期化
-            file_upload_id = self.uploader._create_file_upload(filename, 'application/pdf')
+            # ファイルをアップロード（大きいPDFは multi_part で分割送信）
+            file_upload_id = self.uploader._upload_file(file_path, filename, 'application/pdf')
             if not file_upload_id:
-                return False
+                return None
+            
+            return {
+                "files": [
+                    {
+                        "name": filename,
+                        "type": "file_upload",
+                        "file_upload": {
+                            "id": file_upload_id
+                        }
+                    }
+                ]
+            }
             
-            # ファイルを送信
-            upload_success = self.uploader._send_file_upload(file_upload_id, file_path, filename, 'application/pdf')
-            if not upload_success:
+        except Exception as e:
+            logger.error(f"Failed to prepare PDF upload: {str(e)}")
+            return None
+    
+    def _upload_file_to_pdf_property(self, page_id: str, file_path: str, filename: str) -> bool:
+        """PDFファイルプロパティに直接ファイルをアップロード"""
+        try:
+            pdf_property = self._prepare_pdf_property(file_path, filename)
+            if not pdf_property:
                 return False
             
             # PDFファイルプロパティを更新
             self.uploader.client.pages.update(
                 page_id=page_id,
-                properties={
-                    "PDFファイル": {
-                        "files": [
-                            {
-                                "name": filename,
-                                "type": "file_upload",
-                                "file_upload": {
-                                    "id": file_upload_id
-                                }
-                            }
-                        ]
-                    }
-                }
+                properties={"PDFファイル": pdf_property}
             )
             
             logger.info(f"Successfully set PDF file property: {filename}")
@@ -260,6 +417,9 @@ class YuutaiNotionManager:
             logger.error(f"Failed to upload file to PDF property: {str(e)}")
             return False
     
+    def _count_upload(self, name: str):
+        with self._upload_stats_lock:
+            self.upload_stats[name] += 1
     
     def _extract_yuutai_info(self, title: str) -> Optional[Dict]:
         """タイトルから株主優待情報を抽出"""
@@ -347,21 +507,39 @@ class YuutaiNotionManager:
     
     def _check_duplicate_disclosure(self, disclosure_data: Dict) -> bool:
         """株主優待開示の重複チェック（銘柄コード、開示日時、タイトルが一致）"""
+        title = disclosure_data.get('title', '')
+        stock_code = disclosure_data.get('company_code')
+        disclosure_time = disclosure_data.get('disclosure_time', '')
+        
+        logger.debug(f"Checking duplicate for yuutai disclosure: {title[:30]}... ({stock_code}) at {disclosure_time}")
+        
+        if self._find_existing_disclosure(disclosure_data):
+            logger.info(f"Duplicate yuutai disclosure found: {title[:50]}... ({stock_code}) at {disclosure_time}")
+            return True
+        
+        logger.debug(f"No duplicate found for yuutai disclosure: {title[:30]}...")
+        return False
+    
+    @staticmethod
+    def _dedupe_key(disclosure_data: Dict):
+        return make_dedupe_key(disclosure_data.get('title', ''), disclosure_data.get('company_code'),
+                               disclosure_data.get('disclosure_time', ''))
+    
+    def _find_existing_disclosure(self, disclosure_data: Dict) -> Optional[str]:
+        """登録済みの同じ開示のページID（ローカルインデックスを参照し、使えない場合はNotionをクエリ）"""
+        if self._ensure_dedupe_index():
+            return self.dedupe_index.get(self._dedupe_key(disclosure_data))
+        
+        database_id = self.yuutai_database_id
         try:
-            title = disclosure_data.get('title', '')
-            stock_code = disclosure_data.get('company_code')
-            disclosure_time = disclosure_data.get('disclosure_time', '')
-            
-            logger.debug(f"Checking duplicate for yuutai disclosure: {title[:30]}... ({stock_code}) at {disclosure_time}")
-            
-            # 銘柄コード、開示時刻、タイトルによる重複チェック
-            response = self.uploader.client.databases.query(
-                database_id=self.yuutai_database_id,
+            title, stock_code, disclosure_time = self._dedupe_key(disclosure_data)
+            response = self.uploader.query_database(
+                database_id,
                 filter={
                     "and": [
                         {
                             "property": "タイトル",
-                            "title": {"equals": title[:100]}
+                            "title": {"equals": title}
                         },
                         {
                             "property": "銘柄コード", 
@@ -374,18 +552,84 @@ class YuutaiNotionManager:
                     ]
                 }
             )
-            
-            if response.get('results'):
-                logger.info(f"Duplicate yuutai disclosure found: {title[:50]}... ({stock_code}) at {disclosure_time}")
-                return True
-            
-            logger.debug(f"No duplicate found for yuutai disclosure: {title[:30]}...")
-            return False
+            results = response.get('results')
+            return results[0]['id'] if results else None
             
         except Exception as e:
             logger.error(f"Error in yuutai duplicate check: {str(e)}")
+            self._handle_database_error(e, database_id)
+            return None
+    
+    def _ensure_dedupe_index(self) -> bool:
+        """
+        重複判定用のローカルインデックスを使える状態にする
+        
+        初回（またはデータベース変更時）は保存済みのキーを読み込んで差分取得し、
+        未同期・全件取得から full_refresh_interval 秒以上経過している場合は全件取得する。
+        以降は refresh_interval 秒ごとに Notion 上で編集されたページを差分取得する。
+        取得に失敗した場合は False を返す（呼び出し側は Notion のクエリで判定する）。
+        """
+        if not self.yuutai_database_id:
             return False
+        
+        with self._dedupe_lock:
+            loaded = self._dedupe_ready and self.dedupe_index.database_id == self.yuutai_database_id
+            if loaded and time.monotonic() - self._dedupe_refreshed_at < self.dedupe_refresh_interval:
+                return True
+            
+            try:
+                state = self.dedupe_index.sync_state if loaded else self.dedupe_index.load(self.yuutai_database_id)
+                if state is None or time.time() - state['synced_at'] >= self.dedupe_full_refresh_interval:
+                    entries, cursor = self._query_disclosure_keys()
+                    self.dedupe_index.replace(entries, cursor)
+                    logger.info(f"Loaded {len(self.dedupe_index)} disclosure keys into dedupe index")
+                else:
+                    edited_filter = None
+                    if state['edited_cursor']:
+                        edited_filter = {"timestamp": "last_edited_time",
+                                         "last_edited_time": {"on_or_after": state['edited_cursor']}}
+                    entries, cursor = self._query_disclosure_keys(edited_filter)
+                    self.dedupe_index.update(entries, cursor)
+                    logger.info(f"Refreshed dedupe index: {len(entries)} edited pages, "
+                                f"{len(self.dedupe_index)} disclosure keys")
+            except Exception as e:
+                logger.error(f"Failed to refresh dedupe index: {str(e)}")
+                self._dedupe_ready = False
+                self._handle_database_error(e, self.dedupe_index.database_id)
+                return False
+            
+            self._dedupe_ready = True
+            self._dedupe_refreshed_at = time.monotonic()
+            return True
     
+    def _query_disclosure_keys(self, query_filter: Dict = None):
+        """データベースの全ページ（またはフィルタに一致するページ）の重複判定キーをページングして取得"""
+        entries = []
+        cursor = None
+        start_cursor = None
+        while True:
+            body = {"page_size": 100}
+            if query_filter:
+                body["filter"] = query_filter
+            if start_cursor:
+                body["start_cursor"] = start_cursor
+            response = self.uploader.query_database(self.yuutai_database_id, **body)
+            
+            for page in response.get('results', []):
+                properties = page.get('properties', {})
+                key = make_dedupe_key(*(
+                    ''.join(t.get('plain_text', '') for t in properties.get(name, {}).get(prop_type, []))
+                    for name, prop_type in (("タイトル", "title"), ("銘柄コード", "rich_text"),
+                                            ("開示時刻", "rich_text"))
+                ))
+                edited = page.get('last_edited_time')
+                entries.append((page['id'], key, edited))
+                if edited and (cursor is None or edited > cursor):
+                    cursor = edited
+            
+            if not response.get('has_more') or not response.get('next_cursor'):
+                return entries, cursor
+            start_cursor = response['next_cursor']
     
     def _validate_stock_code(self, stock_code: str) -> bool:
         """銘柄コードの妥当性チェック"""
@@ -397,18 +641,32 @@ class YuutaiNotionManager:
         import re
         return bool(re.match(r'^\d{4}$', stock_code))
     
-    def process_daily_yuutai_disclosures(self, disclosures: List[Dict]) -> Dict[str, int]:
-        """1日分の株主優待開示を一括処理"""
-        stats = {
-            'total': len(disclosures),
-            'success': 0,
-            'failed': 0,
-            'skipped': 0,
-            'duplicates': 0
-        }
+    @classmethod
+    def _group_disclosures(cls, disclosures: List[Dict]) -> List[List[Dict]]:
+        """開示ID または重複判定キーが同じ開示を1つのグループにまとめる（グループ内は元の順序）"""
+        parent = list(range(len(disclosures)))
         
-        logger.info(f"Processing {stats['total']} yuutai disclosures...")
+        def find(index: int) -> int:
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
         
+        first_index = {}
+        for index, disclosure in enumerate(disclosures):
+            for token in (('id', disclosure.get('id')), ('key', cls._dedupe_key(disclosure))):
+                other = first_index.setdefault(token, index)
+                if other != index:
+                    parent[find(index)] = find(other)
+        
+        groups: Dict[int, List[Dict]] = {}
+        for index, disclosure in enumerate(disclosures):
+            groups.setdefault(find(index), []).append(disclosure)
+        return list(groups.values())
+    
+    def _process_disclosure_group(self, disclosures: List[Dict]) -> Dict[str, int]:
+        """グループ内の開示を順にアップロードし、件数を返す"""
+        counts = {'success': 0, 'failed': 0, 'skipped': 0, 'duplicates': 0, 'failed_ids': []}
         processed_ids = set()
         
         for disclosure in disclosures:
@@ -418,27 +676,58 @@ class YuutaiNotionManager:
                 
                 if disclosure_id in processed_ids:
                     logger.info(f"Skipping duplicate in batch: {disclosure_id}")
-                    stats['duplicates'] += 1
+                    counts['duplicates'] += 1
                     continue
                 
                 if stock_code and not self._validate_stock_code(stock_code):
                     logger.warning(f"Invalid stock code {stock_code}, skipping yuutai disclosure")
-                    stats['skipped'] += 1
+                    counts['skipped'] += 1
                     continue
                 
                 result = self.upload_yuutai_disclosure(disclosure)
                 
                 if result:
                     processed_ids.add(disclosure_id)
-                    stats['success'] += 1
+                    counts['success'] += 1
                     logger.debug(f"Processed yuutai disclosure: {disclosure_id}")
                 else:
-                    stats['failed'] += 1
+                    counts['failed'] += 1
+                    counts['failed_ids'].append(disclosure_id)
                     logger.warning(f"Failed yuutai disclosure: {disclosure_id}")
                     
             except Exception as e:
                 logger.error(f"Error processing yuutai disclosure {disclosure.get('id', 'unknown')}: {str(e)}")
-                stats['failed'] += 1
+                counts['failed'] += 1
+                counts['failed_ids'].append(disclosure.get('id'))
+        
+        return counts
+    
+    def process_daily_yuutai_disclosures(self, disclosures: List[Dict]) -> Dict[str, Any]:
+        """1日分の株主優待開示を一括処理（failed_ids はアップロードに失敗した開示のID）"""
+        stats = {
+            'total': len(disclosures),
+            'success': 0,
+            'failed': 0,
+            'skipped': 0,
+            'duplicates': 0,
+            'failed_ids': []
+        }
+        
+        logger.info(f"Processing {stats['total']} yuutai disclosures...")
+        
+        # 同じ開示ID・重複判定キーの開示は同じワーカーで元の順序どおりに処理し、
+        # 各開示のページ作成→ファイル添付もワーカー内で順に行う（結果は逐次処理と同じ）
+        groups = self._group_disclosures(disclosures)
+        workers = min(self.upload_workers, len(groups))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='yuutai-upload') as executor:
+                group_stats = list(executor.map(self._process_disclosure_group, groups))
+        else:
+            group_stats = [self._process_disclosure_group(group) for group in groups]
+        
+        for counts in group_stats:
+            for name, count in counts.items():
+                stats[name] += count
         
         logger.info(f"Yuutai processing complete: {stats['success']} new, {stats['failed']} failed, {stats['skipped']} invalid, {stats['duplicates']} batch duplicates")
         return stats
\ No newline at end of file
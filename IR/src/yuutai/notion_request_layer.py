@@ -0,0 +1,152 @@
+import re
+import time
+import random
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple, Type
+from urllib.parse import urlsplit
+
+import httpx
+
+from yuutai.rate_limiter import AIMDConcurrencyLimiter, TokenBucketRateLimiter, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+# 再試行する 5xx（冪等なリクエストのみ）
+RETRYABLE_SERVER_STATUSES = (500, 502, 503, 504)
+
+# 再送しても結果が変わらないリクエスト
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'DELETE')
+# 読み取り専用の POST（データベース・データソースのクエリ、検索）とページのプロパティ更新
+IDEMPOTENT_PATHS = {
+    'POST': re.compile(r'^/v1/(?:databases|data_sources)/[^/]+/query$|^/v1/search$'),
+    'PATCH': re.compile(r'^/v1/pages/[^/]+$'),
+}
+
+
+def is_idempotent(method: str, path: str) -> bool:
+    """Notion API のリクエストが冪等か（5xx・接続エラー後に再送してよいか）"""
+    method = method.upper()
+    if method in IDEMPOTENT_METHODS:
+        return True
+    pattern = IDEMPOTENT_PATHS.get(method)
+    return bool(pattern and pattern.match(path))
+
+
+class NotionRequestLayer:
+    """Notion API への全リクエスト（notion-client・ファイルアップロード）が通るリクエストレイヤー
+
+    各試行の前に共有のレート制限（rate_limiter）と同時実行数の枠（concurrency）を取得する。
+    429 は Retry-After の間レート制限全体を停止して再送し、同時実行数の上限を AIMD で下げる。
+    5xx と接続エラーは冪等なリクエストだけをジッター付き指数バックオフで再送する。
+    試行・再試行・429 の回数は get_stats で参照できる。
+    """
+
+    def __init__(self, rate_limiter: Optional[TokenBucketRateLimiter] = None, max_concurrency: int = 4,
+                 max_retries: int = 5, max_error_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0):
+        self.rate_limiter = rate_limiter
+        self.concurrency = AIMDConcurrencyLimiter(max_concurrency)
+        # 429 の再試行回数と、5xx・接続エラーの再試行回数
+        self.max_retries = max_retries
+        self.max_error_retries = max_error_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._stats_lock = threading.Lock()
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'server_errors': 0, 'connection_errors': 0}
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """試行・再試行・429 の回数と、現在の同時実行数の上限"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats['concurrency_limit'] = self.concurrency.limit
+        return stats
+
+    def _backoff(self, attempt: int) -> float:
+        """ジッター付き指数バックオフの待機秒数（上限の半分から上限まで）"""
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def execute(self, method: str, url: str, send: Callable, errors: Tuple[Type[BaseException], ...] = ()):
+        """
+        send() を再試行付きで実行し、最後の応答を返す
+
+        Args:
+            method: HTTPメソッド
+            url: リクエストのURLまたはパス（冪等性の判定に使用）
+            send: 1回分のリクエストを送信して応答（status_code・headers・close を持つ）を返す関数
+            errors: 接続エラーとして冪等なリクエストだけ再送する例外
+        """
+        path = urlsplit(url).path or url
+        idempotent = is_idempotent(method, path)
+
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            self.concurrency.acquire()
+            try:
+                self._count('requests')
+                response = send()
+            except errors as e:
+                if not idempotent or attempt >= self.max_error_retries:
+                    raise
+                self._count('connection_errors')
+                wait = self._backoff(attempt)
+                logger.warning(f"Notion request error ({method} {path}): {str(e)}, retrying in {wait:.1f}s")
+            else:
+                status = response.status_code
+                if status == 429 and attempt < self.max_retries:
+                    # サーバーは処理していないため、冪等でないリクエストも再送できる
+                    self._count('throttled')
+                    self.concurrency.on_throttled()
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if self.rate_limiter is not None:
+                        # レート制限全体を停止し、他のワーカーも Retry-After まで待機させる
+                        self.rate_limiter.penalize(retry_after)
+                        wait = 0.0
+                    else:
+                        wait = retry_after if retry_after is not None else self._backoff(attempt)
+                elif status in RETRYABLE_SERVER_STATUSES and idempotent and attempt < self.max_error_retries:
+                    self._count('server_errors')
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    wait = retry_after if retry_after is not None else self._backoff(attempt)
+                    logger.warning(f"Notion server error {status} ({method} {path}), retrying in {wait:.1f}s")
+                else:
+                    if status < 400:
+                        self.concurrency.on_success()
+                        if self.rate_limiter is not None:
+                            self.rate_limiter.reward()
+                    return response
+                response.close()
+            finally:
+                self.concurrency.release()
+
+            self._count('retries')
+            attempt += 1
+            if wait > 0:
+                time.sleep(wait)
+
+    def wrap_httpx_transport(self, transport):
+        """notion-client 用の httpx トランスポートをこのレイヤー経由にする"""
+        return _RequestLayerHTTPXTransport(transport, self)
+
+
+class _RequestLayerHTTPXTransport(httpx.BaseTransport):
+    """各試行をリクエストレイヤー経由で送る httpx トランスポート"""
+
+    def __init__(self, transport, layer: NotionRequestLayer):
+        self._transport = transport
+        self._layer = layer
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._layer.execute(request.method, request.url.path,
+                                   lambda: self._transport.handle_request(request), (httpx.TransportError,))
+
+    def close(self):
+        self._transport.close()
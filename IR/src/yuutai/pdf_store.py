@@ -0,0 +1,288 @@
+import os
+import re
+import shutil
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ダウンロードファイル名（{銘柄コード}_{YYYYMMDD}_{開示ID}.pdf）
+DOWNLOAD_FILENAME_PATTERN = re.compile(r'^(?P<code>[0-9A-Z]{4,5})_(?P<date>\d{8})_(?P<doc_id>[^_]+)\.pdf$')
+
+
+def file_sha256(path: str, chunk_size: int = 64 * 1024) -> str:
+    """ファイルのSHA-256を計算"""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class PDFStore:
+    """開示PDFのコンテンツアドレス型ストア
+
+    PDF本体は {root_dir}/.store/objects/{sha256先頭2文字}/{sha256}.pdf に1つだけ保存し、
+    ダウンロードディレクトリのファイル名はそのハードリンクとして作成する。
+    開示ID→SHA-256 と ファイル名→SHA-256 の対応は manifest.sqlite3 に記録するため、
+    銘柄コードの表記違い（4桁/5桁）や再実行でも同じ文書を再取得・重複保存しない。
+    ハードリンクを作成できないファイルシステムではファイルをそのまま残してマニフェストのみで管理し、
+    再取得の代わりに既存ファイルからコピーする。
+    アップロード後にダウンロードファイルを release しても本体と開示IDの対応は残し（再実行時はリンクするだけ）、
+    ダウンロードファイルから参照されなくなって保持期間が過ぎた本体を collect_garbage で削除する。
+    また、404/410 が返ったPDFのURLを記録し、再確認間隔が過ぎるまで再取得を省略できるようにする。
+    """
+
+    def __init__(self, root_dir: str = "./downloads/yuutai"):
+        self.root_dir = root_dir
+        self.store_dir = os.path.join(root_dir, '.store')
+        self.objects_dir = os.path.join(self.store_dir, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.store_dir, 'manifest.sqlite3'), timeout=30,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS documents (
+                    doc_id TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS files (
+                    filename TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL
+                )"""
+            )
+            # ダウンロードファイルから参照されなくなった本体と、その時刻（保持期間の起点）
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS released (
+                    sha256 TEXT PRIMARY KEY,
+                    released_at REAL NOT NULL
+                )"""
+            )
+            # 404/410 が返ったファイルのURL（ネガティブキャッシュ）
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS missing_files (
+                    url TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    checked_at REAL NOT NULL
+                )"""
+            )
+
+    def object_path(self, sha256: str) -> str:
+        """SHA-256に対応する本体の保存先"""
+        return os.path.join(self.objects_dir, sha256[:2], f"{sha256}.pdf")
+
+    def lookup(self, doc_id: str) -> Optional[str]:
+        """開示IDの文書が保存済みならSHA-256を返す"""
+        with self._lock:
+            row = self._conn.execute("SELECT sha256 FROM documents WHERE doc_id = ?", (str(doc_id),)).fetchone()
+        if row and self._source_path(row[0]):
+            return row[0]
+        return None
+
+    def _source_path(self, sha256: str) -> Optional[str]:
+        """SHA-256の内容を持つ実在ファイル（本体、なければマニフェスト上のファイル）"""
+        object_path = self.object_path(sha256)
+        if os.path.exists(object_path):
+            return object_path
+
+        with self._lock:
+            filenames = [row[0] for row in self._conn.execute("SELECT filename FROM files WHERE sha256 = ?", (sha256,))]
+        for filename in filenames:
+            file_path = os.path.join(self.root_dir, filename)
+            if os.path.exists(file_path):
+                return file_path
+        return None
+
+    def add(self, file_path: str, sha256: str, doc_id: str = None) -> str:
+        """
+        ダウンロード済みファイルをストアに登録
+
+        同じ内容の本体が既にあればファイルをそのハードリンクに置き換え、
+        なければファイルを本体としてリンクする。
+        Returns:
+            登録後のファイルパス（file_path）
+        """
+        object_path = self.object_path(sha256)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+
+        try:
+            if not os.path.exists(object_path):
+                os.link(file_path, object_path)
+            elif not os.path.samefile(file_path, object_path):
+                self._replace_with_link(object_path, file_path)
+        except OSError as e:
+            # ハードリンク非対応の場合はファイルを残し、マニフェストのみ更新
+            logger.debug(f"Hardlink unavailable for {file_path}: {str(e)}")
+
+        self._record(os.path.basename(file_path), sha256, os.path.getsize(file_path), doc_id)
+        return file_path
+
+    def materialize(self, sha256: str, file_path: str, doc_id: str = None) -> Optional[str]:
+        """保存済みの本体を file_path として配置（ハードリンク、非対応ならコピー）"""
+        source_path = self._source_path(sha256)
+        if not source_path:
+            return None
+
+        try:
+            self._replace_with_link(source_path, file_path)
+        except OSError:
+            try:
+                shutil.copyfile(source_path, file_path)
+            except FileNotFoundError:
+                # 並行して release された本体は再取得させる
+                return None
+
+        self._record(os.path.basename(file_path), sha256, os.path.getsize(file_path), doc_id)
+        return file_path
+
+    def _replace_with_link(self, source_path: str, file_path: str):
+        """file_path を source_path へのハードリンクにアトミックに置き換え"""
+        temp_path = f"{file_path}.link"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        os.link(source_path, temp_path)
+        os.replace(temp_path, file_path)
+
+    def _record(self, filename: str, sha256: str, size: int, doc_id: str = None):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO files (filename, sha256) VALUES (?, ?)", (filename, sha256))
+            self._conn.execute("DELETE FROM released WHERE sha256 = ?", (sha256,))
+            if doc_id is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO documents (doc_id, sha256, size) VALUES (?, ?, ?)",
+                    (str(doc_id), sha256, size)
+                )
+
+    def release(self, file_path: str):
+        """
+        アップロード済みのダウンロードファイルを削除
+
+        本体は開示IDの対応とともに保持期間中は残し、再実行時は再取得せずにリンクする。
+        他に参照のない本体は解放時刻を記録し、collect_garbage の保持期間の起点とする。
+        """
+        filename = os.path.basename(file_path)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT sha256 FROM files WHERE filename = ?", (filename,)).fetchone()
+            self._conn.execute("DELETE FROM files WHERE filename = ?", (filename,))
+        os.remove(file_path)
+
+        if row and self._is_unreferenced(row[0]):
+            with self._lock, self._conn:
+                self._conn.execute("INSERT OR REPLACE INTO released (sha256, released_at) VALUES (?, ?)",
+                                   (row[0], time.time()))
+
+    def _is_unreferenced(self, sha256: str) -> bool:
+        """本体へのハードリンクがストア自身のみか"""
+        try:
+            return os.stat(self.object_path(sha256)).st_nlink <= 1
+        except FileNotFoundError:
+            return False
+
+    def _remove_unreferenced(self, sha256: str, retention: float) -> int:
+        """参照されなくなってから retention 秒以上経過した本体と開示IDの対応を削除"""
+        object_path = self.object_path(sha256)
+        with self._lock, self._conn:
+            try:
+                stat = os.stat(object_path)
+            except FileNotFoundError:
+                return 0
+            if stat.st_nlink > 1:
+                return 0
+            # 解放時刻の記録がない本体（記録導入前に参照が消えたもの）はリンク数が変わった時刻を使う
+            row = self._conn.execute("SELECT released_at FROM released WHERE sha256 = ?", (sha256,)).fetchone()
+            if time.time() - (row[0] if row else stat.st_ctime) < retention:
+                return 0
+            os.remove(object_path)
+            self._conn.execute("DELETE FROM documents WHERE sha256 = ?", (sha256,))
+            self._conn.execute("DELETE FROM files WHERE sha256 = ?", (sha256,))
+            self._conn.execute("DELETE FROM released WHERE sha256 = ?", (sha256,))
+        return stat.st_size
+
+    def collect_garbage(self, retention: float = 0) -> Dict[str, int]:
+        """
+        ダウンロードファイルから参照されなくなって retention 秒以上経過した本体を削除
+
+        Returns:
+            削除件数・解放バイト数
+        """
+        stats = {'objects': 0, 'bytes_freed': 0}
+
+        for prefix in sorted(os.listdir(self.objects_dir)):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for name in sorted(os.listdir(prefix_dir)):
+                if not name.endswith('.pdf'):
+                    continue
+                freed = self._remove_unreferenced(name[:-len('.pdf')], retention)
+                if freed:
+                    stats['objects'] += 1
+                    stats['bytes_freed'] += freed
+
+        logger.info(f"Removed {stats['objects']} unreferenced objects from PDF store: "
+                    f"{stats['bytes_freed'] / 1024 / 1024:.1f} MB freed")
+        return stats
+
+    def is_known_missing(self, url: str, recheck_interval: float) -> bool:
+        """URLが存在しないと記録済みで、再確認間隔を過ぎていないか"""
+        with self._lock:
+            row = self._conn.execute("SELECT checked_at FROM missing_files WHERE url = ?", (url,)).fetchone()
+        return bool(row) and time.time() - row[0] < recheck_interval
+
+    def mark_missing(self, url: str, status: int, checked_at: float = None):
+        """404/410 が返ったURLを記録"""
+        if checked_at is None:
+            checked_at = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO missing_files (url, status, checked_at) VALUES (?, ?, ?)",
+                (url, status, checked_at)
+            )
+
+    def clear_missing(self, url: str):
+        """取得できたURLをネガティブキャッシュから削除"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM missing_files WHERE url = ?", (url,))
+
+    def import_directory(self) -> Dict[str, int]:
+        """
+        既存のダウンロードファイルをストアに取り込み、同一内容のファイルをハードリンクにまとめる
+
+        Returns:
+            取り込み件数・重複件数・削減バイト数
+        """
+        stats = {'files': 0, 'duplicates': 0, 'bytes_saved': 0}
+
+        for filename in sorted(os.listdir(self.root_dir)):
+            match = DOWNLOAD_FILENAME_PATTERN.match(filename)
+            file_path = os.path.join(self.root_dir, filename)
+            if not match or not os.path.isfile(file_path):
+                continue
+
+            sha256 = file_sha256(file_path)
+            object_path = self.object_path(sha256)
+            if os.path.exists(object_path) and not os.path.samefile(file_path, object_path):
+                stats['duplicates'] += 1
+                stats['bytes_saved'] += os.path.getsize(file_path)
+
+            self.add(file_path, sha256, match.group('doc_id'))
+            stats['files'] += 1
+
+        logger.info(f"Imported {stats['files']} files into PDF store: {stats['duplicates']} duplicates, "
+                    f"{stats['bytes_saved'] / 1024 / 1024:.1f} MB saved")
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
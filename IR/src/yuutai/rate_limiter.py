@@ -0,0 +1,254 @@
+import os
+import time
+import random
+import sqlite3
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After ヘッダー（秒数またはHTTP日付）を待機秒数に変換"""
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value)
+        if retry_at.tzinfo is None:
+            retry_at = retry_at.replace(tzinfo=timezone.utc)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucketRateLimiter:
+    """トークンバケット方式のレート制限
+
+    rate（トークン/秒）で補充され、最大 capacity 個まで貯まるトークンを1リクエストにつき1個消費する。
+    スレッド間はロックで、asyncioからは acquire_async で、プロセス間は state_path に指定した
+    SQLiteファイルの状態テーブルを通じて共有される。
+    HTTP 429/503 を受けた場合は penalize で Retry-After まで全体を停止し、補充レートを半減させる。
+    成功が続くと reward で元のレートまで徐々に戻す。
+    """
+
+    def __init__(self, rate: float = 1.0, capacity: float = 1.0, name: str = 'default',
+                 state_path: Optional[str] = None, min_rate_factor: float = 0.125,
+                 recovery_step: float = 0.05, default_backoff: float = 5.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+        self.state_path = state_path
+        self.min_rate_factor = min_rate_factor
+        self.recovery_step = recovery_step
+        self.default_backoff = default_backoff
+
+        self._lock = threading.Lock()
+        self._conn = None
+
+        # プロセス内の状態（state_path 未指定時に使用）
+        self._tokens = capacity
+        self._updated_at = time.time()
+        self._blocked_until = 0.0
+        self._rate_factor = 1.0
+        self._consecutive_penalties = 0
+        # 最後に読み込んだ補充レートの倍率（元のレートに戻っていれば reward で状態を書かない）
+        self._last_rate_factor = 1.0
+
+        if state_path:
+            os.makedirs(os.path.dirname(os.path.abspath(state_path)), exist_ok=True)
+            self._conn = sqlite3.connect(state_path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS rate_limits (
+                    name TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    blocked_until REAL NOT NULL,
+                    rate_factor REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO rate_limits (name, tokens, updated_at, blocked_until, rate_factor) "
+                "VALUES (?, ?, ?, 0, 1.0)",
+                (name, capacity, time.time())
+            )
+
+    @property
+    def current_rate(self) -> float:
+        """現在の補充レート（バックオフ反映後）"""
+        return self.rate * self._with_state(lambda state: (None, state[3]))
+
+    def _with_state(self, update):
+        """状態を読み込んで update(state) を適用（プロセス間ではトランザクションで直列化）
+
+        state は (tokens, updated_at, blocked_until, rate_factor)。
+        update は (新しいstate または None, 戻り値) を返す。None の場合は書き戻さない。
+        """
+        with self._lock:
+            if self._conn is None:
+                state = (self._tokens, self._updated_at, self._blocked_until, self._rate_factor)
+                new_state, value = update(state)
+                if new_state is not None:
+                    self._tokens, self._updated_at, self._blocked_until, self._rate_factor = new_state
+                self._last_rate_factor = self._rate_factor
+                return value
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._conn.execute(
+                    "SELECT tokens, updated_at, blocked_until, rate_factor FROM rate_limits WHERE name = ?",
+                    (self.name,)
+                ).fetchone()
+                new_state, value = update(tuple(state))
+                if new_state is not None:
+                    self._conn.execute(
+                        "UPDATE rate_limits SET tokens = ?, updated_at = ?, blocked_until = ?, rate_factor = ? "
+                        "WHERE name = ?",
+                        new_state + (self.name,)
+                    )
+                self._conn.execute("COMMIT")
+                self._last_rate_factor = (new_state or state)[3]
+                return value
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _try_acquire(self) -> float:
+        """トークンを1個取得できれば0、できなければ次に取得可能になるまでの秒数を返す"""
+        def update(state: Tuple[float, float, float, float]):
+            tokens, updated_at, blocked_until, rate_factor = state
+            now = time.time()
+            refill_rate = self.rate * rate_factor
+            tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * refill_rate)
+
+            if now < blocked_until:
+                return (tokens, now, blocked_until, rate_factor), blocked_until - now
+            if tokens >= 1.0:
+                return (tokens - 1.0, now, blocked_until, rate_factor), 0.0
+            return (tokens, now, blocked_until, rate_factor), (1.0 - tokens) / refill_rate
+
+        return self._with_state(update)
+
+    def acquire(self):
+        """トークンを1個取得できるまで待機（スレッドセーフ）"""
+        while True:
+            wait = self._try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """トークンを1個取得できるまで待機（asyncio用、イベントループをブロックしない）"""
+        while True:
+            if self._conn is not None:
+                # SQLite のロック待ちがイベントループを止めないようワーカースレッドで取得する
+                wait = await asyncio.to_thread(self._try_acquire)
+            else:
+                wait = self._try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def penalize(self, retry_after: Optional[float] = None) -> float:
+        """429/503 応答時の減速（Retry-After まで停止し補充レートを半減）。待機秒数を返す"""
+        with self._lock:
+            self._consecutive_penalties += 1
+            attempt = self._consecutive_penalties
+
+        if retry_after is None:
+            # Retry-After がない場合は連続回数に応じた指数バックオフ（ジッター付き）
+            retry_after = min(60.0, self.default_backoff * (2 ** (attempt - 1)))
+            retry_after *= random.uniform(0.8, 1.2)
+
+        def update(state):
+            tokens, updated_at, blocked_until, rate_factor = state
+            now = time.time()
+            rate_factor = max(self.min_rate_factor, rate_factor / 2)
+            return (0.0, now, max(blocked_until, now + retry_after), rate_factor), rate_factor
+
+        rate_factor = self._with_state(update)
+        logger.warning(f"Rate limited ({self.name}): pausing {retry_after:.1f}s, rate now {self.rate * rate_factor:.3f} req/s")
+        return retry_after
+
+    def reward(self):
+        """
+        成功応答時に補充レートを徐々に元へ戻す
+
+        直前の acquire で読み込んだ倍率が元のレートのままなら、状態ファイルのトランザクションを省く
+        （他プロセスの減速は次の acquire で読み込まれ、以降の reward で戻される）。
+        """
+        with self._lock:
+            self._consecutive_penalties = 0
+            if self._last_rate_factor >= 1.0:
+                return
+
+        def update(state):
+            tokens, updated_at, blocked_until, rate_factor = state
+            if rate_factor >= 1.0:
+                return None, None
+            return (tokens, updated_at, blocked_until, min(1.0, rate_factor + self.recovery_step)), None
+
+        self._with_state(update)
+
+    def close(self):
+        if self._conn is not None:
+            with self._lock:
+                self._conn.close()
+                self._conn = None
+
+
+class AIMDConcurrencyLimiter:
+    """同時実行数を AIMD（加算増加・乗算減少）で調整するセマフォ
+
+    429 を受けるたびに上限を decrease_factor 倍（最小 min_limit）に下げ、
+    成功するたびに 1/上限 ずつ（上限と同じ回数の成功で +1）max_limit まで戻す。
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease_factor: float = 0.5):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.decrease_factor = decrease_factor
+
+        self._limit = float(self.max_limit)
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        """現在の同時実行数の上限"""
+        return max(self.min_limit, int(self._limit))
+
+    def acquire(self):
+        """実行枠を1つ取得できるまで待機"""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_throttled(self):
+        """429 応答時に上限を乗算的に下げる"""
+        with self._condition:
+            self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            logger.info(f"Concurrency limit lowered to {self.limit}")
+
+    def on_success(self):
+        """成功応答時に上限を加算的に戻す"""
+        with self._condition:
+            if self._limit < self.max_limit:
+                self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+                self._condition.notify_all()
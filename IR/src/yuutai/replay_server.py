@@ -0,0 +1,632 @@
+#!/usr/bin/env python3
+"""
+オフラインのエンドツーエンド計測用リプレイサーバー
+
+YANOSHIN の一覧API・TDnet のPDF・Notion API（データベース・ページ・ファイルアップロード）の代わりに
+ローカルで応答するHTTPサーバー。サービスごとに別のポートで待ち受け、遅延と 429 応答を注入できる。
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# 親ディレクトリを追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from yuutai.classifier import YuutaiTitleMatcher
+
+logger = logging.getLogger(__name__)
+
+SERVICES = ('yanoshin', 'tdnet', 'notion')
+# 一覧の document_url に記録されている TDnet のURL（配信時にリプレイサーバーのURLに置き換える）
+TDNET_ORIGIN = 'https://www.release.tdnet.info'
+LISTING_PATH = '/webapi/tdnet/list'
+SEED_FILE_PATTERN = re.compile(r'^(\d{4,5})_(\d{8})_(\w+)\.pdf$')
+
+
+class ReplayFixtures:
+    """リプレイする一覧（日付 → YANOSHIN の items）とPDF（ファイル名 → パス）"""
+
+    def __init__(self, listings: Dict[str, List[Dict]] = None, documents: Dict[str, str] = None,
+                 fallback_documents: List[str] = None):
+        self.listings = listings or {}
+        self.documents = documents or {}
+        # 記録にないPDFを要求された場合に代わりに返すファイル（空なら 404）
+        self.fallback_documents = fallback_documents or []
+
+    @classmethod
+    def from_pdf_dir(cls, pdf_dir: str, titles: Iterable[str], filler_per_day: int = 100,
+                     seed: int = 20250523) -> 'ReplayFixtures':
+        """
+        ダウンロード済みPDF（{銘柄コード}_{YYYYMMDD}_{開示ID}.pdf）から一覧を作成
+
+        PDFごとに株主優待関連のタイトルを1件、営業日ごとにそれ以外のタイトルを filler_per_day 件割り当てる。
+        銘柄コードの表記違いで同じ開示IDが複数ある場合は1件にまとめる。
+        """
+        titles = list(titles)
+        related_flags, _ = YuutaiTitleMatcher().classify_batch(titles)
+        related_titles = [title for title, related in zip(titles, related_flags) if related]
+        other_titles = [title for title, related in zip(titles, related_flags) if not related]
+        rng = random.Random(seed)
+
+        seeds = {}
+        for name in sorted(os.listdir(pdf_dir)):
+            match = SEED_FILE_PATTERN.match(name)
+            if match:
+                code, day, doc_id = match.groups()
+                seeds.setdefault(doc_id, (code if len(code) == 5 else f"{code}0", day, os.path.join(pdf_dir, name)))
+        if not seeds:
+            return cls()
+
+        listings, documents = {}, {}
+        for index, (doc_id, (code, day, path)) in enumerate(sorted(seeds.items())):
+            date = f"{day[:4]}-{day[4:6]}-{day[6:]}"
+            documents[f"{doc_id}.pdf"] = path
+            listings.setdefault(date, []).append(cls._make_item(
+                doc_id, date, f"15:{index % 60:02d}:00", code, rng.choice(related_titles)))
+
+        first = datetime.strptime(min(listings), '%Y-%m-%d')
+        last = datetime.strptime(max(listings), '%Y-%m-%d')
+        day = first
+        while day <= last:
+            if day.weekday() < 5:
+                date = day.strftime('%Y-%m-%d')
+                for index in range(filler_per_day if other_titles else 0):
+                    company = rng.randrange(1300, 9999)
+                    listings.setdefault(date, []).append(cls._make_item(
+                        f"9{day.strftime('%y%m%d')}{index:05d}", date,
+                        f"{9 + index % 7:02d}:{index % 60:02d}:00", f"{company}0", rng.choice(other_titles)))
+            day += timedelta(days=1)
+        return cls(listings, documents)
+
+    @classmethod
+    def from_listing_cache(cls, cache_dir: str, pdf_dir: str = None) -> 'ReplayFixtures':
+        """
+        一覧キャッシュに記録された YANOSHIN の一覧から作成
+
+        pdf_dir のPDFは開示IDが一致する一覧アイテムの document_url で返し、
+        記録にないPDFには pdf_dir のPDFを代わりに返す。
+        """
+        from yuutai.listing_cache import ListingCache
+
+        cache = ListingCache(cache_dir)
+        listings = {}
+        for day in cache.cached_days():
+            items = [item for page in cache.iter_pages(day) for item in page]
+            if items:
+                listings[day] = items
+
+        seeds = {}
+        if pdf_dir and os.path.isdir(pdf_dir):
+            for name in sorted(os.listdir(pdf_dir)):
+                match = SEED_FILE_PATTERN.match(name)
+                if match:
+                    seeds.setdefault(match.group(3), os.path.join(pdf_dir, name))
+
+        documents = {}
+        for items in listings.values():
+            for item in items:
+                tdnet = item.get('Tdnet', {})
+                if str(tdnet.get('id')) in seeds and tdnet.get('document_url'):
+                    documents[tdnet['document_url'].rsplit('/', 1)[-1]] = seeds[str(tdnet['id'])]
+        return cls(listings, documents, sorted(seeds.values()))
+
+    @staticmethod
+    def _make_item(doc_id: str, date: str, time_str: str, company_code: str, title: str) -> Dict:
+        return {'Tdnet': {
+            'id': doc_id,
+            'pubdate': f"{date} {time_str}",
+            'company_code': company_code,
+            'company_name': f"サンプル{company_code[:4]}株式会社",
+            'title': title,
+            'document_url': f"{TDNET_ORIGIN}/inbs/{doc_id}.pdf",
+            'markets_string': '東',
+            'url_xbrl': None,
+        }}
+
+    def select(self, condition: str) -> Optional[List[Dict]]:
+        """YANOSHIN の条件（YYYYMMDD, YYYYMMDD-YYYYMMDD, recent, 銘柄コード）に一致するアイテム（新しい順）"""
+        if condition == 'recent':
+            items = [item for day_items in self.listings.values() for item in day_items]
+        elif re.fullmatch(r'\d{8}(-\d{8})?', condition):
+            start, _, end = condition.partition('-')
+            start = f"{start[:4]}-{start[4:6]}-{start[6:]}"
+            end = f"{end[:4]}-{end[4:6]}-{end[6:]}" if end else start
+            items = [item for day, day_items in self.listings.items() if start <= day <= end for item in day_items]
+        elif re.fullmatch(r'\d{4,5}', condition):
+            items = [item for day_items in self.listings.values() for item in day_items
+                     if item.get('Tdnet', {}).get('company_code', '')[:4] == condition[:4]]
+        else:
+            return None
+        return sorted(items, key=lambda item: (item['Tdnet'].get('pubdate') or '', str(item['Tdnet'].get('id'))),
+                      reverse=True)
+
+    def document_path(self, name: str) -> Optional[str]:
+        path = self.documents.get(name)
+        if path is None and self.fallback_documents:
+            path = self.fallback_documents[sum(name.encode()) % len(self.fallback_documents)]
+        return path
+
+
+class NotionState:
+    """Notion のデータベース・ページ・ファイルアップロードを保持するインメモリの状態"""
+
+    PROPERTY_TYPES = ('title', 'rich_text', 'select', 'number', 'date', 'files')
+
+    def __init__(self, base_url: str = ''):
+        self.base_url = base_url
+        self.lock = threading.Lock()
+        self.databases: Dict[str, Dict] = {}
+        self.pages: Dict[str, Dict] = {}
+        self.children: Dict[str, List[Dict]] = {}
+        self.file_uploads: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+    @staticmethod
+    def _rich_text(values: List[Dict]) -> List[Dict]:
+        result = []
+        for value in values:
+            content = value.get('text', {}).get('content', value.get('plain_text', ''))
+            result.append({'type': 'text', 'text': {'content': content}, 'plain_text': content})
+        return result
+
+    def _property_value(self, value: Dict) -> Tuple[Optional[str], Dict]:
+        for prop_type in self.PROPERTY_TYPES:
+            if prop_type in value:
+                content = value[prop_type]
+                if prop_type in ('title', 'rich_text'):
+                    content = self._rich_text(content)
+                elif prop_type == 'files':
+                    content = [self._file_value(entry) for entry in content]
+                return prop_type, {'type': prop_type, prop_type: content}
+        return None, value
+
+    def _file_value(self, entry: Dict) -> Dict:
+        if entry.get('type') != 'file_upload':
+            return entry
+        upload = self.file_uploads.get(entry['file_upload']['id'])
+        if upload is None or upload['status'] != 'uploaded':
+            raise ValueError(f"File upload is not uploaded: {entry['file_upload']['id']}")
+        return {'name': entry.get('name', upload['filename']), 'type': 'file',
+                'file': {'url': f"{self.base_url}/files/{upload['id']}/{upload['filename']}"}}
+
+    def create_database(self, body: Dict) -> Dict:
+        database_id = str(uuid.uuid4())
+        parent_id = body.get('parent', {}).get('page_id')
+        database = {
+            'object': 'database', 'id': database_id, 'parent': body.get('parent', {}),
+            'title': self._rich_text(body.get('title', [])),
+            'properties': {name: {'id': name, 'name': name, 'type': next(iter(schema), None), **schema}
+                           for name, schema in body.get('properties', {}).items()},
+            'created_time': self._now(), 'last_edited_time': self._now(),
+        }
+        self.databases[database_id] = database
+        self.children.setdefault((parent_id or '').replace('-', ''), []).append({
+            'object': 'block', 'id': database_id, 'type': 'child_database',
+            'child_database': {'title': ''.join(t['plain_text'] for t in database['title'])}
+        })
+        return database
+
+    def active_database(self, database_id: str) -> Dict:
+        """ゴミ箱に入っていないデータベース（見つからない場合は KeyError）"""
+        database = self.databases.get(database_id)
+        if database is None or database.get('archived'):
+            raise KeyError(database_id)
+        return database
+
+    def update_database(self, database_id: str, body: Dict) -> Dict:
+        """データベースのタイトル・アーカイブ状態を更新（アーカイブしたデータベースは親ページの子から外す）"""
+        database = self.databases[database_id]
+        if 'title' in body:
+            database['title'] = self._rich_text(body['title'])
+        if body.get('archived') or body.get('in_trash'):
+            database['archived'] = database['in_trash'] = True
+            for blocks in self.children.values():
+                blocks[:] = [block for block in blocks if block['id'] != database_id]
+        database['last_edited_time'] = self._now()
+        return database
+
+    def save_page(self, body: Dict, page_id: str = None) -> Dict:
+        now = self._now()
+        if page_id is None:
+            page_id = str(uuid.uuid4())
+            page = {'object': 'page', 'id': page_id, 'parent': body.get('parent', {}),
+                    'created_time': now, 'properties': {}, 'archived': False}
+        else:
+            page = self.pages[page_id]
+        for name, value in body.get('properties', {}).items():
+            _, page['properties'][name] = self._property_value(value)
+        page['last_edited_time'] = now
+        self.pages[page_id] = page
+        return page
+
+    def _matches(self, page: Dict, condition: Dict) -> bool:
+        if 'and' in condition:
+            return all(self._matches(page, sub) for sub in condition['and'])
+        if 'or' in condition:
+            return any(self._matches(page, sub) for sub in condition['or'])
+        if 'timestamp' in condition:
+            timestamp = page.get(condition['timestamp'], '')
+            check = condition.get(condition['timestamp'], {})
+            return (('after' not in check or timestamp > check['after'])
+                    and ('on_or_after' not in check or timestamp >= check['on_or_after']))
+        prop = page['properties'].get(condition.get('property'), {})
+        for prop_type in ('title', 'rich_text'):
+            if prop_type in condition:
+                text = ''.join(t.get('plain_text', '') for t in prop.get(prop_type, []))
+                check = condition[prop_type]
+                if 'equals' in check:
+                    return text == check['equals']
+                if 'contains' in check:
+                    return check['contains'] in text
+        return True
+
+    def query(self, database_id: str, body: Dict) -> Dict:
+        pages = [page for page in self.pages.values()
+                 if page['parent'].get('database_id') == database_id and not page['archived']
+                 and (not body.get('filter') or self._matches(page, body['filter']))]
+        return self.paginate(pages, body.get('start_cursor'), body.get('page_size'), 'page')
+
+    @staticmethod
+    def paginate(results: List[Dict], start_cursor: str = None, page_size=None, result_type: str = 'block') -> Dict:
+        page_size = min(int(page_size or 100), 100)
+        start = int(start_cursor) if start_cursor else 0
+        page = results[start:start + page_size]
+        has_more = start + page_size < len(results)
+        return {'object': 'list', 'results': page, 'has_more': has_more,
+                'next_cursor': str(start + page_size) if has_more else None, 'type': result_type}
+
+    def create_file_upload(self, body: Dict) -> Dict:
+        upload_id = str(uuid.uuid4())
+        upload = {
+            'object': 'file_upload', 'id': upload_id, 'status': 'pending',
+            'filename': body.get('filename') or body.get('name') or 'file',
+            'content_type': body.get('content_type'), 'content_length': 0,
+            'mode': body.get('mode', 'single_part'), 'number_of_parts': body.get('number_of_parts', 1),
+            'parts': {}, 'created_time': self._now(),
+            'upload_url': f"{self.base_url}/v1/file_uploads/{upload_id}/send",
+        }
+        self.file_uploads[upload_id] = upload
+        return upload
+
+    def send_file_upload(self, upload_id: str, fields: Dict[str, bytes]) -> Dict:
+        upload = self.file_uploads[upload_id]
+        if upload['status'] != 'pending' or 'file' not in fields:
+            raise ValueError(f"Invalid file upload send: {upload_id}")
+        part_number = int(fields.get('part_number', b'1') or 1)
+        upload['parts'][part_number] = len(fields['file'])
+        upload['content_length'] = sum(upload['parts'].values())
+        if upload['mode'] != 'multi_part':
+            upload['status'] = 'uploaded'
+        return upload
+
+    def complete_file_upload(self, upload_id: str) -> Dict:
+        upload = self.file_uploads[upload_id]
+        if upload['mode'] == 'multi_part':
+            if sorted(upload['parts']) != list(range(1, upload['number_of_parts'] + 1)):
+                raise ValueError(f"Missing parts for file upload: {upload_id}")
+            upload['status'] = 'uploaded'
+        upload['url'] = f"{self.base_url}/files/{upload_id}/{upload['filename']}"
+        return upload
+
+    @staticmethod
+    def public(record: Dict) -> Dict:
+        return {key: value for key, value in record.items() if key != 'parts'}
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """サービス（server.service）ごとのリクエストを振り分けるハンドラ"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_HEAD(self):
+        self._dispatch('HEAD')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0) or 0))
+
+    def _dispatch(self, method: str):
+        replay: 'ReplayServer' = self.server.replay
+        service = self.server.service
+        url = urlsplit(self.path)
+        body = self._read_body() if method in ('POST', 'PATCH') else b''
+
+        if url.path == '/_replay/stats':
+            return self._send_json(200, replay.stats())
+
+        endpoint = replay.endpoint_name(service, method, url.path)
+        delay, throttled = replay.admit(service, endpoint)
+        if delay:
+            time.sleep(delay)
+        if throttled:
+            return self._send_json(429, {'object': 'error', 'status': 429, 'code': 'rate_limited',
+                                         'message': 'Rate limited by replay server'},
+                                   {'Retry-After': f"{replay.retry_after:g}"})
+        try:
+            if service == 'yanoshin':
+                return self._serve_listing(url)
+            if service == 'tdnet':
+                return self._serve_document(method, url.path)
+            return self._serve_notion(method, url.path, parse_qs(url.query), body)
+        except KeyError as e:
+            return self._send_json(404, {'object': 'error', 'status': 404, 'code': 'object_not_found',
+                                         'message': f"Could not find object with ID: {e.args[0]}"})
+        except ValueError as e:
+            return self._send_json(400, {'object': 'error', 'status': 400, 'code': 'validation_error',
+                                         'message': str(e)})
+
+    def _serve_listing(self, url):
+        replay: 'ReplayServer' = self.server.replay
+        match = re.fullmatch(re.escape(LISTING_PATH) + r'/([\w-]+)\.json', url.path)
+        items = replay.fixtures.select(match.group(1)) if match else None
+        if items is None:
+            return self._send_json(404, {'error': 'not found'})
+        query = parse_qs(url.query)
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', ['100'])[0])
+        page = [replay.rewrite_item(item) for item in items[offset:offset + limit]]
+        self._send_json(200, {'total_count': len(items), 'condition_desc': match.group(1), 'items': page})
+
+    def _serve_document(self, method: str, path: str):
+        document = self.server.replay.fixtures.document_path(path.rsplit('/', 1)[-1]) if path.startswith('/inbs/') \
+            else None
+        if document is None or not os.path.exists(document):
+            return self._send_json(404, {'error': 'not found'})
+        size = os.path.getsize(document)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/pdf')
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        if method == 'HEAD':
+            return
+        try:
+            with open(document, 'rb') as f:
+                while True:
+                    chunk = f.read(64 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _serve_notion(self, method: str, path: str, query: Dict, body: bytes):
+        state: NotionState = self.server.replay.notion
+        parts = path.strip('/').split('/')[1:]  # 先頭の v1 を除く
+        payload = json.loads(body) if body and not self.headers.get('Content-Type', '').startswith('multipart/') \
+            else {}
+
+        with state.lock:
+            if parts == ['databases'] and method == 'POST':
+                return self._send_json(200, state.create_database(payload))
+            if len(parts) == 2 and parts[0] == 'databases' and method == 'GET':
+                return self._send_json(200, state.databases[parts[1]])
+            if len(parts) == 2 and parts[0] == 'databases' and method == 'PATCH':
+                return self._send_json(200, state.update_database(parts[1], payload))
+            if len(parts) == 3 and parts[0] == 'databases' and parts[2] == 'query':
+                return self._send_json(200, state.query(state.active_database(parts[1])['id'], payload))
+            if len(parts) == 3 and parts[0] == 'blocks' and parts[2] == 'children' and method == 'GET':
+                return self._send_json(200, state.paginate(state.children.get(parts[1].replace('-', ''), []),
+                                                           query.get('start_cursor', [None])[0],
+                                                           query.get('page_size', [None])[0]))
+            if parts == ['pages'] and method == 'POST':
+                state.active_database(payload.get('parent', {}).get('database_id'))
+                return self._send_json(200, state.save_page(payload))
+            if len(parts) == 2 and parts[0] == 'pages' and method == 'PATCH':
+                return self._send_json(200, state.save_page(payload, parts[1]))
+            if parts == ['file_uploads'] and method == 'POST':
+                return self._send_json(200, state.public(state.create_file_upload(payload)))
+            if len(parts) == 2 and parts[0] == 'file_uploads' and method == 'GET':
+                return self._send_json(200, state.public(state.file_uploads[parts[1]]))
+            if len(parts) == 3 and parts[0] == 'file_uploads' and parts[2] == 'send':
+                return self._send_json(200, state.public(state.send_file_upload(parts[1], self._form_fields(body))))
+            if len(parts) == 3 and parts[0] == 'file_uploads' and parts[2] == 'complete':
+                return self._send_json(200, state.public(state.complete_file_upload(parts[1])))
+        self._send_json(404, {'object': 'error', 'status': 404, 'code': 'invalid_request_url',
+                              'message': f"Invalid request URL: {method} {path}"})
+
+    def _form_fields(self, body: bytes) -> Dict[str, bytes]:
+        """multipart/form-data の各フィールドの値"""
+        header = f"Content-Type: {self.headers.get('Content-Type', '')}\r\n\r\n".encode('latin-1')
+        message = BytesParser(policy=policy.HTTP).parsebytes(header + body)
+        fields = {}
+        for part in message.iter_parts() if message.is_multipart() else []:
+            name = part.get_param('name', header='content-disposition')
+            if name:
+                fields[name] = part.get_payload(decode=True) or b''
+        return fields
+
+    def _send_json(self, status: int, payload: Dict, headers: Dict[str, str] = None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class ReplayServer:
+    """
+    YANOSHIN・TDnet・Notion を模したHTTPサーバー（サービスごとに別ポートで待ち受け）
+
+    latency と throttle_rate はサービス名（yanoshin, tdnet, notion）ごとの
+    応答遅延（秒）と 429 を返す割合。429 には Retry-After: retry_after を付ける。
+    """
+
+    def __init__(self, fixtures: ReplayFixtures, latency: Dict[str, float] = None,
+                 throttle_rate: Dict[str, float] = None, retry_after: float = 1.0, host: str = '127.0.0.1',
+                 seed: int = 0):
+        self.fixtures = fixtures
+        self.latency = dict(latency or {})
+        self.throttle_rate = dict(throttle_rate or {})
+        self.retry_after = retry_after
+        self.host = host
+        self.notion = NotionState()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._requests = Counter()
+        self._throttled = Counter()
+        self._servers: Dict[str, ThreadingHTTPServer] = {}
+
+    def start(self) -> 'ReplayServer':
+        for service in SERVICES:
+            server = ThreadingHTTPServer((self.host, 0), ReplayHandler)
+            server.daemon_threads = True
+            server.service = service
+            server.replay = self
+            self._servers[service] = server
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.notion.base_url = self.url('notion')
+        return self
+
+    def stop(self):
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+
+    def __enter__(self) -> 'ReplayServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def url(self, service: str) -> str:
+        return f"http://{self.host}:{self._servers[service].server_port}"
+
+    @property
+    def listing_url(self) -> str:
+        """YuutaiAPIClient の base_url（TDNET_API_BASE_URL）に指定するURL"""
+        return f"{self.url('yanoshin')}{LISTING_PATH}"
+
+    @property
+    def notion_url(self) -> str:
+        """NotionUploader の base_url（NOTION_API_BASE_URL）に指定するURL"""
+        return self.url('notion')
+
+    def rewrite_item(self, item: Dict) -> Dict:
+        tdnet = item.get('Tdnet', {})
+        document_url = tdnet.get('document_url') or ''
+        if not document_url.startswith(TDNET_ORIGIN):
+            return item
+        return {'Tdnet': dict(tdnet, document_url=self.url('tdnet') + document_url[len(TDNET_ORIGIN):])}
+
+    @staticmethod
+    def endpoint_name(service: str, method: str, path: str) -> str:
+        """リクエスト数を集計するエンドポイント名（例: notion databases.query）"""
+        if service == 'yanoshin':
+            return 'yanoshin list'
+        if service == 'tdnet':
+            return 'tdnet document'
+        parts = path.strip('/').split('/')[1:]
+        if not parts:
+            return 'notion unknown'
+        action = {
+            ('databases', 'POST', 1): 'create', ('databases', 'GET', 2): 'retrieve',
+            ('databases', 'PATCH', 2): 'update', ('databases', 'POST', 3): 'query',
+            ('pages', 'POST', 1): 'create', ('pages', 'PATCH', 2): 'update',
+            ('blocks', 'GET', 3): 'children.list', ('file_uploads', 'POST', 1): 'create',
+            ('file_uploads', 'GET', 2): 'retrieve',
+        }.get((parts[0], method, len(parts)))
+        if action is None and parts[0] == 'file_uploads' and len(parts) == 3:
+            action = parts[2]
+        return f"notion {parts[0]}.{action or method.lower()}"
+
+    def admit(self, service: str, endpoint: str) -> Tuple[float, bool]:
+        """リクエストを記録し、(応答前の遅延, 429 を返すか) を返す"""
+        with self._lock:
+            self._requests[endpoint] += 1
+            throttled = self._rng.random() < self.throttle_rate.get(service, 0.0)
+            if throttled:
+                self._throttled[endpoint] += 1
+        return self.latency.get(service, 0.0), throttled
+
+    def stats(self) -> Dict:
+        """エンドポイント別のリクエスト数と 429 を返した数、Notion に作成されたデータ数"""
+        with self._lock:
+            requests = dict(self._requests)
+            throttled = dict(self._throttled)
+        with self.notion.lock:
+            notion = {'databases': len(self.notion.databases), 'pages': len(self.notion.pages),
+                      'file_uploads': len(self.notion.file_uploads),
+                      'uploaded_bytes': sum(upload['content_length'] for upload in self.notion.file_uploads.values())}
+        return {'requests': requests, 'throttled': throttled, 'notion': notion}
+
+
+def main():
+    """リプレイサーバーを起動し、接続先URLを1行のJSONで標準出力に書き出す（終了は標準入力を閉じる）"""
+    parser = argparse.ArgumentParser(description='YANOSHIN・TDnet・Notion のリプレイサーバー')
+    parser.add_argument('--pdf-dir', default='./downloads/yuutai', help='PDFのシード（{銘柄コード}_{YYYYMMDD}_{開示ID}.pdf）')
+    parser.add_argument('--listing-cache', help='記録済みの一覧キャッシュディレクトリ（指定時はこちらを再生）')
+    parser.add_argument('--titles', help='タイトルのサンプル（1行1タイトル、# で始まる行は無視）')
+    parser.add_argument('--filler-per-day', type=int, default=100, help='営業日ごとの株主優待以外の開示件数')
+    for service in SERVICES:
+        parser.add_argument(f'--{service}-latency', type=float, default=0.0, help=f'{service} の応答遅延（秒）')
+        parser.add_argument(f'--{service}-throttle', type=float, default=0.0, help=f'{service} で 429 を返す割合')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='429 の Retry-After（秒）')
+    args = parser.parse_args()
+
+    if args.listing_cache:
+        fixtures = ReplayFixtures.from_listing_cache(args.listing_cache, args.pdf_dir)
+    else:
+        titles = []
+        if args.titles:
+            with open(args.titles, encoding='utf-8') as f:
+                titles = [line.rstrip('\n') for line in f if line.strip() and not line.startswith('#')]
+        fixtures = ReplayFixtures.from_pdf_dir(args.pdf_dir, titles or ['株主優待制度の新設に関するお知らせ'],
+                                               args.filler_per_day)
+
+    server = ReplayServer(
+        fixtures,
+        latency={service: getattr(args, f'{service}_latency') for service in SERVICES},
+        throttle_rate={service: getattr(args, f'{service}_throttle') for service in SERVICES},
+        retry_after=args.retry_after
+    ).start()
+    print(json.dumps({'listing_url': server.listing_url, 'notion_url': server.notion_url,
+                      'days': sorted(fixtures.listings)}), flush=True)
+    sys.stdin.read()
+    server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Notion データベースIDキャッシュのテスト
+
+リプレイサーバーを使い、ネットワークに接続せずに以下を確認します：
+1. 解決したデータベースIDとプロパティ定義が保存され、再起動後は検索せずに検証だけで使うこと
+2. 初期化を繰り返してもAPIを呼ばないこと
+3. データベースがアーカイブされた場合にキャッシュを破棄し、解決し直すこと
+4. キャッシュ済みのプロパティ定義と Notion 上の定義の差異を検出し、キャッシュを更新すること
+5. 子データベースの検索が子ブロックを全ページ取得し、データベースごとの databases.retrieve を送らないこと
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from testing_helpers import create_manager, create_uploader, make_disclosure, requests_of
+from yuutai.database_cache import DatabaseCache
+from yuutai.notion_manager import YUUTAI_DATABASE_NAME
+from yuutai.replay_server import ReplayFixtures, ReplayServer
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def test_cache_persistence():
+    """データベースIDの保存・正規化・削除を確認"""
+    logger.info("=== Testing Cache Persistence ===")
+
+    cache_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    cache = DatabaseCache(cache_dir)
+    assert cache.get('page-1', YUUTAI_DATABASE_NAME) is None
+    cache.put('page-1', YUUTAI_DATABASE_NAME, 'db-1', {'タイトル': {'type': 'title'}})
+
+    # 親ページIDはハイフンの有無を区別しない
+    reopened = DatabaseCache(cache_dir)
+    assert reopened.get('page1', YUUTAI_DATABASE_NAME) == {'database_id': 'db-1',
+                                                          'properties': {'タイトル': {'type': 'title'}}}
+    assert reopened.get('page-1', 'その他') is None
+
+    reopened.invalidate('page-1', YUUTAI_DATABASE_NAME)
+    assert DatabaseCache(cache_dir).get('page-1', YUUTAI_DATABASE_NAME) is None
+
+    logger.info("✅ Cache persistence test passed")
+
+
+def test_resolve_once():
+    """再起動後は子ブロックを検索せず、初期化の繰り返しでAPIを呼ばないことを確認"""
+    logger.info("=== Testing Resolve Once ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        cache_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+        manager = create_manager(server, cache_dir)
+        assert manager.initialize_databases()
+        database_id = manager.yuutai_database_id
+        assert 'タイトル' in manager.yuutai_database_properties
+        assert requests_of(server, 'blocks.children.list') == 1
+
+        # 日ごとの初期化ではAPIを呼ばない
+        requests_before = sum(server.stats()['requests'].values())
+        for _ in range(3):
+            assert manager.initialize_databases()
+        assert sum(server.stats()['requests'].values()) == requests_before
+
+        restarted = create_manager(server, cache_dir)
+        assert restarted.initialize_databases()
+        assert restarted.yuutai_database_id == database_id
+        assert restarted.yuutai_database_properties == manager.yuutai_database_properties
+        assert requests_of(server, 'blocks.children.list') == 1
+        assert requests_of(server, 'databases.retrieve') == 1
+        assert requests_of(server, 'databases.create') == 1
+
+    logger.info("✅ Resolve once test passed")
+
+
+def test_invalidate_archived_database():
+    """アーカイブされたデータベースのキャッシュを破棄して解決し直すことを確認"""
+    logger.info("=== Testing Invalidate Archived Database ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        cache_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+        # アーカイブ後の1件目の失敗で破棄し、2件目で解決し直す順序を確認するため逐次処理
+        manager = create_manager(server, cache_dir, upload_workers=1)
+        manager.initialize_databases()
+        assert manager.process_daily_yuutai_disclosures([make_disclosure(1)])['success'] == 1
+        old_database_id = manager.yuutai_database_id
+
+        # 実行中にデータベースがアーカイブされた → ページ作成の失敗で破棄し、次の開示で作成し直す
+        manager.uploader.client.request(path=f'databases/{old_database_id}', method='PATCH',
+                                        body={'archived': True})
+        stats = manager.process_daily_yuutai_disclosures([make_disclosure(2), make_disclosure(3)])
+        assert stats['failed'] == 1 and stats['success'] == 1, stats
+        assert manager.yuutai_database_id and manager.yuutai_database_id != old_database_id
+        assert requests_of(server, 'databases.create') == 2
+
+        cached = DatabaseCache(cache_dir).get('page-1', YUUTAI_DATABASE_NAME)
+        assert cached['database_id'] == manager.yuutai_database_id
+
+        # 再起動時の検証でアーカイブ済みのIDは使わない
+        manager.uploader.client.request(path=f'databases/{manager.yuutai_database_id}', method='PATCH',
+                                        body={'archived': True})
+        restarted = create_manager(server, cache_dir)
+        assert restarted.initialize_databases()
+        assert restarted.yuutai_database_id not in (old_database_id, manager.yuutai_database_id)
+        assert requests_of(server, 'databases.create') == 3
+
+    logger.info("✅ Invalidate archived database test passed")
+
+
+def test_schema_drift():
+    """キャッシュ済みのプロパティ定義が Notion 上の定義と異なる場合に検出・更新することを確認"""
+    logger.info("=== Testing Schema Drift ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        cache_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+        manager = create_manager(server, cache_dir)
+        assert manager.initialize_databases()
+        properties = manager.yuutai_database_properties
+
+        # 前回の実行時から「優待価値」の型が変わり、「備考」が削除された
+        stale = dict(properties, 優待価値={'type': 'rich_text'}, 備考={'type': 'rich_text'})
+        assert manager._schema_drift(stale, properties) == sorted(['優待価値', '備考'])
+        assert manager._schema_drift(properties, properties) == []
+        DatabaseCache(cache_dir).put('page-1', YUUTAI_DATABASE_NAME, manager.yuutai_database_id, stale)
+
+        restarted = create_manager(server, cache_dir)
+        assert restarted.initialize_databases()
+        assert restarted.yuutai_database_id == manager.yuutai_database_id
+        cached = DatabaseCache(cache_dir).get('page-1', YUUTAI_DATABASE_NAME)
+        assert cached['properties'] == restarted.yuutai_database_properties == properties
+        assert requests_of(server, 'databases.create') == 1
+
+    logger.info("✅ Schema drift test passed")
+
+
+def test_child_database_discovery():
+    """100件を超える子ブロックの検索と、名前 → IDの一覧の共有を確認"""
+    logger.info("=== Testing Child Database Discovery ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        creator = create_uploader(server)
+        for index in range(120):
+            name = '投資主体別売買状況' if index == 110 else f'データベース{index}'
+            creator.create_database(parent={'page_id': 'page-1'},
+                                    title=[{'type': 'text', 'text': {'content': name}}],
+                                    properties={'名前': {'title': {}}})
+
+        uploader = create_uploader(server)
+        investor_type_id = uploader._find_existing_database('投資主体別売買状況')
+        assert investor_type_id
+        assert uploader._find_existing_database('データベース0')
+        assert uploader._find_existing_database('存在しないデータベース') is None
+        assert requests_of(server, 'blocks.children.list') == 2
+        assert requests_of(server, 'databases.retrieve') == 0
+
+        # データタイプ別の取得・作成と重複チェックも同じ一覧を使う
+        assert uploader._get_or_create_database('investor_type') == investor_type_id
+        margin_balance_id = uploader._get_or_create_database('margin_balance')
+        assert uploader._find_existing_database('信用取引現在高') == margin_balance_id
+        assert not uploader._check_duplicate_by_original_filename('short_selling_daily', 'a.xls')
+        assert requests_of(server, 'blocks.children.list') == 2
+        assert requests_of(server, 'databases.create') == 121
+
+    logger.info("✅ Child database discovery test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_cache_persistence, test_resolve_once, test_invalidate_archived_database,
+             test_schema_drift, test_child_database_discovery]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+重複判定用ローカルインデックスのテスト
+
+リプレイサーバーを使い、ネットワークに接続せずに以下を確認します：
+1. インデックスが保存され、編集でキーが変わったページと全件取得で消えたページを反映すること
+2. 起動時に1回だけ全件取得し、開示ごとの重複判定で databases.query を送らないこと（インデックスを使えない場合は1回だけ送ること）
+3. Notion 上の編集を差分取得で反映し、再起動後は保存済みのキーから差分取得すること
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from testing_helpers import create_manager, make_disclosure, requests_of
+from yuutai.dedupe_index import DedupeIndex, make_dedupe_key
+from yuutai.replay_server import ReplayFixtures, ReplayServer
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def test_index_persistence():
+    """インデックスの保存・キーの置き換え・全件取得での削除を確認"""
+    logger.info("=== Testing Index Persistence ===")
+
+    cache_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    index = DedupeIndex(cache_dir)
+    assert index.load('db-1') is None
+    first, second = make_dedupe_key('優待新設', '2216', '15:00'), make_dedupe_key('優待変更', '2216', '15:00')
+    index.replace([('page-1', first, '2025-05-23T06:00:00.000Z')], '2025-05-23T06:00:00.000Z')
+    index.add('page-2', second)
+
+    # 編集でタイトルが変わったページは古いキーでは一致しない
+    edited = make_dedupe_key('優待新設（訂正）', '2216', '15:00')
+    index.update([('page-1', edited, '2025-05-23T07:00:00.000Z')], '2025-05-23T07:00:00.000Z')
+    assert first not in index and index.get(edited) == 'page-1'
+
+    reopened = DedupeIndex(cache_dir)
+    assert reopened.load('db-1')['edited_cursor'] == '2025-05-23T07:00:00.000Z'
+    assert reopened.get(second) == 'page-2' and reopened.get(edited) == 'page-1' and len(reopened) == 2
+    assert reopened.load('db-2') is None and len(reopened) == 0
+
+    # 全件取得では Notion で削除されたページも消える
+    reopened.load('db-1')
+    reopened.replace([('page-2', second, None)], None)
+    assert edited not in reopened and len(reopened) == 1
+    fresh = DedupeIndex(cache_dir)
+    fresh.load('db-1')
+    assert len(fresh) == 1
+
+    logger.info("✅ Index persistence test passed")
+
+
+def test_no_query_per_disclosure():
+    """重複判定が開示ごとに databases.query を送らないことを確認"""
+    logger.info("=== Testing No Query Per Disclosure ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        manager = create_manager(server, tempfile.mkdtemp(prefix='yuutai_test_'))
+        assert manager.initialize_databases()
+        assert requests_of(server, 'databases.query') == 1
+
+        disclosures = [make_disclosure(i) for i in range(5)]
+        stats = manager.process_daily_yuutai_disclosures(disclosures + [make_disclosure(0)])
+        assert stats['success'] == 5 and stats['duplicates'] == 1
+        # 別バッチの同じ開示もローカルで重複と判定
+        assert manager.process_daily_yuutai_disclosures([make_disclosure(3)])['success'] == 1
+
+        stats = server.stats()
+        assert stats['notion']['pages'] == 5
+        assert stats['requests']['notion databases.query'] == 1
+        assert stats['requests']['notion pages.create'] == 5
+
+        # インデックスを使えない場合も、開示ごとのクエリは1回だけ
+        manager._ensure_dedupe_index = lambda: False
+        queries_before = requests_of(server, 'databases.query')
+        stats = manager.process_daily_yuutai_disclosures([make_disclosure(6), make_disclosure(1)])
+        assert stats['success'] == 2
+        assert requests_of(server, 'databases.query') == queries_before + 2
+        assert requests_of(server, 'pages.create') == 6
+
+    logger.info("✅ No query per disclosure test passed")
+
+
+def test_incremental_refresh():
+    """Notion 上の編集の差分取得と、再起動後の差分取得を確認"""
+    logger.info("=== Testing Incremental Refresh ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        cache_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+        manager = create_manager(server, cache_dir, dedupe_refresh_interval=0)
+        manager.initialize_databases()
+        manager.process_daily_yuutai_disclosures([make_disclosure(1), make_disclosure(2)])
+
+        # Notion の画面でタイトルを訂正 → 訂正前のタイトルの開示は再登録される
+        page_id = manager.dedupe_index.get(manager._dedupe_key(make_disclosure(1)))
+        manager.uploader.client.pages.update(page_id=page_id, properties={
+            'タイトル': {'title': [{'text': {'content': '株主優待制度の新設に関するお知らせ（訂正）'}}]}})
+        assert not manager._check_duplicate_disclosure(make_disclosure(1))
+        assert manager._check_duplicate_disclosure(make_disclosure(1, '株主優待制度の新設に関するお知らせ（訂正）'))
+        assert manager._check_duplicate_disclosure(make_disclosure(2))
+
+        queries_before = requests_of(server, 'databases.query')
+        restarted = create_manager(server, cache_dir)
+        restarted.initialize_databases()
+        assert len(restarted.dedupe_index) == 2
+        assert restarted._check_duplicate_disclosure(make_disclosure(2))
+        assert requests_of(server, 'databases.query') == queries_before + 1
+
+    logger.info("✅ Incremental refresh test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_index_persistence, test_no_query_per_disclosure, test_incremental_refresh]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+PDFダウンロード処理のテスト
+
+ネットワークに接続せず、ダミーのセッションで以下を確認します：
+1. ストリーミング受信とSHA-256計算、アトミックな配置（既定ではキャッシュ・PDFストアを作らないこと）
+2. サイズ上限・PDF以外のファイルでの中断
+3. 並列ダウンロードで元の順序が維持され、同時接続数がクライアント全体で上限内であること
+4. 404/410 のURLをネガティブキャッシュし、再リクエストしないこと
+5. PDFストアによる同一文書の重複排除
+"""
+
+import os
+import sys
+import glob
+import hashlib
+import logging
+import time
+import tempfile
+import threading
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.pdf_store import PDFStore
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+SAMPLE_PDF_DIR = os.path.join(os.path.dirname(__file__), 'downloads', 'yuutai')
+
+
+def load_sample_pdf() -> bytes:
+    """リポジトリ同梱のサンプルPDFを読み込む"""
+    sample_path = sorted(glob.glob(os.path.join(SAMPLE_PDF_DIR, '*.pdf')))[0]
+    with open(sample_path, 'rb') as f:
+        return f.read()
+
+
+class StreamingResponse:
+    """iter_content でチャンクを返すダミーレスポンス"""
+
+    def __init__(self, body: bytes, status_code: int = 200, headers: dict = None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers if headers is not None else {'content-length': str(len(body))}
+        self.bytes_sent = 0
+        self.closed = False
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            import requests
+            error = requests.exceptions.HTTPError(f"{self.status_code} Client Error")
+            error.response = self
+            raise error
+
+    def iter_content(self, chunk_size=1):
+        for offset in range(0, len(self.body), chunk_size):
+            chunk = self.body[offset:offset + chunk_size]
+            self.bytes_sent += len(chunk)
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+class StreamingSession:
+    """URLごとに用意したレスポンスを返すダミーセッション"""
+
+    def __init__(self, bodies: dict):
+        self.bodies = bodies
+        self.requests = []
+        self.responses = []
+
+    def get(self, url, **kwargs):
+        self.requests.append((url, kwargs))
+        body = self.bodies[url]
+        response = body if isinstance(body, StreamingResponse) else StreamingResponse(body)
+        self.responses.append(response)
+        return response
+
+
+class SlowSession(StreamingSession):
+    """応答に時間がかかり、同時接続数を記録するダミーセッション"""
+
+    def __init__(self, bodies: dict, delay: float = 0.1):
+        super().__init__(bodies)
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            return super().get(url, **kwargs)
+
+
+def create_client(bodies: dict, **kwargs) -> YuutaiAPIClient:
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = YuutaiAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'),
+                             request_interval=0.001, use_pdf_store=True, **kwargs)
+    client.session = StreamingSession(bodies)
+    return client
+
+
+def downloaded_files(client: YuutaiAPIClient) -> list:
+    """ダウンロードディレクトリのファイル（PDFストアを除く）"""
+    return sorted(name for name in os.listdir(client.download_dir) if name != '.store')
+
+
+def make_disclosure(doc_id: str, url: str, company_code: str = '2216') -> dict:
+    return {'id': doc_id, 'company_code': company_code, 'disclosure_date': '2025-05-23', 'pdf_url': url}
+
+
+def test_streaming_download():
+    """ストリーミング受信でファイルとSHA-256が得られることを確認"""
+    logger.info("=== Testing Streaming Download ===")
+
+    pdf = load_sample_pdf()
+    url = 'https://www.release.tdnet.info/inbs/140120250523556870.pdf'
+    client = create_client({url: pdf})
+    client.download_chunk_size = 4096
+
+    disclosure = make_disclosure('1156870', url)
+    file_path = client.download_disclosure_file(disclosure)
+
+    assert file_path and os.path.basename(file_path) == '2216_20250523_1156870.pdf'
+    with open(file_path, 'rb') as f:
+        assert f.read() == pdf
+    assert disclosure['sha256'] == hashlib.sha256(pdf).hexdigest()
+    assert client.session.requests[0][1].get('stream') is True
+    assert client.session.responses[0].closed
+    assert downloaded_files(client) == ['2216_20250523_1156870.pdf']
+
+    # 既定のクライアントはキャッシュ・PDFストアを作らず、ダウンロードディレクトリにはPDFだけを置く
+    plain_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    plain = YuutaiAPIClient(plain_dir, request_interval=0.001)
+    plain.session = StreamingSession({url: pdf})
+    assert plain.listing_cache is None and plain.pdf_store is None
+    assert plain.download_disclosure_file(make_disclosure('1156870', url))
+    assert os.listdir(plain_dir) == ['2216_20250523_1156870.pdf']
+
+    logger.info("✅ Streaming download test passed")
+
+
+def test_download_cutoffs():
+    """サイズ上限超過・PDF以外の内容で受信を中断することを確認"""
+    logger.info("=== Testing Download Cutoffs ===")
+
+    pdf = load_sample_pdf()
+    big_url = 'https://www.release.tdnet.info/inbs/big.pdf'
+    html_url = 'https://www.release.tdnet.info/inbs/error.pdf'
+    declared_url = 'https://www.release.tdnet.info/inbs/declared.pdf'
+    client = create_client({
+        # Content-Length なしで上限を超えるファイル
+        big_url: StreamingResponse(pdf * 10, headers={}),
+        # PDFではなくエラーページが返る場合
+        html_url: StreamingResponse(b'<html>' + b'x' * 100000, headers={}),
+        # Content-Length で上限超過が分かる場合
+        declared_url: StreamingResponse(pdf, headers={'content-length': str(10 ** 9)}),
+    }, max_file_size_mb=len(pdf) * 2 / (1024 * 1024))
+    client.download_chunk_size = 1024
+
+    assert client.download_disclosure_file(make_disclosure('1', big_url)) is None
+    assert client.session.responses[0].bytes_sent <= len(pdf) * 2 + 1024, "Download must stop once the cap is exceeded"
+
+    assert client.download_disclosure_file(make_disclosure('2', html_url)) is None
+    assert client.session.responses[1].bytes_sent == 1024, "Non-PDF bodies must be rejected on the first chunk"
+
+    assert client.download_disclosure_file(make_disclosure('3', declared_url)) is None
+    assert client.session.responses[2].bytes_sent == 0
+
+    assert downloaded_files(client) == [], "Aborted downloads must not leave files behind"
+
+    logger.info("✅ Download cutoffs test passed")
+
+
+def test_parallel_downloads():
+    """並列ダウンロードの結果が元の順序で返り、同時接続数が上限内であることを確認"""
+    logger.info("=== Testing Parallel Downloads ===")
+
+    pdf = load_sample_pdf()
+    disclosures = [make_disclosure(str(i), f'https://www.release.tdnet.info/inbs/{i}.pdf') for i in range(8)]
+    disclosures.append(make_disclosure('missing', ''))
+    bodies = {d['pdf_url']: pdf for d in disclosures if d['pdf_url']}
+    client = create_client({}, max_download_workers=3, download_interval=0.001)
+    client.session = SlowSession(bodies)
+    client.get_daily_disclosures = lambda date=None: [dict(d) for d in disclosures]
+
+    started = time.time()
+    results = client.process_daily_disclosures('2025-05-23')
+    elapsed = time.time() - started
+
+    assert [r['id'] for r in results] == [d['id'] for d in disclosures]
+    assert all(r['file_size'] == len(pdf) for r in results[:-1])
+    assert results[-1]['local_file'] is None and results[-1]['file_size'] == 0
+    assert client.session.max_active == 3, f"Expected 3 concurrent downloads, saw {client.session.max_active}"
+    assert elapsed < 8 * 0.1, "Downloads should overlap"
+
+    # バックフィルの複数ワーカーから同時に呼ばれても、TDnetへの同時接続数はクライアント全体で上限内
+    client.session = SlowSession(bodies)
+    for d in disclosures:
+        for path in glob.glob(os.path.join(client.download_dir, f'*_{d["id"]}.pdf')):
+            os.remove(path)
+    client.pdf_store.lookup = lambda doc_id: None
+    workers = [threading.Thread(target=client.download_disclosures,
+                                args=([dict(d) for d in disclosures[i::3]],)) for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(client.session.requests) == 8
+    assert client.session.max_active == 3, f"Expected at most 3 shared downloads, saw {client.session.max_active}"
+
+    logger.info("✅ Parallel downloads test passed")
+
+
+def test_missing_file_cache():
+    """404 が返ったURLは再確認間隔が過ぎるまでリクエストしないことを確認"""
+    logger.info("=== Testing Missing File Cache ===")
+
+    pdf = load_sample_pdf()
+    missing_url = 'https://www.release.tdnet.info/inbs/gone.pdf'
+    client = create_client({missing_url: StreamingResponse(b'', status_code=404)})
+
+    assert client.download_disclosure_file(make_disclosure('1', missing_url)) is None
+    assert client.download_disclosure_file(make_disclosure('1', missing_url)) is None
+    assert len(client.session.requests) == 1, "Known missing URLs must not be requested again"
+    assert client.stats['missing_file_marked'] == 1
+    assert client.stats['missing_file_skips'] == 1
+
+    # 別インスタンス（次回の実行）でも記録が引き継がれる
+    rerun = YuutaiAPIClient(client.download_dir, client.listing_cache.cache_dir, request_interval=0.001,
+                            use_pdf_store=True)
+    rerun.session = StreamingSession({missing_url: pdf})
+    assert rerun.download_disclosure_file(make_disclosure('1', missing_url)) is None
+    assert rerun.session.requests == []
+
+    # 再確認間隔を過ぎると再リクエストし、取得できれば記録を削除する
+    rerun.missing_recheck_interval = 0
+    assert rerun.download_disclosure_file(make_disclosure('1', missing_url))
+    assert not rerun.pdf_store.is_known_missing(missing_url, 3600)
+
+    # 一覧キャッシュを無効にしても記録される
+    uncached = YuutaiAPIClient(tempfile.mkdtemp(prefix='yuutai_test_'), None, request_interval=0.001,
+                               use_pdf_store=True)
+    uncached.session = StreamingSession({missing_url: StreamingResponse(b'', status_code=404)})
+    assert uncached.download_disclosure_file(make_disclosure('1', missing_url)) is None
+    assert uncached.download_disclosure_file(make_disclosure('1', missing_url)) is None
+    assert len(uncached.session.requests) == 1
+    assert uncached.stats['missing_file_marked'] == 1 and uncached.stats['missing_file_skips'] == 1
+
+    logger.info("✅ Missing file cache test passed")
+
+
+def test_pdf_store_dedup():
+    """同じ開示IDの文書は再取得せず、同一内容のファイルは1つの本体を共有することを確認"""
+    logger.info("=== Testing PDF Store Dedup ===")
+
+    pdf = load_sample_pdf()
+    url = 'https://www.release.tdnet.info/inbs/140120250523556870.pdf'
+    client = create_client({url: pdf})
+
+    first = client.download_disclosure_file(make_disclosure('1156870', url, '2216'))
+    # 別の銘柄コード表記・再実行でも同じ開示IDなら取得しない
+    second = client.download_disclosure_file(make_disclosure('1156870', url, '22160'))
+    assert len(client.session.requests) == 1
+    assert client.stats['pdf_store_hits'] == 1
+    assert os.path.samefile(first, second), "Duplicate documents must share one stored copy"
+
+    # 既存ディレクトリの取り込み（別々に保存された同一内容のファイルをまとめる）
+    legacy_dir = tempfile.mkdtemp(prefix='yuutai_legacy_')
+    for name in ('3347_20250523_1156999.pdf', '33470_20250523_1156999.pdf'):
+        with open(os.path.join(legacy_dir, name), 'wb') as f:
+            f.write(pdf)
+    store = PDFStore(legacy_dir)
+    stats = store.import_directory()
+    assert stats == {'files': 2, 'duplicates': 1, 'bytes_saved': len(pdf)}
+    assert os.path.samefile(os.path.join(legacy_dir, '3347_20250523_1156999.pdf'),
+                            os.path.join(legacy_dir, '33470_20250523_1156999.pdf'))
+    assert store.lookup('1156999')
+    assert store.import_directory()['duplicates'] == 0, "Re-import must be a no-op"
+
+    # アップロード後に release しても保持期間中は本体と開示IDの対応を残し、再実行時は再取得しない
+    sha = client.pdf_store.lookup('1156870')
+    object_path = client.pdf_store.object_path(sha)
+    client.pdf_store.release(first)
+    client.pdf_store.release(second)
+    assert os.path.exists(object_path) and not os.path.exists(second)
+    assert client.pdf_store.lookup('1156870') == sha
+    assert client.pdf_store.collect_garbage(retention=3600) == {'objects': 0, 'bytes_freed': 0}
+    rerun = client.download_disclosure_file(make_disclosure('1156870', url, '2216'))
+    assert len(client.session.requests) == 1, "Released documents must not be refetched"
+    assert os.path.samefile(rerun, object_path)
+
+    # 再リンクされた本体は回収せず、参照が消えて保持期間を過ぎた本体だけを回収
+    assert client.pdf_store.collect_garbage() == {'objects': 0, 'bytes_freed': 0}
+    client.pdf_store.release(rerun)
+    assert client.pdf_store.collect_garbage() == {'objects': 1, 'bytes_freed': len(pdf)}
+    assert not os.path.exists(object_path)
+    assert client.pdf_store.lookup('1156870') is None
+
+    # 参照のない本体（release 導入前にダウンロードファイルだけ削除されたもの）を回収
+    os.remove(os.path.join(legacy_dir, '3347_20250523_1156999.pdf'))
+    os.remove(os.path.join(legacy_dir, '33470_20250523_1156999.pdf'))
+    assert store.collect_garbage() == {'objects': 1, 'bytes_freed': len(pdf)}
+    assert store.lookup('1156999') is None
+
+    logger.info("✅ PDF store dedup test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_streaming_download, test_download_cutoffs, test_parallel_downloads,
+             test_missing_file_cache, test_pdf_store_dedup]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
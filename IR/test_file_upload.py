@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Notion ファイルアップロード（single_part / multi_part）のテスト
+
+リプレイサーバーを使い、ネットワークに接続せずに以下を確認します：
+1. しきい値以下のファイルは1回の送信、超えるファイルは固定サイズのパートに分けて送信し、完了すること
+2. 送信に失敗したパートだけを送り直し、429 はリクエストレイヤーに任せること
+3. 大きいPDFをページ作成時に添付できること
+"""
+
+import os
+import sys
+import logging
+import tempfile
+import threading
+
+import requests
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import testing_helpers
+from notion_uploader import NotionUploader
+from testing_helpers import create_manager, requests_of
+from yuutai.notion_request_layer import NotionRequestLayer
+from yuutai.replay_server import ReplayFixtures, ReplayServer
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def make_pdf(size: int) -> str:
+    path = os.path.join(tempfile.mkdtemp(prefix='yuutai_test_'), '2216_20250523_large.pdf')
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n' + bytes(range(256)) * (size // 256))
+        f.write(b'\n' * (size - f.tell()))
+    return path
+
+
+def create_uploader(server: ReplayServer) -> NotionUploader:
+    uploader = testing_helpers.create_uploader(server)
+    uploader.multi_part_threshold = 3000
+    uploader.part_size = 1000
+    uploader.part_retry_backoff = 0.01
+    return uploader
+
+
+def test_single_and_multi_part():
+    """しきい値による送信方法の切り替えとパートの送信・完了を確認"""
+    logger.info("=== Testing Single And Multi Part ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        uploader = create_uploader(server)
+
+        small = make_pdf(3000)
+        upload_id = uploader._upload_file(small, 'small.pdf', 'application/pdf')
+        upload = server.notion.file_uploads[upload_id]
+        assert upload['mode'] == 'single_part' and upload['status'] == 'uploaded'
+
+        large = make_pdf(4500)
+        upload_id = uploader._upload_file(large, 'large.pdf', 'application/pdf')
+        upload = server.notion.file_uploads[upload_id]
+        assert upload['mode'] == 'multi_part' and upload['number_of_parts'] == 5
+        assert upload['parts'] == {1: 1000, 2: 1000, 3: 1000, 4: 1000, 5: 500}
+        assert upload['status'] == 'uploaded' and upload['content_length'] == 4500
+
+        assert requests_of(server, 'file_uploads.create') == 2
+        assert requests_of(server, 'file_uploads.send') == 6
+        assert requests_of(server, 'file_uploads.complete') == 1
+
+    logger.info("✅ Single and multi part test passed")
+
+
+def test_part_retry():
+    """失敗したパートだけを送り直し、送り直せない場合は完了しないことを確認"""
+    logger.info("=== Testing Part Retry ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        uploader = create_uploader(server)
+        rest_request = uploader._rest_request
+        failures = {'2': 1, '4': 1}
+        sent = []
+        lock = threading.Lock()
+
+        def flaky_rest_request(method, url, **kwargs):
+            part_number = getattr(kwargs.get('data'), 'fields', {}).get('part_number')
+            with lock:
+                if part_number:
+                    sent.append(part_number)
+                if failures.get(part_number):
+                    failures[part_number] -= 1
+                    raise requests.ConnectionError('connection reset')
+            return rest_request(method, url, **kwargs)
+
+        uploader._rest_request = flaky_rest_request
+        upload_id = uploader._upload_file(make_pdf(5000), 'large.pdf', 'application/pdf')
+        assert upload_id and server.notion.file_uploads[upload_id]['status'] == 'uploaded'
+        assert sorted(sent) == ['1', '2', '2', '3', '4', '4', '5']
+
+        # 再試行回数を超えたパートがあれば完了しない
+        failures['3'] = uploader.part_retries + 1
+        assert uploader._upload_file(make_pdf(5000), 'large.pdf', 'application/pdf') is None
+        assert requests_of(server, 'file_uploads.complete') == 1
+
+        # 429 はリクエストレイヤーが再送するため、パート単位では再試行しない
+        throttled = requests.Response()
+        throttled.status_code = 429
+        uploader.request_layer = NotionRequestLayer()
+        del failures['3']
+        sent.clear()
+
+        def throttled_rest_request(method, url, **kwargs):
+            part_number = getattr(kwargs.get('data'), 'fields', {}).get('part_number')
+            if part_number == '2':
+                with lock:
+                    sent.append(part_number)
+                raise requests.HTTPError('429 Too Many Requests', response=throttled)
+            return rest_request(method, url, **kwargs)
+
+        uploader._rest_request = throttled_rest_request
+        assert uploader._upload_file(make_pdf(5000), 'large.pdf', 'application/pdf') is None
+        assert sent == ['2'], "Throttled parts must be left to the request layer"
+
+    logger.info("✅ Part retry test passed")
+
+
+def test_attach_large_pdf_on_create():
+    """大きいPDFを multi_part で送信し、ページ作成時に添付することを確認"""
+    logger.info("=== Testing Attach Large PDF On Create ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        manager = create_manager(server, tempfile.mkdtemp(prefix='yuutai_test_'), upload_workers=1, request_rate=0)
+        manager.uploader.multi_part_threshold = 3000
+        manager.uploader.part_size = 1000
+        assert manager.initialize_databases()
+
+        disclosure = {'id': 'large_1', 'title': '2025年3月期 決算説明資料', 'company_code': '2216',
+                      'company_name': 'カンロ', 'disclosure_time': '2025-05-23 15:00:00', 'category': '優待新設',
+                      'local_file': make_pdf(4500)}
+        assert manager.process_daily_yuutai_disclosures([disclosure])['success'] == 1
+        assert manager.upload_stats == {'attached_on_create': 1, 'attach_fallbacks': 0}
+
+        page = next(iter(server.notion.pages.values()))
+        assert [f['name'] for f in page['properties']['PDFファイル']['files']] == ['2216_20250523_large.pdf']
+        assert server.stats()['notion']['uploaded_bytes'] == 4500
+
+    logger.info("✅ Attach large PDF on create test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_single_and_multi_part, test_part_retry, test_attach_large_pdf_on_create]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
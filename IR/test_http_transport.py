@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+共有HTTPトランスポートのテスト
+
+ローカルのHTTPサーバーに対して以下を確認します：
+1. 同じホストへのリクエストが keep-alive の接続を再利用すること
+2. ホストごとに別の接続プールを使い、統計をホスト別に集計すること
+3. gzip 応答を受け付けて展開すること
+4. timeout を指定しないリクエストに既定の読み取りタイムアウトが適用されること
+5. notion-client 用の httpx.Client も接続を再利用し、統計に含まれること
+6. NotionUploader のファイルアップロード手順がトランスポート経由で送信されること
+7. multipart/form-data の本文をファイルから読み出しながら送信し、再送時に先頭から読み直せること
+"""
+
+import os
+import sys
+import gzip
+import time
+import logging
+import tempfile
+import threading
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import requests
+from http_transport import HTTPTransport, MultipartFileBody
+from notion_uploader import NotionUploader
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 で応答するテスト用ハンドラ（/slow は応答を遅らせ、/gzip は圧縮して返す）"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path == '/slow':
+            time.sleep(0.5)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if self.path == '/gzip' and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        self.do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_connection_reuse():
+    """同じホストへの連続リクエストが1つの接続で送られることを確認"""
+    logger.info("=== Testing Connection Reuse ===")
+
+    server = start_server()
+    transport = HTTPTransport()
+    url = f'http://127.0.0.1:{server.server_port}/items'
+    for _ in range(10):
+        assert transport.get(url).json() == {'ok': True}
+    transport.post(url, json={'name': 'a'}).close()
+
+    stats = transport.connection_stats()[f'127.0.0.1:{server.server_port}']
+    assert stats == {'requests': 11, 'connections': 1, 'reused': 10}, stats
+
+    transport.close()
+    server.shutdown()
+    logger.info("✅ Connection reuse test passed")
+
+
+def test_per_host_pools():
+    """ホストごとに別の Session と統計を持つことを確認"""
+    logger.info("=== Testing Per-Host Pools ===")
+
+    first, second = start_server(), start_server()
+    transport = HTTPTransport()
+    for server in (first, second, first):
+        transport.get(f'http://127.0.0.1:{server.server_port}/').close()
+
+    first_host, second_host = f'127.0.0.1:{first.server_port}', f'127.0.0.1:{second.server_port}'
+    assert transport.session_for(f'http://{first_host}/a') is transport.session_for(f'http://{first_host}/b')
+    assert transport.session_for(f'http://{first_host}/') is not transport.session_for(f'http://{second_host}/')
+
+    stats = transport.connection_stats()
+    assert stats[first_host]['requests'] == 2 and stats[first_host]['connections'] == 1
+    assert stats[second_host]['requests'] == 1 and stats[second_host]['connections'] == 1
+
+    transport.close()
+    first.shutdown()
+    second.shutdown()
+    logger.info("✅ Per-host pools test passed")
+
+
+def test_gzip_and_timeouts():
+    """gzip 応答の展開と、既定の読み取りタイムアウトを確認"""
+    logger.info("=== Testing Gzip And Timeouts ===")
+
+    server = start_server()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+    transport = HTTPTransport(connect_timeout=1.0, read_timeout=0.2)
+
+    response = transport.get(f'{base_url}/gzip')
+    assert response.headers.get('Content-Encoding') == 'gzip'
+    assert response.json() == {'ok': True}
+
+    try:
+        transport.get(f'{base_url}/slow')
+        assert False, "ReadTimeout expected"
+    except requests.exceptions.ReadTimeout:
+        pass
+    # 呼び出し側で指定したタイムアウトが優先される
+    assert transport.get(f'{base_url}/slow', timeout=5).json() == {'ok': True}
+
+    transport.close()
+    server.shutdown()
+    logger.info("✅ Gzip and timeouts test passed")
+
+
+def test_httpx_client_stats():
+    """httpx.Client の接続再利用が統計に含まれることを確認"""
+    logger.info("=== Testing Httpx Client Stats ===")
+
+    server = start_server()
+    transport = HTTPTransport(connect_timeout=2.0, read_timeout=3.0)
+    client = transport.httpx_client()
+    url = f'http://127.0.0.1:{server.server_port}/gzip'
+    for _ in range(5):
+        assert client.get(url).json() == {'ok': True}
+    transport.get(url).close()
+
+    assert client.timeout.connect == 2.0 and client.timeout.read == 3.0
+    stats = transport.connection_stats()[f'127.0.0.1:{server.server_port}']
+    assert stats == {'requests': 6, 'connections': 2, 'reused': 4}, stats
+
+    transport.close()
+    server.shutdown()
+    logger.info("✅ Httpx client stats test passed")
+
+
+class RecordingTransport(HTTPTransport):
+    """送信内容を記録し、Notion API の応答を返すトランスポート"""
+
+    def __init__(self):
+        super().__init__(connect_timeout=3.0, read_timeout=30.0)
+        self.calls = []
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{"id": "upload-1", "url": "https://files.example/a.pdf"}'
+        return response
+
+
+def test_notion_uploader_uses_transport():
+    """NotionUploader のファイルアップロード手順と notion-client がトランスポートを共有することを確認"""
+    logger.info("=== Testing Notion Uploader Transport ===")
+
+    transport = RecordingTransport()
+    uploader = NotionUploader('secret_test', 'page', transport)
+
+    file_path = os.path.join(tempfile.mkdtemp(prefix='yuutai_test_'), 'a.pdf')
+    with open(file_path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+
+    assert uploader._create_file_upload('a.pdf', 'application/pdf') == 'upload-1'
+    assert uploader._send_file_upload('upload-1', file_path, 'a.pdf', 'application/pdf')
+    assert uploader._complete_file_upload('upload-1')['url'] == 'https://files.example/a.pdf'
+    assert uploader._get_file_upload_info('upload-1')['id'] == 'upload-1'
+    assert [method for method, _ in transport.calls] == ['POST', 'POST', 'POST', 'GET']
+
+    # notion-client の httpx.Client にもタイムアウトと gzip が設定される
+    notion_http = uploader.client.client
+    assert notion_http.timeout.connect == 3.0 and notion_http.timeout.read == 30.0
+    assert 'gzip' in notion_http.headers['Accept-Encoding']
+    assert notion_http.headers['Authorization'] == 'Bearer secret_test'
+
+    logger.info("✅ Notion uploader transport test passed")
+
+
+def parse_form(content_type: str, body: bytes) -> dict:
+    message = BytesParser(policy=policy.HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    return {part.get_param('name', header='content-disposition'): (part.get_filename(), part.get_payload(decode=True))
+            for part in message.iter_parts()}
+
+
+def test_streaming_multipart_body():
+    """multipart/form-data の本文の内容・長さ・再読み込みと、requests でのストリーミング送信を確認"""
+    logger.info("=== Testing Streaming Multipart Body ===")
+
+    file_path = os.path.join(tempfile.mkdtemp(prefix='yuutai_test_'), 'a.pdf')
+    content = b'%PDF-1.4\n' + bytes(range(256)) * 1000
+    with open(file_path, 'wb') as f:
+        f.write(content)
+
+    with MultipartFileBody({'part_number': '2'}, 'file', '決算説明資料.pdf', 'application/pdf', file_path) as body:
+        data = body.read()
+        assert len(data) == len(body) and body.read() == b''
+        fields = parse_form(body.content_type, data)
+        assert fields['part_number'] == (None, b'2')
+        assert fields['file'] == ('決算説明資料.pdf', content)
+
+        # 先頭に戻して小さいチャンクで読み直しても同じ本文になる
+        body.seek(0)
+        assert b''.join(iter(lambda: body.read(1000), b'')) == data
+
+    # ファイルの一部だけを送信する
+    with MultipartFileBody({}, 'file', 'a.pdf', 'application/pdf', file_path, 1000, 500) as body:
+        assert parse_form(body.content_type, body.read())['file'] == ('a.pdf', content[1000:1500])
+
+    # requests は本文を組み立てずに Content-Length 付きで送信する
+    received = {}
+
+    class UploadHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received['headers'] = dict(self.headers)
+            received['body'] = self.rfile.read(int(self.headers['Content-Length']))
+            self.send_response(200)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), UploadHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    transport = HTTPTransport()
+    with MultipartFileBody({'part_number': '1'}, 'file', 'a.pdf', 'application/pdf', file_path) as body:
+        request = requests.Request('POST', f'http://127.0.0.1:{server.server_port}/send', data=body,
+                                   headers={'Content-Type': body.content_type}).prepare()
+        assert request.body is body and request.headers['Content-Length'] == str(len(body))
+        assert transport.post(request.url, data=body, headers={'Content-Type': body.content_type}).ok
+    assert 'Transfer-Encoding' not in received['headers']
+    assert parse_form(received['headers']['Content-Type'], received['body'])['file'] == ('a.pdf', content)
+
+    transport.close()
+    server.shutdown()
+    logger.info("✅ Streaming multipart body test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_connection_reuse, test_per_host_pools, test_gzip_and_timeouts, test_httpx_client_stats,
+             test_notion_uploader_uses_transport, test_streaming_multipart_body]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+日次一覧キャッシュのテスト
+
+ネットワークに接続せずに以下を確認します：
+1. 過去日の一覧は無期限にキャッシュされること
+2. 当日の一覧は短いTTLで失効すること
+3. 同じ日付を再取得してもAPIリクエストが発生しないこと
+4. 期間指定が範囲条件リクエストにまとめられること
+5. 1000件を超える日の一覧を全ページ取得し、全ページの取得後にキャッシュを入れ替えること
+6. 企業別履歴をローカルのインデックスから検索すること
+7. 一覧のデコードで使用する項目だけが残ること
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import yuutai.decoding as decoding
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.listing_cache import ListingCache
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+SAMPLE_ITEMS = [
+    {'Tdnet': {'id': '1156870', 'title': '株主優待制度の導入に関するお知らせ', 'company_code': '22160',
+               'company_name': 'カンロ', 'pubdate': '2025-05-23 15:30:00',
+               'document_url': 'https://www.release.tdnet.info/inbs/140120250523556870.pdf',
+               'markets_string': '東', 'url_xbrl': None}},
+    {'Tdnet': {'id': '1156871', 'title': '2025年3月期 決算短信〔日本基準〕(連結)', 'company_code': '72030',
+               'company_name': 'トヨタ自動車', 'pubdate': '2025-05-23 13:55:00',
+               'document_url': 'https://www.release.tdnet.info/inbs/140120250523556871.pdf',
+               'markets_string': '東名', 'url_xbrl': None}},
+]
+
+
+class CountingAPIClient(YuutaiAPIClient):
+    """_make_request を記録済みレスポンスに差し替えたクライアント"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def _make_request(self, condition, format='json', params=None):
+        self.requests.append(condition)
+        return {'items': SAMPLE_ITEMS}
+
+
+def test_past_day_cached_forever():
+    """取得日より前の日付は確定済みとして扱われることを確認"""
+    logger.info("=== Testing Past Day Cache ===")
+
+    cache = ListingCache(tempfile.mkdtemp(prefix='yuutai_cache_'), today_ttl=0)
+    cache.put('2025-05-23', SAMPLE_ITEMS, fetched_at=datetime(2025, 5, 23, 12, 0).timestamp())
+    assert cache.get('2025-05-23') is None, "Listing fetched on its own day must expire"
+
+    cache.put('2025-05-23', SAMPLE_ITEMS, fetched_at=datetime(2025, 5, 24, 9, 0).timestamp())
+    assert cache.get('2025-05-23') == SAMPLE_ITEMS
+    assert cache.is_cached('2025-05-23')
+
+    logger.info("✅ Past day cache test passed")
+
+
+def test_today_ttl():
+    """当日の一覧がTTL経過後に失効することを確認"""
+    logger.info("=== Testing Today TTL ===")
+
+    today = datetime.now().strftime('%Y-%m-%d')
+    cache = ListingCache(tempfile.mkdtemp(prefix='yuutai_cache_'), today_ttl=60)
+    cache.put(today, SAMPLE_ITEMS)
+    assert cache.get(today) == SAMPLE_ITEMS
+
+    cache.put(today, SAMPLE_ITEMS, fetched_at=time.time() - 120)
+    assert cache.get(today) is None
+
+    logger.info("✅ Today TTL test passed")
+
+
+def test_repeated_fetch_uses_cache():
+    """過去日の再取得でAPIリクエストが発生しないことを確認"""
+    logger.info("=== Testing Repeated Fetch ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = CountingAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+    past_day = (datetime.now() - timedelta(days=3)).strftime('%Y-%m-%d')
+
+    # 過去日を取得済みとして登録（キャッシュは取得日基準で確定判定される）
+    client.listing_cache.put(past_day, SAMPLE_ITEMS)
+    first = client.get_daily_disclosures(past_day)
+    second = client.get_daily_disclosures(past_day)
+
+    assert client.requests == [], "Cached historical day must not hit the network"
+    assert len(first) == len(second) == 1
+    assert first[0]['company_code'] == '2216'
+    assert client.stats['listing_cache_hits'] == 2
+
+    # 新しいクライアントでもディスク上のキャッシュが使われる
+    fresh_client = CountingAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+    fresh_client.get_daily_disclosures(past_day)
+    assert fresh_client.requests == []
+
+    logger.info("✅ Repeated fetch test passed")
+
+
+class RangeAPIClient(YuutaiAPIClient):
+    """範囲条件に応じて日付ごとのアイテムを返すクライアント"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.requests = []
+
+    def _make_request(self, condition, format='json', params=None):
+        self.requests.append((condition, dict(params or {})))
+        start, _, end = condition.partition('-')
+        end = end or start
+        items = []
+        day = datetime.strptime(start, '%Y%m%d')
+        while day <= datetime.strptime(end, '%Y%m%d'):
+            for i in range(3):
+                items.append({'Tdnet': {'id': f"{day.strftime('%Y%m%d')}{i}", 'title': '株主優待制度の変更について',
+                                        'company_code': '72030', 'company_name': 'トヨタ自動車',
+                                        'pubdate': day.strftime('%Y-%m-%d') + ' 15:00:00', 'document_url': ''}})
+            day += timedelta(days=1)
+        offset = (params or {}).get('offset', 0)
+        return {'items': items[offset:offset + params['limit']]}
+
+
+def test_range_conditions():
+    """期間指定が少数の範囲リクエストにまとめられ、日付ごとに分割されることを確認"""
+    logger.info("=== Testing Range Conditions ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = RangeAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+    client.page_size = 50
+    client.max_range_days = 20
+
+    client.listing_cache.put('2025-01-15', [])
+    by_date = client.get_range_disclosures('2025-01-01', '2025-02-10')
+
+    conditions = [condition for condition, _ in client.requests]
+    # 01-15はキャッシュ済みなので前後2つの期間に分割、さらに20日上限で分割される
+    assert sorted(set(conditions)) == ['20250101-20250114', '20250116-20250204', '20250205-20250210']
+    assert len(by_date) == 41
+    assert by_date['2025-01-15'] == []
+    assert len(by_date['2025-02-10']) == 3
+    assert all(d['disclosure_date'] == '2025-01-03' for d in by_date['2025-01-03'])
+
+    # 14日×3件=42件と6日×3件=18件は1ページ、20日×3件=60件は2ページ
+    assert len(client.requests) == 4
+    assert [params.get('offset') for _, params in client.requests].count(50) == 1
+
+    # 2回目はすべてキャッシュから
+    client.requests.clear()
+    client.get_range_disclosures('2025-01-01', '2025-02-10')
+    assert client.requests == []
+
+    logger.info("✅ Range conditions test passed")
+
+
+def test_paginated_daily_listing():
+    """1日の件数が上限を超える場合に全ページを遅延取得することを確認"""
+    logger.info("=== Testing Paginated Daily Listing ===")
+
+    day_items = [{'Tdnet': {'id': str(i), 'title': '株主優待制度の導入について' if i % 100 == 0 else '決算短信',
+                            'company_code': '72030', 'pubdate': '2025-05-14 15:00:00'}} for i in range(2500)]
+
+    class PagedAPIClient(CountingAPIClient):
+        def _make_request(self, condition, format='json', params=None):
+            self.requests.append(dict(params))
+            offset = params.get('offset', 0)
+            return {'items': day_items[offset:offset + params['limit']]}
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = PagedAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+
+    # 最初の1件を取り出した時点では1ページ目しか取得していない
+    iterator = client.iter_daily_disclosures('2025-05-14')
+    first = next(iterator)
+    assert first['id'] == '0'
+    assert len(client.requests) == 1
+    assert not client.listing_cache.is_cached('2025-05-14'), "Partial listing must not be committed"
+
+    rest = list(iterator)
+    assert len(rest) == 24, "Items beyond the first 1000 must not be dropped"
+    assert [params.get('offset', 0) for params in client.requests] == [0, 1000, 2000]
+
+    # 全ページ取得後はページ単位でキャッシュされている
+    assert client.listing_cache.is_cached('2025-05-14')
+    assert len(list(client.listing_cache.iter_pages('2025-05-14'))) == 3
+    assert len(client.get_daily_disclosures('2025-05-14')) == 25
+    assert len(client.requests) == 3
+
+    # 再取得が途中のページで失敗しても、以前の一覧とインデックスは置き換えられない
+    cache = client.listing_cache
+    cache.put_page('2025-05-14', 0, day_items[:1000])
+    cache.put_page('2025-05-14', 1, day_items[1000:1001])
+    assert len(cache.get('2025-05-14')) == 2500
+    assert len(cache.get_company_items('7203', '2025-05-14', '2025-05-14')['2025-05-14']) == 2500
+    assert cache.get_item('7203', '2025-05-14', '0') == day_items[0]['Tdnet']
+    cache.put_page('2025-05-14', 0, day_items[:1])
+    cache.commit('2025-05-14', 1)
+    assert cache.get('2025-05-14') == day_items[:1], "Staged pages replace the listing on commit"
+    assert len(cache.get_company_items('7203', '2025-05-14', '2025-05-14')['2025-05-14']) == 1
+
+    logger.info("✅ Paginated daily listing test passed")
+
+
+def test_company_index():
+    """企業別履歴がインデックスから検索され、未取得日のみネットワークで補完されることを確認"""
+    logger.info("=== Testing Company Index ===")
+
+    today = datetime.now()
+
+    class CompanyAPIClient(CountingAPIClient):
+        def _make_request(self, condition, format='json', params=None):
+            self.requests.append(condition)
+            # 企業コード条件: 新しい順に1日1件
+            items = []
+            for days_ago in range(0, 400, 5):
+                day = (today - timedelta(days=days_ago)).strftime('%Y-%m-%d')
+                items.append({'Tdnet': {'id': f'7203-{days_ago}', 'title': '株主優待制度の変更に関するお知らせ',
+                                        'company_code': '72030', 'company_name': 'トヨタ自動車',
+                                        'pubdate': f'{day} 15:00:00', 'document_url': ''}})
+            offset = params.get('offset', 0)
+            return {'items': items[offset:offset + params['limit']]}
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = CompanyAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+    client.page_size = 20
+
+    disclosures = client.get_company_disclosures('7203', days_back=365)
+    assert client.requests[0] == '7203', "Large gaps should use the company-code condition"
+    assert len(client.requests) <= 4, "Paging should stop once the page is older than the range"
+    assert len(disclosures) == 74
+    assert all(d['company_code'] == '7203' for d in disclosures)
+
+    # 2回目はローカルインデックスのみで回答
+    client.requests.clear()
+    assert len(client.get_company_disclosures('7203', days_back=365)) == 74
+    assert len(client.get_company_disclosures('7203', days_back=30)) == 7
+    assert client.requests == []
+
+    # 追加取得した期間は記録済みの期間に統合され、以前の広い期間を失わない
+    coverage = ListingCache(os.path.join(temp_dir, 'coverage'))
+    coverage.index_company_items('7203', [], '2024-01-01', '2024-12-31')
+    coverage.index_company_items('72030', [], '2024-12-25', '2025-01-08')
+    assert coverage.is_company_covered('7203', '2024-01-01') and coverage.is_company_covered('7203', '2025-01-08')
+    coverage.index_company_items('7203', [], '2025-01-09', '2025-01-10')
+    assert coverage.is_company_covered('7203', '2024-06-01') and coverage.is_company_covered('7203', '2025-01-10')
+    coverage.index_company_items('7203', [], '2025-03-01', '2025-03-05')
+    assert coverage.is_company_covered('7203', '2024-06-01'), "Disjoint ranges keep the earlier coverage"
+    assert coverage.is_company_covered('7203', '2025-03-03')
+    assert not coverage.is_company_covered('7203', '2025-02-01')
+    # 間を埋める取得で3つの期間が1つにまとまる
+    coverage.index_company_items('7203', [], '2025-01-11', '2025-02-28')
+    assert coverage._conn.execute("SELECT start_day, end_day FROM company_coverage").fetchall() == \
+        [('2024-01-01', '2025-03-05')]
+
+    # 取得時点で未確定だった当日を含む期間は、鮮度を保つため別の期間として残る
+    today_str = today.strftime('%Y-%m-%d')
+    week_ago = (today - timedelta(days=7)).strftime('%Y-%m-%d')
+    coverage.index_company_items('7203', [], week_ago, today_str, fetched_at=time.time() - 3600)
+    coverage.index_company_items('7203', [], '2024-01-01', week_ago)
+    assert coverage.is_company_covered('7203', week_ago)
+    assert not coverage.is_company_covered('7203', today_str), "Stale coverage of today must not be refreshed"
+
+    # 企業コード条件の取得に失敗した場合は範囲条件で補完する
+    class FailingCompanyAPIClient(CountingAPIClient):
+        def _make_request(self, condition, format='json', params=None):
+            if condition == '7203':
+                self.requests.append(condition)
+                return None
+            return super()._make_request(condition, format, params)
+
+    fallback_client = FailingCompanyAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache3'))
+    fallback_client.get_company_disclosures('7203', days_back=30)
+    assert fallback_client.requests[0] == '7203'
+    assert len(fallback_client.requests) > 1 and all('-' in c for c in fallback_client.requests[1:])
+    assert fallback_client.listing_cache.is_company_covered('7203', today.strftime('%Y-%m-%d'))
+
+    # 一覧キャッシュ済みの日付は他企業のインデックスとしても使われる
+    cache_client = CountingAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache2'))
+    for days_ago in range(0, 4):
+        cache_client.listing_cache.put((today - timedelta(days=days_ago)).strftime('%Y-%m-%d'), SAMPLE_ITEMS)
+    assert len(cache_client.get_company_disclosures('2216', days_back=3)) == 4
+    assert cache_client.requests == []
+
+    logger.info("✅ Company index test passed")
+
+
+def test_decode_used_fields():
+    """レスポンス・キャッシュのデコードで使用する項目だけが残り、どのデコーダでも同じ結果になることを確認"""
+    logger.info("=== Testing Decode Used Fields ===")
+
+    extra_item = {'Tdnet': dict(SAMPLE_ITEMS[0]['Tdnet'], url_xbrl_title='XBRL', attachments=[{'name': 'a.pdf'}])}
+    payload = json.dumps({'total_count': 2, 'items': [extra_item, SAMPLE_ITEMS[1]]}, ensure_ascii=False).encode('utf-8')
+
+    original_orjson = decoding.orjson
+    try:
+        results = []
+        for orjson_module in (original_orjson, None):
+            decoding.orjson = orjson_module
+            response = decoding.decode_listing_response(payload)
+            # 標準の json では絞り込まずにそのまま返すため、使用する項目の値で比較
+            assert [decoding.project_item(item) for item in response['items']] == SAMPLE_ITEMS
+            assert [decoding.project_item(item) for item in
+                    decoding.decode_items(json.dumps([extra_item]).encode('utf-8'))] == SAMPLE_ITEMS[:1]
+            assert decoding.project_item(decoding.decode_item(json.dumps(extra_item))) == SAMPLE_ITEMS[0]
+            if orjson_module is None and not decoding.msgspec:
+                assert response['items'][0] == extra_item, "Plain json must skip the projection pass"
+            results.append([decoding.project_item(item) for item in response['items']])
+
+            # items を持たないレスポンス・不正なJSON
+            assert 'items' not in decoding.decode_listing_response(b'{"error": "not found"}')
+            try:
+                decoding.decode_listing_response(b'{"items": [')
+                assert False, "ValueError expected"
+            except ValueError:
+                pass
+        assert results[0] == results[1]
+    finally:
+        decoding.orjson = original_orjson
+
+    # キャッシュから読み出したアイテムも使用する項目だけ
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    cache = ListingCache(temp_dir)
+    cache.put('2025-05-23', [extra_item], fetched_at=datetime(2025, 6, 1).timestamp())
+    assert cache.get('2025-05-23') == SAMPLE_ITEMS[:1]
+    assert cache.get_company_items('2216', '2025-05-23', '2025-05-23') == {'2025-05-23': SAMPLE_ITEMS[:1]}
+    assert cache.get_item('22160', '2025-05-23', '1156870') == SAMPLE_ITEMS[0]['Tdnet']
+
+    logger.info("✅ Decode used fields test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_past_day_cached_forever, test_today_ttl, test_repeated_fetch_uses_cache, test_range_conditions,
+             test_paginated_daily_listing, test_company_index, test_decode_used_fields]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
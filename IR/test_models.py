@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+開示情報レコード（Disclosure）のテスト
+
+ネットワークに接続せずに以下を確認します：
+1. 従来の辞書と同じキー・値で参照・追加できること
+2. raw_data を保持せず、一覧キャッシュのインデックスから遅延読み込みすること（キャッシュ無効時は保持）
+"""
+
+import os
+import sys
+import logging
+import tempfile
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.models import Disclosure
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def test_disclosure_records():
+    """開示情報が従来の辞書と同じキー・値で参照でき、raw_data を一覧キャッシュから読み込むことを確認"""
+    logger.info("=== Testing Disclosure Records ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = YuutaiAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+    items = [{'Tdnet': {'id': str(i), 'title': f'株主優待制度の変更に関するお知らせ（{i}）', 'company_code': code,
+                        'company_name': 'カンロ', 'pubdate': '2025-05-23 15:30:00',
+                        'document_url': f'https://www.release.tdnet.info/inbs/{i}.pdf',
+                        'markets_string': ''.join(['東', '名']), 'url_xbrl': None}}
+             for i, code in enumerate(['22160', '2216'])]
+    client.listing_cache.put('2025-05-23', items)
+
+    disclosures = list(client.iter_daily_disclosures('2025-05-23'))
+    assert all(isinstance(disclosure, Disclosure) for disclosure in disclosures)
+    first = disclosures[0]
+    assert first['company_code'] == first.get('company_code') == '2216'
+    assert first['category'] == '優待変更' and first['document_type'] == 'TDNET'
+    assert first['url_xbrl'] is None and first.get('disclosure_time') == '2025-05-23 15:30:00'
+    # 市場名は共有され、raw_data は保持せずに一覧キャッシュから読み込む
+    assert first['markets_string'] is disclosures[1]['markets_string']
+    assert first._raw_data is None
+    assert [disclosure['raw_data'] for disclosure in disclosures] == [item['Tdnet'] for item in items]
+
+    # ダウンロード後の項目は設定されるまで存在しない
+    assert 'local_file' not in first and first.get('local_file') is None and first.get('file_size', 0) == 0
+    first['local_file'] = '/tmp/2216_20250523_0.pdf'
+    first['note'] = 'extra'
+    assert 'local_file' in first and first['local_file'] == '/tmp/2216_20250523_0.pdf'
+    assert list(first.keys())[-2:] == ['local_file', 'note']
+    assert first.to_dict() == dict(first.items()) and first == first.to_dict()
+    try:
+        first['sha256']
+        assert False, "KeyError expected"
+    except KeyError:
+        pass
+
+    # キャッシュ無効時は raw_data を保持
+    uncached = YuutaiAPIClient(os.path.join(temp_dir, 'downloads'), None)
+    disclosure = uncached._filter_yuutai_items(items, '2025-05-23')[0]
+    assert disclosure['raw_data'] is items[0]['Tdnet']
+
+    logger.info("✅ Disclosure records test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_disclosure_records]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Notion リクエストレイヤーのテスト
+
+ネットワークに接続せずに以下を確認します：
+1. 429 は Retry-After に従って冪等でないリクエストも再送し、5xx・接続エラーは冪等なリクエストだけ再送すること
+2. 同時実行数の上限を 429 で半減し、成功で徐々に戻すこと（AIMD）
+3. リプレイサーバーの 429 を notion-client・ファイルアップロードの両方で再試行し、件数を集計すること
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from testing_helpers import FakeResponse, create_manager
+from yuutai.notion_request_layer import NotionRequestLayer, is_idempotent
+from yuutai.rate_limiter import AIMDConcurrencyLimiter
+from yuutai.replay_server import ReplayFixtures, ReplayServer
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def scripted_send(*outcomes):
+    """outcomes を順に返す（例外の場合は送出する）send と、呼び出し回数"""
+    calls = []
+
+    def send():
+        outcome = outcomes[len(calls)]
+        calls.append(outcome)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return send, calls
+
+
+def test_retry_policy():
+    """429・5xx・接続エラーの再試行対象を確認"""
+    logger.info("=== Testing Retry Policy ===")
+
+    assert is_idempotent('GET', '/v1/blocks/page-1/children')
+    assert is_idempotent('POST', '/v1/databases/db-1/query')
+    assert is_idempotent('PATCH', '/v1/pages/page-1')
+    assert not is_idempotent('POST', '/v1/pages')
+    assert not is_idempotent('PATCH', '/v1/blocks/page-1/children')
+
+    layer = NotionRequestLayer(backoff_base=0.01)
+
+    # 429 はページ作成も Retry-After だけ待って再送する
+    throttled = FakeResponse(429, {'Retry-After': '0.2'})
+    send, calls = scripted_send(throttled, FakeResponse(200))
+    started = time.perf_counter()
+    assert layer.execute('POST', 'http://notion.test/v1/pages', send).status_code == 200
+    assert time.perf_counter() - started >= 0.2
+    assert len(calls) == 2 and throttled.closed
+
+    # 5xx はページ作成（冪等でない）を再送せず、クエリは再送する
+    send, calls = scripted_send(FakeResponse(502), FakeResponse(200))
+    assert layer.execute('POST', '/v1/pages', send).status_code == 502 and len(calls) == 1
+    send, calls = scripted_send(FakeResponse(503), FakeResponse(500), FakeResponse(200))
+    assert layer.execute('POST', '/v1/databases/db-1/query', send).status_code == 200 and len(calls) == 3
+
+    # 接続エラーは冪等なリクエストだけ再送し、再試行回数を超えたら送出する
+    send, calls = scripted_send(ConnectionError('reset'), FakeResponse(200))
+    assert layer.execute('GET', '/v1/databases/db-1', send, (ConnectionError,)).status_code == 200
+    send, calls = scripted_send(ConnectionError('reset'))
+    try:
+        layer.execute('POST', '/v1/file_uploads', send, (ConnectionError,))
+        assert False, "non-idempotent request must not be resent after a connection error"
+    except ConnectionError:
+        assert len(calls) == 1
+    send, calls = scripted_send(*[ConnectionError('reset')] * 4)
+    try:
+        layer.execute('GET', '/v1/databases/db-1', send, (ConnectionError,))
+        assert False, "retries must be bounded"
+    except ConnectionError:
+        assert len(calls) == layer.max_error_retries + 1
+
+    stats = layer.get_stats()
+    assert stats['throttled'] == 1 and stats['server_errors'] == 2 and stats['connection_errors'] == 4
+    assert stats['retries'] == 7 and stats['requests'] == 13
+
+    logger.info("✅ Retry policy test passed")
+
+
+def test_aimd_concurrency():
+    """同時実行数の上限の乗算減少・加算増加を確認"""
+    logger.info("=== Testing AIMD Concurrency ===")
+
+    limiter = AIMDConcurrencyLimiter(8)
+    limiter.on_throttled()
+    limiter.on_throttled()
+    assert limiter.limit == 2
+    for _ in range(10):
+        limiter.on_throttled()
+    assert limiter.limit == 1
+
+    # 上限と同じ回数の成功でおよそ +1（1 → 2 → 2.5 → 2.9 → 3.24）
+    for _ in range(4):
+        limiter.on_success()
+    assert limiter.limit == 3
+    for _ in range(100):
+        limiter.on_success()
+    assert limiter.limit == 8
+
+    # 上限を超える同時実行は待たされる
+    limiter = AIMDConcurrencyLimiter(2)
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work():
+        limiter.acquire()
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        limiter.release()
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2
+
+    logger.info("✅ AIMD concurrency test passed")
+
+
+def test_replay_throttling():
+    """リプレイサーバーの 429 を再試行し、件数を最終の統計に反映することを確認"""
+    logger.info("=== Testing Replay Throttling ===")
+
+    with ReplayServer(ReplayFixtures(), throttle_rate={'notion': 0.3}, retry_after=0.05, seed=7) as server:
+        manager = create_manager(server, tempfile.mkdtemp(prefix='yuutai_test_'), request_rate=50)
+        assert manager.initialize_databases()
+
+        pdf_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+        disclosures = []
+        for index in range(6):
+            local_file = os.path.join(pdf_dir, f'2216_20250523_{index}.pdf')
+            with open(local_file, 'wb') as f:
+                f.write(b'%PDF-1.4\n' * 50)
+            disclosures.append({'id': f'retry_{index}', 'title': f'株主優待制度の変更に関するお知らせ{index}',
+                                'company_code': '2216', 'company_name': 'カンロ',
+                                'disclosure_time': '2025-05-23 15:30:00', 'category': '優待変更',
+                                'local_file': local_file})
+
+        stats = manager.process_daily_yuutai_disclosures(disclosures)
+        assert stats['success'] == 6 and stats['failed'] == 0, stats
+
+        # 再送したファイルも全バイトが届いている
+        server_stats = server.stats()
+        assert server_stats['notion']['pages'] == 6
+        assert server_stats['notion']['uploaded_bytes'] == 6 * len(b'%PDF-1.4\n' * 50)
+
+        throttled = sum(server_stats['throttled'].values())
+        layer_stats = manager.request_layer.get_stats()
+        # notion-client 経由（ページ作成など）とファイルアップロードの両方で 429 を受けている
+        assert any(endpoint.startswith('notion file_uploads') for endpoint in server_stats['throttled'])
+        assert any(endpoint.startswith('notion pages') for endpoint in server_stats['throttled'])
+        assert layer_stats['throttled'] == throttled and layer_stats['retries'] == throttled
+        assert layer_stats['requests'] == sum(server_stats['requests'].values())
+
+    logger.info("✅ Replay throttling test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_retry_policy, test_aimd_concurrency, test_replay_throttling]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
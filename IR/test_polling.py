@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+新着ポーリングモードのテスト
+
+ネットワークに接続せずに以下を確認します：
+1. ウォーターマーク以降の新着だけを返し、同じ公開日時の未処理アイテムも取りこぼさないこと
+2. ウォーターマークが一覧キャッシュに保存され、再起動後も引き継がれること
+3. 新着がページ上限を超える場合は範囲条件で取得すること
+4. アップロード完了までウォーターマークを進めないこと
+5. ダウンロード・アップロードに失敗した開示はウォーターマークを止めずに、回数を限って再試行すること
+"""
+
+import os
+import sys
+import logging
+import tempfile
+from datetime import datetime
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.daily_processor import YuutaiDailyProcessor
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+TODAY = datetime.now().strftime('%Y-%m-%d')
+
+
+def make_item(item_id: int, time_str: str, title: str = '株主優待制度の新設に関するお知らせ') -> dict:
+    return {'Tdnet': {'id': str(item_id), 'title': title, 'company_code': '22160', 'company_name': 'カンロ',
+                      'pubdate': f'{TODAY} {time_str}', 'markets_string': '東',
+                      'document_url': f'https://www.release.tdnet.info/inbs/{item_id}.pdf', 'url_xbrl': None}}
+
+
+class FeedAPIClient(YuutaiAPIClient):
+    """recent 条件を新しい順のフィードから limit/offset で返すクライアント"""
+
+    def __init__(self, feed, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.feed = feed
+        self.requests = []
+
+    def _make_request(self, condition, format='json', params=None):
+        params = params or {}
+        self.requests.append(condition)
+        items = sorted(self.feed, key=lambda item: item['Tdnet']['pubdate'], reverse=True)
+        offset = params.get('offset', 0)
+        return {'items': items[offset:offset + params.get('limit', 1000)]}
+
+
+def create_client(feed, temp_dir):
+    return FeedAPIClient(feed, os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+
+
+def test_poll_new_items_only():
+    """前回以降の新着だけを返し、同じ公開日時のアイテムはIDで区別することを確認"""
+    logger.info("=== Testing Poll New Items Only ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    feed = [make_item(1, '09:00:00'), make_item(2, '10:00:00', '月次売上高のお知らせ'), make_item(3, '11:00:00')]
+    client = create_client(feed, temp_dir)
+
+    disclosures, watermark = client.poll_recent_disclosures()
+    assert [d['id'] for d in disclosures] == ['1', '3']
+    assert watermark == {'pubdate': f'{TODAY} 11:00:00', 'ids': ['3']}
+    assert client.requests == ['recent']
+    client.commit_poll_watermark(watermark)
+
+    # 新着なし
+    disclosures, watermark = client.poll_recent_disclosures()
+    assert disclosures == [] and watermark['pubdate'] == f'{TODAY} 11:00:00'
+
+    # 前回と同じ公開日時の未処理アイテムと、新しいアイテム
+    feed.extend([make_item(4, '11:00:00'), make_item(5, '15:00:00')])
+    disclosures, watermark = client.poll_recent_disclosures()
+    assert [d['id'] for d in disclosures] == ['4', '5']
+    assert disclosures[0]['raw_data'] == feed[3]['Tdnet'], "raw_data must load from the index"
+    client.commit_poll_watermark(watermark)
+
+    feed.append(make_item(6, '15:00:00'))
+    disclosures, watermark = client.poll_recent_disclosures()
+    assert [d['id'] for d in disclosures] == ['6']
+    assert watermark == {'pubdate': f'{TODAY} 15:00:00', 'ids': ['5', '6']}
+    assert client.stats['poll_items'] == 3 + 3 + 5 + 6
+
+    logger.info("✅ Poll new items only test passed")
+
+
+def test_watermark_persists():
+    """ウォーターマークが再起動後のクライアントに引き継がれることを確認"""
+    logger.info("=== Testing Watermark Persists ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    feed = [make_item(1, '09:00:00'), make_item(2, '13:30:00')]
+    client = create_client(feed, temp_dir)
+    disclosures, watermark = client.poll_recent_disclosures()
+    client.commit_poll_watermark(watermark)
+
+    # 確定していないウォーターマークは引き継がれない
+    feed.append(make_item(3, '14:00:00'))
+    restarted = create_client(feed, temp_dir)
+    restarted.poll_recent_disclosures()
+    disclosures, watermark = create_client(feed, temp_dir).poll_recent_disclosures()
+    assert [d['id'] for d in disclosures] == ['3']
+
+    logger.info("✅ Watermark persists test passed")
+
+
+def test_poll_falls_back_to_range():
+    """新着がページ上限を超える場合に範囲条件で取得することを確認"""
+    logger.info("=== Testing Poll Range Fallback ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    feed = [make_item(i, f'{9 + i // 3600:02d}:{i // 60 % 60:02d}:{i % 60:02d}') for i in range(1, 26)]
+    client = create_client(feed, temp_dir)
+    client.poll_page_size = 5
+    client.max_poll_pages = 2
+
+    disclosures, watermark = client.poll_recent_disclosures()
+    assert len(disclosures) == 25
+    assert client.requests[:2] == ['recent', 'recent']
+    assert client.requests[2] == f"{TODAY.replace('-', '')}-{TODAY.replace('-', '')}"
+
+    logger.info("✅ Poll range fallback test passed")
+
+
+class RecordingNotionManager:
+    """アップロードを記録するダミーマネージャー（初期化の成否を指定可能）"""
+
+    def __init__(self, initialize_result=True, failing_ids=()):
+        self.yuutai_database_id = None
+        self.initialize_result = initialize_result
+        self.failing_ids = set(failing_ids)
+        self.uploaded = []
+
+    def initialize_databases(self) -> bool:
+        if self.initialize_result:
+            self.yuutai_database_id = 'db'
+        return self.initialize_result
+
+    def process_daily_yuutai_disclosures(self, disclosures):
+        failed = [d['id'] for d in disclosures if d['id'] in self.failing_ids]
+        self.uploaded.extend(d['id'] for d in disclosures if d['id'] not in self.failing_ids)
+        return {'total': len(disclosures), 'success': len(disclosures) - len(failed),
+                'failed': len(failed), 'skipped': 0, 'failed_ids': failed}
+
+
+def test_poll_once_commits_after_upload():
+    """アップロード後にだけウォーターマークが進むことを確認"""
+    logger.info("=== Testing Poll Once ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    feed = [make_item(1, '09:00:00'), make_item(2, '15:00:00')]
+    client = create_client(feed, temp_dir)
+    client.download_disclosures = lambda disclosures: disclosures
+
+    processor = YuutaiDailyProcessor.__new__(YuutaiDailyProcessor)
+    processor.api_client = client
+    processor.notion_manager = RecordingNotionManager(initialize_result=False)
+
+    result = processor.poll_once()
+    assert not result['success']
+    assert client.listing_cache.get_watermark('recent') is None
+
+    processor.notion_manager = RecordingNotionManager()
+    result = processor.poll_once()
+    assert result['success'] and result['new_disclosures'] == 2
+    assert processor.notion_manager.uploaded == ['1', '2']
+    assert client.listing_cache.get_watermark('recent') == {'pubdate': f'{TODAY} 15:00:00', 'ids': ['2']}
+
+    result = processor.poll_once()
+    assert result['success'] and result['new_disclosures'] == 0
+    assert processor.notion_manager.uploaded == ['1', '2']
+
+    logger.info("✅ Poll once test passed")
+
+
+def test_poll_once_retries_failures():
+    """失敗した開示があってもウォーターマークを進め、失敗した開示だけを回数を限って再試行することを確認"""
+    logger.info("=== Testing Poll Once Failure Retry ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    feed = [make_item(1, '09:00:00'), make_item(2, '15:00:00')]
+    client = create_client(feed, temp_dir)
+    client.download_disclosures = lambda disclosures: disclosures
+
+    processor = YuutaiDailyProcessor.__new__(YuutaiDailyProcessor)
+    processor.api_client = client
+    processor.notion_manager = RecordingNotionManager(failing_ids={'1'})
+
+    result = processor.poll_once()
+    assert result['success'] and result['stats']['failed'] == 1 and result['retrying'] == 1
+    assert processor.notion_manager.uploaded == ['2']
+    assert client.listing_cache.get_watermark('recent') == {'pubdate': f'{TODAY} 15:00:00', 'ids': ['2']}
+
+    # 失敗し続けてもウォーターマーク以降の新着と再試行待ちだけを処理する
+    result = processor.poll_once()
+    assert result['new_disclosures'] == 1 and result['retrying'] == 1
+    assert [retry['attempts'] for retry in client.listing_cache.get_poll_retries('recent')] == [2]
+
+    processor.notion_manager.failing_ids.clear()
+    feed.append(make_item(3, '16:00:00'))
+    result = processor.poll_once()
+    assert result['new_disclosures'] == 2 and result['retrying'] == 0
+    assert processor.notion_manager.uploaded == ['2', '1', '3']
+    assert client.listing_cache.get_poll_retries('recent') == []
+
+    # 再試行回数を超えた開示は諦める
+    client.max_poll_retries = 1
+    processor.notion_manager.failing_ids.add('4')
+    feed.append(make_item(4, '17:00:00'))
+    assert processor.poll_once()['retrying'] == 1
+    assert processor.poll_once()['retrying'] == 1
+    assert client.listing_cache.get_poll_retries('recent') == []
+    assert processor.poll_once()['new_disclosures'] == 0
+
+    # ダウンロード中に落ちた開示も再試行待ちになる
+    feed.append(make_item(5, '18:00:00'))
+    client.download_disclosures = lambda disclosures: []
+    result = processor.poll_once()
+    assert result['retrying'] == 1
+    assert client.listing_cache.get_watermark('recent')['pubdate'] == f'{TODAY} 18:00:00'
+    assert [retry['id'] for retry in client.listing_cache.get_poll_retries('recent')] == ['5']
+
+    logger.info("✅ Poll once failure retry test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_poll_new_items_only, test_watermark_persists, test_poll_falls_back_to_range,
+             test_poll_once_commits_after_upload, test_poll_once_retries_failures]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+トークンバケット・レート制限のテスト
+
+ネットワークに接続せずに以下を確認します：
+1. スレッド間で共有したときに補充レートを超えないこと
+2. 状態ファイルを通じて複数インスタンス（プロセス）間で共有されること
+3. 429/503 応答で Retry-After に従い減速・再試行すること
+4. asyncio からも利用でき、状態ファイルのロック待ちでイベントループを止めないこと
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import tempfile
+import threading
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from testing_helpers import FakeResponse
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.rate_limiter import TokenBucketRateLimiter, parse_retry_after
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def test_threaded_rate():
+    """複数スレッドから取得してもレートが守られることを確認"""
+    logger.info("=== Testing Threaded Rate ===")
+
+    limiter = TokenBucketRateLimiter(rate=20.0, capacity=1.0)
+    started = time.time()
+
+    threads = [threading.Thread(target=lambda: [limiter.acquire() for _ in range(3)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 12トークン（初期1個＋補充11個）には最低 11/20 秒かかる
+    assert time.time() - started >= 0.5
+
+    logger.info("✅ Threaded rate test passed")
+
+
+def test_shared_state_across_instances():
+    """同じ状態ファイルを使うインスタンス間でトークンが共有されることを確認"""
+    logger.info("=== Testing Shared State ===")
+
+    state_path = os.path.join(tempfile.mkdtemp(prefix='yuutai_rate_'), 'rate_limits.sqlite3')
+    first = TokenBucketRateLimiter(rate=10.0, name='yanoshin', state_path=state_path)
+    second = TokenBucketRateLimiter(rate=10.0, name='yanoshin', state_path=state_path)
+
+    started = time.time()
+    for _ in range(3):
+        first.acquire()
+        second.acquire()
+    # 6トークン（初期1個＋補充5個）には最低 0.5 秒かかる
+    assert time.time() - started >= 0.45
+
+    # 一方の減速はもう一方にも反映される
+    first.penalize(retry_after=0.2)
+    assert second.current_rate == 5.0
+    blocked_started = time.time()
+    second.acquire()
+    assert time.time() - blocked_started >= 0.15
+
+    # 減速を読み込んだインスタンスの reward はレートを戻し、元のレートに戻った後は状態を書かない
+    second.reward()
+    assert abs(first.current_rate - 5.5) < 1e-9
+    third = TokenBucketRateLimiter(rate=10.0, name='other', state_path=state_path)
+    third.acquire()
+    transactions = []
+    third._with_state = lambda update: transactions.append(update)
+    third.reward()
+    assert transactions == [], "reward at the full rate must not open a transaction"
+
+    logger.info("✅ Shared state test passed")
+
+
+def test_retry_after_parsing():
+    """Retry-After ヘッダーの解析を確認"""
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0.0
+    assert parse_retry_after('invalid') is None
+
+
+def test_async_acquire():
+    """asyncio から待機できることを確認"""
+    limiter = TokenBucketRateLimiter(rate=20.0)
+
+    async def run():
+        await asyncio.gather(*(limiter.acquire_async() for _ in range(5)))
+
+    started = time.time()
+    asyncio.run(run())
+    assert time.time() - started >= 0.15
+
+    # 状態ファイルのロック待ちの間もイベントループは他のタスクを実行できる
+    shared = TokenBucketRateLimiter(rate=20.0, state_path=os.path.join(tempfile.mkdtemp(prefix='yuutai_rl_'), 'rl.sqlite3'))
+    order = []
+
+    async def acquire():
+        await shared.acquire_async()
+        order.append('acquired')
+
+    async def tick():
+        await asyncio.sleep(0.05)
+        order.append('tick')
+
+    async def run_blocked():
+        await asyncio.gather(acquire(), tick())
+
+    shared._lock.acquire()
+    threading.Timer(0.2, shared._lock.release).start()
+    asyncio.run(run_blocked())
+    assert order == ['tick', 'acquired'], order
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def test_client_backoff_on_429():
+    """429 応答時に Retry-After だけ待って再試行し、レートを下げることを確認"""
+    logger.info("=== Testing Client Backoff ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = YuutaiAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'), request_interval=0.01)
+    client.session = FakeSession([
+        FakeResponse(429, {'Retry-After': '0.3'}),
+        FakeResponse(503),
+        FakeResponse(200, payload={'items': [{'Tdnet': {'id': '1'}}]}),
+    ])
+    client.rate_limiter.default_backoff = 0.05
+
+    started = time.time()
+    response = client._make_request('20250523', 'json', {'limit': 1000})
+    assert response == {'items': [{'Tdnet': {'id': '1'}}]}
+    assert client.session.calls == 3
+    assert client.stats['throttled'] == 2
+    assert time.time() - started >= 0.3
+    assert client.rate_limiter.current_rate < 100.0
+
+    logger.info("✅ Client backoff test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_threaded_rate, test_shared_state_across_instances, test_retry_after_parsing,
+             test_async_acquire, test_client_backoff_on_429]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
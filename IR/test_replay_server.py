@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+リプレイサーバーのテスト
+
+ネットワークに接続せずに以下を確認します：
+1. 一覧を条件・ページ単位で返し、document_url をリプレイサーバーのPDFに置き換えること
+2. Notion のデータベース作成・クエリ・ページ作成/更新・ファイルアップロードを模擬すること
+3. 遅延と 429（Retry-After 付き）を注入できること
+4. YuutaiDailyProcessor.process_date_range がリプレイサーバーに対して完了すること
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from http_transport import HTTPTransport
+from testing_helpers import create_uploader
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.replay_server import ReplayFixtures, ReplayServer
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+TITLES = ['株主優待制度の新設に関するお知らせ', '株主優待制度の変更に関するお知らせ',
+          '月次売上高のお知らせ', '決算短信〔日本基準〕（連結）']
+
+
+def create_fixtures(filler_per_day: int = 3) -> ReplayFixtures:
+    """シードPDF（同じ開示IDの銘柄コード表記違いを含む）から一覧を作成"""
+    pdf_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    for name in ('2216_20250522_1156870.pdf', '22160_20250522_1156870.pdf', '3558_20250523_1156642.pdf'):
+        with open(os.path.join(pdf_dir, name), 'wb') as f:
+            f.write(b'%PDF-1.4\n' + name.encode() * 100)
+    return ReplayFixtures.from_pdf_dir(pdf_dir, TITLES, filler_per_day)
+
+
+def test_listing_replay():
+    """一覧の条件・ページング・PDFの置き換えを確認"""
+    logger.info("=== Testing Listing Replay ===")
+
+    fixtures = create_fixtures()
+    assert sorted(fixtures.listings) == ['2025-05-22', '2025-05-23']
+    assert len(fixtures.documents) == 2, "same document id must be replayed once"
+
+    with ReplayServer(fixtures) as server:
+        temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+        client = YuutaiAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'),
+                                 request_interval=0.01, download_interval=0.01, base_url=server.listing_url)
+        client.page_size = 2
+
+        listings = client.fetch_listing_range('2025-05-22', '2025-05-23')
+        assert [len(listings[day]) for day in ('2025-05-22', '2025-05-23')] == [4, 4]
+        assert client.stats['listing_requests'] == 5
+
+        disclosures = client.process_daily_disclosures('2025-05-22')
+        assert [d['id'] for d in disclosures] == ['1156870']
+        assert disclosures[0]['pdf_url'].startswith(server.url('tdnet'))
+        seed_size = len(b'%PDF-1.4\n' + b'22160_20250522_1156870.pdf' * 100)
+        assert os.path.getsize(disclosures[0]['local_file']) == seed_size
+
+        assert client._make_request('unknown-condition') is None
+        stats = server.stats()
+        assert stats['requests'] == {'yanoshin list': 6, 'tdnet document': 1}
+
+    logger.info("✅ Listing replay test passed")
+
+
+def test_notion_endpoints():
+    """NotionUploader から見たデータベース・ページ・ファイルアップロードの動作を確認"""
+    logger.info("=== Testing Notion Endpoints ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        uploader = create_uploader(server)
+        database = uploader.create_database(
+            parent={'page_id': 'page-1'}, title=[{'type': 'text', 'text': {'content': '株主優待開示情報'}}],
+            properties={'タイトル': {'title': {}}, '銘柄コード': {'rich_text': {}}, 'PDFファイル': {'files': {}}})
+        assert uploader._find_existing_database('株主優待開示情報') == database['id']
+
+        for title, code in (('優待新設', '2216'), ('優待変更', '2216'), ('優待新設', '3558')):
+            uploader.client.pages.create(parent={'database_id': database['id']}, properties={
+                'タイトル': {'title': [{'text': {'content': title}}]},
+                '銘柄コード': {'rich_text': [{'text': {'content': code}}]}})
+
+        response = uploader.query_database(database['id'], filter={'and': [
+            {'property': 'タイトル', 'title': {'equals': '優待新設'}},
+            {'property': '銘柄コード', 'rich_text': {'equals': '2216'}}]})
+        assert len(response['results']) == 1
+        page_id = response['results'][0]['id']
+        page = uploader.query_database(database['id'], page_size=2)
+        assert len(page['results']) == 2 and page['has_more']
+        assert len(uploader.query_database(database['id'], start_cursor=page['next_cursor'])['results']) == 1
+
+        # 送信前のファイルは添付できない
+        file_path = os.path.join(tempfile.mkdtemp(prefix='yuutai_test_'), 'a.pdf')
+        with open(file_path, 'wb') as f:
+            f.write(b'%PDF-1.4\n' * 10)
+        upload_id = uploader._create_file_upload('a.pdf', 'application/pdf')
+        files = {'PDFファイル': {'files': [{'name': 'a.pdf', 'type': 'file_upload', 'file_upload': {'id': upload_id}}]}}
+        try:
+            uploader.client.pages.update(page_id=page_id, properties=files)
+            assert False, "attaching a pending upload must fail"
+        except Exception as e:
+            assert 'not uploaded' in str(e)
+
+        assert uploader._send_file_upload(upload_id, file_path, 'a.pdf', 'application/pdf')
+        assert uploader._get_file_upload_info(upload_id)['content_length'] == 90
+        updated = uploader.client.pages.update(page_id=page_id, properties=files)
+        assert updated['properties']['PDFファイル']['files'][0]['type'] == 'file'
+
+        stats = server.stats()
+        assert stats['notion'] == {'databases': 1, 'pages': 3, 'file_uploads': 1, 'uploaded_bytes': 90}
+        assert stats['requests']['notion databases.query'] == 3
+        assert stats['requests']['notion pages.update'] == 2
+
+    logger.info("✅ Notion endpoints test passed")
+
+
+def test_latency_and_throttling():
+    """サービスごとの遅延と 429 の注入を確認"""
+    logger.info("=== Testing Latency And Throttling ===")
+
+    with ReplayServer(create_fixtures(), latency={'yanoshin': 0.1},
+                      throttle_rate={'notion': 1.0}, retry_after=2) as server:
+        transport = HTTPTransport()
+        started = time.perf_counter()
+        assert transport.get(f'{server.listing_url}/recent.json').status_code == 200
+        assert time.perf_counter() - started >= 0.1
+
+        response = transport.post(f'{server.notion_url}/v1/file_uploads', json={'filename': 'a.pdf'})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '2'
+        assert response.json()['code'] == 'rate_limited'
+        assert server.stats()['throttled'] == {'notion file_uploads.create': 1}
+        transport.close()
+
+    logger.info("✅ Latency and throttling test passed")
+
+
+def test_process_date_range_end_to_end():
+    """日付範囲の処理がリプレイサーバーに対して完了することを確認"""
+    logger.info("=== Testing Process Date Range End To End ===")
+
+    from yuutai.daily_processor import YuutaiDailyProcessor
+
+    with ReplayServer(create_fixtures()) as server:
+        temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+        env = {
+            'NOTION_API_KEY': 'secret_replay', 'YUUTAI_NOTION_PAGE_ID': 'replay-page',
+            'TDNET_API_BASE_URL': server.listing_url, 'NOTION_API_BASE_URL': server.notion_url,
+            'YUUTAI_DOWNLOAD_DIR': os.path.join(temp_dir, 'downloads'),
+            'YUUTAI_CACHE_DIR': os.path.join(temp_dir, 'cache'),
+            'API_REQUEST_INTERVAL': '0.01', 'PDF_DOWNLOAD_INTERVAL': '0.01', 'YUUTAI_DAY_INTERVAL': '0',
+        }
+        saved = {name: os.environ.get(name) for name in env}
+        os.environ.update(env)
+        try:
+            processor = YuutaiDailyProcessor()
+            results = processor.process_date_range('2025-05-22', '2025-05-23')
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        summary = processor.get_processing_summary(results)
+        assert summary['failed_dates'] == 0 and summary['successful_uploads'] == 2, summary
+        stats = server.stats()
+        assert stats['notion']['pages'] == 2 and stats['notion']['file_uploads'] == 2
+        assert stats['requests']['yanoshin list'] == 1
+        processor.transport.close()
+
+    logger.info("✅ Process date range end to end test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_listing_replay, test_notion_endpoints, test_latency_and_throttling,
+             test_process_date_range_end_to_end]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+タイトル判定（株主優待関連・カテゴリ）のテスト
+
+旧実装（キーワード・正規表現を個別に検索）と判定結果が一致することを確認します：
+1. TDnet タイトルのサンプル
+2. キーワードを組み合わせたランダムなタイトル
+3. 重なり合うキーワードを含む任意の設定
+4. 一括判定（classify_batch）とキャッシュ済み一覧の再判定
+"""
+
+import os
+import re
+import sys
+import random
+import logging
+import tempfile
+from datetime import datetime
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import yuutai.classifier as classifier
+from yuutai.api_client import YuutaiAPIClient
+from yuutai.classifier import YuutaiTitleMatcher, DEFAULT_CATEGORY, EMPTY_CATEGORY
+from benchmark_yuutai import load_titles, reference_is_yuutai_related, reference_categorize
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def reference_match(title):
+    return reference_is_yuutai_related(title), reference_categorize(title)
+
+
+def test_corpus_matches_reference():
+    """サンプルタイトルで旧実装と同じ結果になることを確認"""
+    logger.info("=== Testing Corpus Against Reference ===")
+
+    matcher = YuutaiTitleMatcher()
+    titles = load_titles()
+    for title in titles + ['', None]:
+        assert matcher.match(title) == reference_match(title), f"Mismatch for {title!r}"
+
+    assert matcher.match('株主優待制度の新設に関するお知らせ') == (True, '優待新設')
+    assert matcher.match('2025年3月期 決算短信〔日本基準〕(連結)') == (False, DEFAULT_CATEGORY)
+    assert matcher.match('') == (False, EMPTY_CATEGORY)
+
+    logger.info("✅ Corpus test passed")
+
+
+def test_random_titles_match_reference():
+    """キーワード断片を組み合わせたタイトル（改行・重なりを含む）で旧実装と一致することを確認"""
+    logger.info("=== Testing Random Titles ===")
+
+    matcher = YuutaiTitleMatcher()
+    pieces = ['株主', '優待', '制度', '特典', '株主優待', '株主様', 'ご優待', '内容', '詳細', '基準日', '権利',
+              '導入', '変更', '廃止', '新設', '見直し', '株', '主', '優', '待', '見直', 'の', 'お知らせ', '\n']
+    rng = random.Random(20250523)
+    for _ in range(20000):
+        title = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 8)))
+        assert matcher.match(title) == reference_match(title), f"Mismatch for {title!r}"
+
+    logger.info("✅ Random titles test passed")
+
+
+def test_custom_overlapping_keywords():
+    """重なり合う語を含む任意のキーワード設定でも個別検索と一致することを確認"""
+    logger.info("=== Testing Custom Overlapping Keywords ===")
+
+    def naive_match(keywords, patterns, rules, title):
+        related = (any(keyword in title for keyword in keywords)
+                   or any(re.search(f'{re.escape(first)}.*{re.escape(second)}', title) for first, second in patterns))
+        for category, words in rules:
+            if any(word in title for word in words):
+                return related, category
+        return related, DEFAULT_CATEGORY
+
+    rng = random.Random(7)
+    word = lambda: ''.join(rng.choice('abcdef') for _ in range(rng.randint(1, 3)))
+    for _ in range(200):
+        keywords = [word() for _ in range(3)]
+        patterns = [(word(), word()) for _ in range(3)]
+        rules = [('X', [word()]), ('Y', [word(), word()])]
+        matcher = YuutaiTitleMatcher(keywords, patterns, rules)
+        for _ in range(100):
+            title = ''.join(rng.choice('abcdefg\n') for _ in range(rng.randint(1, 12)))
+            assert matcher.match(title) == naive_match(keywords, patterns, rules, title), \
+                f"Mismatch for {title!r} with {keywords}, {patterns}, {rules}"
+
+    logger.info("✅ Custom overlapping keywords test passed")
+
+
+def test_classify_batch():
+    """一括判定が1件ずつの判定と同じ結果を同じ順序の配列で返すことを確認"""
+    logger.info("=== Testing Classify Batch ===")
+
+    matcher = YuutaiTitleMatcher()
+    titles = load_titles() * 3 + [None, '']
+    related, codes = matcher.classify_batch(titles)
+
+    assert related.typecode == 'B' and codes.typecode == 'B'
+    assert len(related) == len(codes) == len(titles)
+    assert [(bool(flag), matcher.category_names[code]) for flag, code in zip(related, codes)] == \
+        [matcher.match(title) for title in titles]
+
+    # プロセスプールでも同じ結果
+    original_threshold = classifier.MIN_TITLES_PER_PROCESS
+    classifier.MIN_TITLES_PER_PROCESS = 1
+    try:
+        assert matcher.classify_batch(titles, processes=2) == (related, codes)
+    finally:
+        classifier.MIN_TITLES_PER_PROCESS = original_threshold
+
+    logger.info("✅ Classify batch test passed")
+
+
+def test_reclassify_cached_listings():
+    """キーワード変更後にキャッシュ済み一覧をAPIなしで再判定できることを確認"""
+    logger.info("=== Testing Reclassify Cached Listings ===")
+
+    temp_dir = tempfile.mkdtemp(prefix='yuutai_test_')
+    client = YuutaiAPIClient(os.path.join(temp_dir, 'downloads'), os.path.join(temp_dir, 'cache'))
+    items = [{'Tdnet': {'id': str(i), 'title': title, 'company_code': '22160', 'pubdate': '2025-05-23 15:30:00'}}
+             for i, title in enumerate(['株主優待制度の導入に関するお知らせ', '自己株式の取得状況に関するお知らせ',
+                                        '月次売上高のお知らせ'])]
+    fetched_at = datetime(2025, 6, 1).timestamp()
+    client.listing_cache.put('2025-05-23', items, fetched_at=fetched_at)
+    client.listing_cache.put('2025-05-26', items[1:], fetched_at=fetched_at)
+
+    results = client.reclassify_cached_listings()
+    assert {day: [d['id'] for d in disclosures] for day, disclosures in results.items()} == \
+        {'2025-05-23': ['0'], '2025-05-26': []}
+    assert results['2025-05-23'][0]['category'] == '優待新設'
+    assert results['2025-05-23'][0]['company_code'] == '2216'
+
+    # キーワードを追加して再判定
+    client.title_matcher = YuutaiTitleMatcher(client.yuutai_keywords + ['自己株式'])
+    results = client.reclassify_cached_listings('2025-05-24')
+    assert {day: [d['id'] for d in disclosures] for day, disclosures in results.items()} == {'2025-05-26': ['1']}
+
+    logger.info("✅ Reclassify cached listings test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_corpus_matches_reference, test_random_titles_match_reference, test_custom_overlapping_keywords,
+             test_classify_batch, test_reclassify_cached_listings]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
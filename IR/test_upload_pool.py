@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Notion への並列アップロードのテスト
+
+リプレイサーバーを使い、ネットワークに接続せずに以下を確認します：
+1. 並列処理の件数（成功・失敗・無効・バッチ内重複）と作成ページが逐次処理と同じであること
+2. 各開示のページ作成→ファイル添付の順序が保たれること
+3. 複数ワーカーでも共有のレート制限を超えず、応答遅延を重ねて処理時間を短縮すること
+4. PDFをページ作成時に添付して pages.update を省き、添付できない場合は作成後の添付に切り替えること
+"""
+
+import os
+import sys
+import time
+import logging
+import tempfile
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from testing_helpers import create_manager
+from yuutai.replay_server import ReplayFixtures, ReplayServer
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def make_disclosures(pdf_dir: str) -> list:
+    """PDF付きの開示と、バッチ内重複・同じ重複判定キー・無効な銘柄コードの開示"""
+    disclosures = []
+    for index in range(6):
+        local_file = os.path.join(pdf_dir, f'2216_20250523_{index}.pdf')
+        with open(local_file, 'wb') as f:
+            f.write(b'%PDF-1.4\n' * (index + 1))
+        disclosures.append({'id': f'pool_{index}', 'title': f'株主優待制度の新設に関するお知らせ{index}',
+                            'company_code': '2216', 'company_name': 'カンロ',
+                            'disclosure_time': '2025-05-23 15:00:00', 'category': '優待新設',
+                            'local_file': local_file})
+    disclosures.append(dict(disclosures[0], local_file=None))
+    disclosures.append(dict(disclosures[1], id='pool_renamed', local_file=None))
+    disclosures.append(dict(disclosures[2], id='pool_invalid', company_code='22A6', local_file=None))
+    return disclosures
+
+
+def run_batch(upload_workers: int, notion_latency: float = 0.0, request_rate: float = 0.0):
+    with ReplayServer(ReplayFixtures(), latency={'notion': notion_latency}) as server:
+        manager = create_manager(server, tempfile.mkdtemp(prefix='yuutai_test_'), upload_workers=upload_workers,
+                                 request_rate=request_rate)
+        assert manager.initialize_databases()
+        requests_before = sum(server.stats()['requests'].values())
+
+        started = time.perf_counter()
+        stats = manager.process_daily_yuutai_disclosures(make_disclosures(tempfile.mkdtemp(prefix='yuutai_test_')))
+        elapsed = time.perf_counter() - started
+
+        state = server.notion
+        pages = sorted(
+            (''.join(t['plain_text'] for t in page['properties']['タイトル']['title']),
+             [f['name'] for f in page['properties'].get('PDFファイル', {}).get('files', [])])
+            for page in state.pages.values()
+        )
+        requests = sum(server.stats()['requests'].values()) - requests_before
+    return stats, pages, requests, elapsed
+
+
+def test_same_stats_as_sequential():
+    """並列処理の件数・作成ページが逐次処理と同じことを確認"""
+    logger.info("=== Testing Same Stats As Sequential ===")
+
+    sequential = run_batch(upload_workers=1)
+    concurrent = run_batch(upload_workers=4)
+    assert sequential[0] == {'total': 9, 'success': 7, 'failed': 0, 'skipped': 1, 'duplicates': 1,
+                             'failed_ids': []}
+    assert concurrent[:3] == sequential[:3]
+
+    # PDFは各開示のワーカー内でアップロード・添付するため、全ページにPDFが付く
+    pages = concurrent[1]
+    assert len(pages) == 6 and all(files for _, files in pages)
+
+    logger.info("✅ Same stats as sequential test passed")
+
+
+def test_shared_rate_limit():
+    """共有のレート制限と、並列化による処理時間の短縮を確認"""
+    logger.info("=== Testing Shared Rate Limit ===")
+
+    rate = 20.0
+    _, _, requests, sequential_elapsed = run_batch(upload_workers=1, notion_latency=0.1, request_rate=rate)
+    _, _, concurrent_requests, concurrent_elapsed = run_batch(upload_workers=4, notion_latency=0.1,
+                                                              request_rate=rate)
+    assert concurrent_requests == requests
+
+    # バケットの容量（rate 件）を超えた分は rate 件/秒を超えて送らない
+    assert concurrent_elapsed >= (requests - rate) / rate * 0.9
+    assert concurrent_elapsed < sequential_elapsed * 0.75, (concurrent_elapsed, sequential_elapsed)
+
+    logger.info("✅ Shared rate limit test passed")
+
+
+def test_attach_on_create():
+    """ページ作成時のPDF添付と、失敗時の作成後の添付への切り替えを確認"""
+    logger.info("=== Testing Attach On Create ===")
+
+    with ReplayServer(ReplayFixtures()) as server:
+        manager = create_manager(server, tempfile.mkdtemp(prefix='yuutai_test_'), upload_workers=1, request_rate=0)
+        assert manager.initialize_databases()
+        disclosures = make_disclosures(tempfile.mkdtemp(prefix='yuutai_test_'))[:3]
+
+        assert manager.process_daily_yuutai_disclosures(disclosures[:1])['success'] == 1
+        requests = server.stats()['requests']
+        assert requests['notion pages.create'] == 1 and 'notion pages.update' not in requests
+        assert manager.upload_stats == {'attached_on_create': 1, 'attach_fallbacks': 0}
+        assert not os.path.exists(disclosures[0]['local_file'])
+
+        # 送信前のアップロードの添付が拒否された場合は添付せずに作成し、作成後に添付し直す
+        send_file_upload = manager.uploader._send_file_upload
+        calls = []
+
+        def skip_first_send(*args):
+            calls.append(args)
+            return True if len(calls) == 1 else send_file_upload(*args)
+
+        manager.uploader._send_file_upload = skip_first_send
+        assert manager.process_daily_yuutai_disclosures(disclosures[1:2])['success'] == 1
+
+        # アップロードの作成に失敗した場合も作成後の添付に切り替える
+        create_file_upload = manager.uploader._create_file_upload
+        manager.uploader._create_file_upload = lambda *args: None
+        assert manager.process_daily_yuutai_disclosures(disclosures[2:3])['success'] == 1
+        manager.uploader._create_file_upload = create_file_upload
+
+        requests = server.stats()['requests']
+        assert requests['notion pages.create'] == 4 and requests['notion pages.update'] == 1
+        assert manager.upload_stats == {'attached_on_create': 1, 'attach_fallbacks': 2}
+        files = [page['properties'].get('PDFファイル', {}).get('files') for page in server.notion.pages.values()]
+        assert len(files) == 3 and sum(1 for f in files if f) == 2
+
+    logger.info("✅ Attach on create test passed")
+
+
+def main():
+    """メインテスト実行"""
+    tests = [test_same_stats_as_sequential, test_shared_rate_limit, test_attach_on_create]
+    passed = 0
+    for test_func in tests:
+        try:
+            test_func()
+            passed += 1
+        except AssertionError as e:
+            logger.error(f"Test '{test_func.__name__}' failed: {str(e)}")
+
+    logger.info(f"\n🏁 Test Summary: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+テスト共通のヘルパー
+
+リプレイサーバーに接続する Notion マネージャー・アップローダーの生成、
+Notion に登録する開示データ、ダミーのHTTPレスポンスを各テストで共有します。
+"""
+
+import os
+import sys
+import json
+
+# プロジェクトルートをパスに追加
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from http_transport import HTTPTransport
+from notion_uploader import NotionUploader
+from yuutai.notion_manager import YuutaiNotionManager
+from yuutai.replay_server import ReplayServer
+
+
+def make_disclosure(index: int, title: str = '株主優待制度の新設に関するお知らせ') -> dict:
+    """Notion に登録する開示（index ごとに公開時刻が異なり、重複判定のキーも異なる）"""
+    return {'id': f'yuutai_{index}', 'title': title, 'company_code': '2216', 'company_name': 'カンロ',
+            'disclosure_time': f'2025-05-23 15:{index:02d}:00', 'category': '優待新設'}
+
+
+def create_manager(server: ReplayServer, cache_dir: str = None, **kwargs) -> YuutaiNotionManager:
+    """リプレイサーバーの Notion API に接続するマネージャー（kwargs はコンストラクタに渡す）"""
+    return YuutaiNotionManager('secret_test', 'page-1', HTTPTransport(), server.notion_url, cache_dir, **kwargs)
+
+
+def create_uploader(server: ReplayServer) -> NotionUploader:
+    """リプレイサーバーの Notion API に接続するアップローダー"""
+    return NotionUploader('secret_test', 'page-1', HTTPTransport(), server.notion_url)
+
+
+def requests_of(server: ReplayServer, endpoint: str) -> int:
+    """リプレイサーバーが受けた Notion API のエンドポイント別リクエスト数"""
+    return server.stats()['requests'].get(f'notion {endpoint}', 0)
+
+
+class FakeResponse:
+    """ステータス・ヘッダー・JSON本文を指定するダミーレスポンス"""
+
+    def __init__(self, status_code: int, headers: dict = None, payload=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.payload = payload if payload is not None else {'items': []}
+        self.closed = False
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def raise_for_status(self):
+        if not self.ok:
+            import requests
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error")
+
+    def json(self):
+        return self.payload
+
+    @property
+    def content(self):
+        return json.dumps(self.payload).encode('utf-8')
+
+    def close(self):
+        self.closed = True